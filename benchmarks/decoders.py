@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2016 CERN.
+#
+# INSPIRE is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Benchmark the decoders of crawl results.
+
+Decodes copies of the records of ``tests/fixtures/records.jl`` with every
+installed JSON library, and from the binary record formats::
+
+    $ python benchmarks/decoders.py --records 10000
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import io
+import itertools
+import json
+import os
+import timeit
+
+from inspire_crawler.decoders import (
+    BINARY_CODECS,
+    JSON_DECODERS,
+    get_json_decoder,
+    iter_binary_records,
+    pack_binary_record,
+)
+from inspire_crawler.errors import CrawlerUnsupportedResultsFormat
+
+
+FIXTURE = os.path.join(
+    os.path.dirname(__file__), os.pardir, 'tests', 'fixtures', 'records.jl'
+)
+
+
+def load_crawl_results(count):
+    with open(FIXTURE) as fd:
+        crawl_results = [json.loads(line) for line in fd if line.strip()]
+
+    return list(itertools.islice(itertools.cycle(crawl_results), count))
+
+
+def json_benchmark(name, crawl_results):
+    loads = get_json_decoder(name)
+    lines = [
+        json.dumps(crawl_result).encode('utf-8')
+        for crawl_result in crawl_results
+    ]
+
+    def _decode_all():
+        for line in lines:
+            loads(line)
+
+    return _decode_all, sum(len(line) + 1 for line in lines)
+
+
+def binary_benchmark(results_format, crawl_results):
+    content = b''.join(
+        pack_binary_record(crawl_result, results_format)
+        for crawl_result in crawl_results
+    )
+
+    def _decode_all():
+        for _ in iter_binary_records(io.BytesIO(content), results_format):
+            pass
+
+    return _decode_all, len(content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    crawl_results = load_crawl_results(args.records)
+    print('{} records'.format(len(crawl_results)))
+    benchmarks = [
+        ('json/' + name, json_benchmark, name) for name in JSON_DECODERS
+    ] + [
+        (name, binary_benchmark, name) for name in sorted(BINARY_CODECS)
+    ]
+    for label, benchmark, name in benchmarks:
+        try:
+            decode_all, size = benchmark(name, crawl_results)
+        except CrawlerUnsupportedResultsFormat:
+            print('{:<16} not installed'.format(label))
+            continue
+
+        seconds = min(timeit.repeat(decode_all, number=1, repeat=args.repeat))
+        print('{:<16} {:>10.2f} ms {:>12.0f} records/s {:>8.1f} KiB'.format(
+            label,
+            seconds * 1000,
+            len(crawl_results) / seconds,
+            size / 1024.0,
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2016 CERN.
+#
+# INSPIRE is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Generate synthetic crawl results files.
+
+Records are modeled on ``tests/fixtures/records.jl``, with unique titles,
+identifiers and abstracts padded to reach the requested size::
+
+    $ python benchmarks/generate_records.py /tmp/records.jl \\
+        --records 10000 --record-size 4096 --error-ratio 0.01
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import copy
+import json
+import os
+import random
+import string
+
+FIXTURE = os.path.join(
+    os.path.dirname(__file__), os.pardir, 'tests', 'fixtures', 'records.jl'
+)
+
+
+def _load_templates():
+    with open(FIXTURE) as fd:
+        return [json.loads(line) for line in fd if line.strip()]
+
+
+def _random_text(rng, size):
+    words = []
+    length = 0
+    while length < size:
+        word = ''.join(
+            rng.choice(string.ascii_lowercase)
+            for _ in range(rng.randint(2, 10))
+        )
+        words.append(word)
+        length += len(word) + 1
+
+    return ' '.join(words)[:size]
+
+
+def generate_crawl_result(rng, template, idx, record_size, error):
+    """Return a synthetic crawl result of about ``record_size`` bytes."""
+    crawl_result = copy.deepcopy(template)
+    if error:
+        crawl_result['record'] = {}
+        crawl_result['errors'] = [{
+            'exception': 'ValueError',
+            'traceback': 'ValueError on record {}.'.format(idx),
+        }]
+        return crawl_result
+
+    record = crawl_result['record']
+    eprint = '{:04d}.{:05d}'.format(1000 + idx // 100000, idx % 100000)
+    record['titles'][0]['title'] = 'Synthetic record {}'.format(idx)
+    record['arxiv_eprints'][0]['value'] = eprint
+    record['external_system_numbers'][0]['value'] = \
+        'oai:arXiv.org:{}'.format(eprint)
+
+    padding = record_size - len(json.dumps(crawl_result))
+    record['abstracts'][0]['value'] = _random_text(rng, max(padding, 0))
+    return crawl_result
+
+
+def generate_records(path, records, record_size=3072, error_ratio=0.0,
+                     seed=0):
+    """Write a synthetic results file.
+
+    :param records: number of crawl results.
+    :param record_size: approximate size of every line, in bytes.
+    :param error_ratio: fraction of the crawl results that have errors.
+    :param seed: seed of the random generator, so that files are
+        reproducible.
+    """
+    rng = random.Random(seed)
+    templates = _load_templates()
+    with open(path, 'w') as fd:
+        for idx in range(records):
+            crawl_result = generate_crawl_result(
+                rng,
+                templates[idx % len(templates)],
+                idx,
+                record_size,
+                rng.random() < error_ratio,
+            )
+            fd.write(json.dumps(crawl_result))
+            fd.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--records', type=int, default=1000)
+    parser.add_argument('--record-size', type=int, default=3072)
+    parser.add_argument('--error-ratio', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    generate_records(
+        args.path, args.records, args.record_size, args.error_ratio,
+        args.seed,
+    )
+
+
+if __name__ == '__main__':
+    main()
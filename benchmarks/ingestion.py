@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2016 CERN.
+#
+# INSPIRE is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Benchmark the ingestion of crawl results by ``submit_results``.
+
+Generates a synthetic results file, ingests it in a SQLite database, and
+reports the throughput, the peak memory and the number of SQL statements
+per record as JSON, to be compared between releases::
+
+    $ python benchmarks/ingestion.py --records 2000 --output before.json
+
+Workflows are not run: their start tasks are published to an in-memory
+broker, so that only the ingestion itself is measured. The peak memory is
+measured in a separate run, as tracing allocations skews the timings.
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import uuid
+from timeit import default_timer
+
+from flask import Flask
+from flask_celeryext import FlaskCeleryExt
+from invenio_db import InvenioDB, db
+from invenio_workflows import InvenioWorkflows
+from sqlalchemy import event
+
+import inspire_crawler
+from inspire_crawler import INSPIRECrawler
+from inspire_crawler.models import CrawlerJob
+from inspire_crawler.tasks import submit_results
+
+from generate_records import generate_records
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+    import resource
+
+
+class HaltBenchmark(object):
+    """Workflow of the ingested records, never run by the benchmark."""
+
+    workflow = [lambda obj, eng: eng.halt('Benchmark')]
+
+
+def create_app(database_path, config):
+    app = Flask(__name__)
+    app.config.update(
+        BROKER_URL='memory://',
+        CELERY_ALWAYS_EAGER=False,
+        CELERY_CACHE_BACKEND='memory',
+        CELERY_QUEUE_SPIDER_MAPPING={},
+        CELERY_RESULT_BACKEND='cache',
+        SECRET_KEY='benchmark',
+        SQLALCHEMY_DATABASE_URI='sqlite:///' + database_path,
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        **config
+    )
+    FlaskCeleryExt(app)
+    InvenioDB(app)
+    InvenioWorkflows(app)
+    INSPIRECrawler(app)
+    app.extensions['invenio-workflows'].register_workflow(
+        HaltBenchmark.__name__, HaltBenchmark
+    )
+    return app
+
+
+class StatementCounter(object):
+    """Count the SQL statements sent to the database."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+def _max_rss_kib():
+    # Kilobytes on Linux, bytes on macOS.
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 1024.0 if sys.platform == 'darwin' else float(max_rss)
+
+
+def run_once(app, results_path, measure_memory=False):
+    """Ingest the results file once, in a fresh database.
+
+    Memory tracing slows down allocations a lot, so the peak memory is only
+    measured when asked, in a run whose timing is not to be used.
+    """
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        job_id = uuid.uuid4().hex
+        CrawlerJob.create(
+            job_id=job_id,
+            spider='benchmark',
+            workflow=HaltBenchmark.__name__,
+        )
+        db.session.commit()
+
+        if measure_memory and tracemalloc is not None:
+            tracemalloc.start()
+        elif measure_memory:
+            rss_before = _max_rss_kib()
+
+        with StatementCounter(db.engine) as statements:
+            start = default_timer()
+            submit_results(
+                job_id=job_id,
+                errors=None,
+                log_file=None,
+                results_uri='file://' + results_path,
+                spider_name='benchmark',
+            )
+            seconds = default_timer() - start
+
+        peak_memory = None
+        if measure_memory and tracemalloc is not None:
+            peak_memory = tracemalloc.get_traced_memory()[1] / 1024.0
+            tracemalloc.stop()
+        elif measure_memory:
+            # The growth of the peak resident set size of the process, which
+            # is only an upper bound after the first run.
+            peak_memory = _max_rss_kib() - rss_before
+
+        stats = CrawlerJob.get_by_job(job_id).stats
+        db.session.remove()
+
+    run = {
+        'seconds': seconds,
+        'statements': statements.count,
+        'stages': stats['stages'],
+    }
+    if measure_memory:
+        run['peak_memory_kib'] = peak_memory
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=1000)
+    parser.add_argument('--record-size', type=int, default=3072)
+    parser.add_argument('--error-ratio', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument(
+        '--config', action='append', default=[], metavar='KEY=JSON',
+        help='crawler setting, such as CRAWLER_SUBMIT_RESULTS_BATCH_SIZE=500',
+    )
+    parser.add_argument('--output', help='file to write the results to')
+    args = parser.parse_args()
+
+    config = {}
+    for setting in args.config:
+        key, value = setting.split('=', 1)
+        config[key] = json.loads(value)
+
+    workdir = tempfile.mkdtemp()
+    try:
+        results_path = os.path.join(workdir, 'records.jl')
+        generate_records(
+            results_path, args.records, args.record_size, args.error_ratio,
+            args.seed,
+        )
+        app = create_app(os.path.join(workdir, 'benchmark.db'), config)
+        # Measured first, as the resident set size only grows.
+        peak_memory = run_once(
+            app, results_path, measure_memory=True
+        )['peak_memory_kib']
+        runs = [run_once(app, results_path) for _ in range(args.repeat)]
+    finally:
+        shutil.rmtree(workdir)
+
+    best = min(runs, key=lambda run: run['seconds'])
+    report = {
+        'inspire_crawler': inspire_crawler.__version__,
+        'python': platform.python_version(),
+        'parameters': {
+            'records': args.records,
+            'record_size': args.record_size,
+            'error_ratio': args.error_ratio,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'config': config,
+        },
+        'records_per_second': args.records / best['seconds'],
+        'seconds': best['seconds'],
+        'peak_memory_kib': peak_memory,
+        'statements_per_record': best['statements'] / float(args.records),
+        'runs': runs,
+    }
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fd:
+            fd.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2016 CERN.
+#
+# INSPIRE is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Benchmark the preparation of the workflow object data of crawl results.
+
+Compares the current copy-free implementation with the previous one, that
+deep copied every record three times, in CPU time and allocated memory::
+
+    $ python benchmarks/source_data.py --authors 1000 --references 2000
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import copy
+import json
+import os
+import timeit
+
+from inspire_crawler.tasks import _build_object_data
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+
+
+FIXTURE = os.path.join(
+    os.path.dirname(__file__), os.pardir, 'tests', 'fixtures', 'records.jl'
+)
+
+
+def legacy_build_object_data(crawl_result, job_id, results_path):
+    """Previous implementation, relying on deep copies."""
+    crawl_result = copy.deepcopy(crawl_result)
+    record = crawl_result.pop('record')
+    if crawl_result['errors']:
+        return record, {'crawl_errors': crawl_result}, 'error'
+
+    extra_data = {
+        'crawler_job_id': job_id,
+        'crawler_results_path': results_path,
+        'source_file': crawl_result['file_name'],
+    }
+    record_extra = record.pop('extra_data', {})
+    if record_extra:
+        extra_data['record_extra'] = record_extra
+
+    object_extra_data = {
+        'source_data': {
+            'data': copy.deepcopy(record),
+            'extra_data': copy.deepcopy(extra_data),
+        },
+    }
+    object_extra_data.update(extra_data)
+    return record, object_extra_data, None
+
+
+def load_crawl_results(authors, references):
+    with open(FIXTURE) as fd:
+        crawl_results = [json.loads(line) for line in fd if line.strip()]
+
+    for crawl_result in crawl_results:
+        record = crawl_result['record']
+        record['authors'] = [
+            dict(author, full_name='{}, {}'.format(author['full_name'], idx))
+            for idx in range(authors)
+            for author in record['authors'][:1]
+        ]
+        record['references'] = [
+            {
+                'reference': {
+                    'title': {'title': 'Reference number {}'.format(idx)},
+                    'arxiv_eprint': '1605.{:05d}'.format(idx),
+                    'authors': [{'full_name': 'Doe, J.'}],
+                },
+            }
+            for idx in range(references)
+        ]
+
+    return crawl_results
+
+
+def run(function, crawl_results, repeat):
+    def _build_all():
+        for crawl_result in crawl_results:
+            function(crawl_result, 'job-id', '/tmp/results.jl')
+
+    seconds = min(timeit.repeat(_build_all, number=1, repeat=repeat))
+
+    peak = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        _build_all()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--authors', type=int, default=1000)
+    parser.add_argument('--references', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    crawl_results = load_crawl_results(args.authors, args.references)
+    print('{} records, {} authors and {} references each'.format(
+        len(crawl_results), args.authors, args.references
+    ))
+    for name, function in (
+        ('deepcopy', legacy_build_object_data),
+        ('copy-free', _build_object_data),
+    ):
+        seconds, peak = run(function, crawl_results, args.repeat)
+        print('{:<10} {:>10.2f} ms  peak allocated: {}'.format(
+            name,
+            seconds * 1000,
+            'n/a' if peak is None else '{:.1f} KiB'.format(peak / 1024.0),
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+"""Add dispatch state to crawler_ingestion_checkpoint."""
+
+from __future__ import absolute_import, print_function
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlalchemy_utils.types import JSONType
+
+# revision identifiers, used by Alembic.
+revision = '5d0b7a2e9c14'
+down_revision = 'a3f81c6d0e42'
+branch_labels = ()
+depends_on = None
+
+
+def upgrade():
+    """Upgrade database."""
+    op.add_column(
+        'crawler_ingestion_checkpoint',
+        sa.Column(
+            'unpublished',
+            JSONType().with_variant(
+                postgresql.JSON(none_as_null=True),
+                'postgresql',
+            ),
+            nullable=True,
+        )
+    )
+    op.add_column(
+        'crawler_ingestion_checkpoint',
+        sa.Column(
+            'dispatched',
+            sa.Boolean(name='dispatched'),
+            nullable=False,
+            default=False,
+            server_default=sa.false(),
+        )
+    )
+
+
+def downgrade():
+    """Downgrade database."""
+    op.drop_column('crawler_ingestion_checkpoint', 'dispatched')
+    op.drop_column('crawler_ingestion_checkpoint', 'unpublished')
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+"""Create crawler_spider_bucket table."""
+
+from __future__ import absolute_import, print_function
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '7e2d5c8a9f31'
+down_revision = '4c9a1e6f2b7d'
+branch_labels = ()
+depends_on = None
+
+
+def upgrade():
+    """Upgrade database."""
+    op.create_table(
+        'crawler_spider_bucket',
+        sa.Column('spider', sa.String(255), primary_key=True),
+        sa.Column('tokens', sa.Float, nullable=False),
+        sa.Column('updated', sa.DateTime, nullable=False),
+        sa.Column('queue_depth', sa.Integer, nullable=True),
+        sa.Column('measured', sa.DateTime, nullable=True),
+        sa.Column('drain_rate', sa.Float, nullable=True),
+    )
+
+
+def downgrade():
+    """Downgrade database."""
+    op.drop_table('crawler_spider_bucket')
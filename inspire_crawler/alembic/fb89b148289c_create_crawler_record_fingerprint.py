@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2017 CERN.
+#
+# INSPIRE is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+"""Create crawler_record_fingerprint table."""
+
+from __future__ import absolute_import, print_function
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy_utils.types import UUIDType
+
+# revision identifiers, used by Alembic.
+revision = 'fb89b148289c'
+down_revision = '93f5b1abbcf9'
+branch_labels = ()
+depends_on = None
+
+
+def upgrade():
+    """Upgrade database."""
+    op.create_table(
+        'crawler_record_fingerprint',
+        sa.Column('fingerprint', sa.String(64), primary_key=True),
+        sa.Column(
+            'object_id',
+            sa.Integer,
+            sa.ForeignKey(
+                'workflows_object.id',
+                ondelete="CASCADE",
+                onupdate="CASCADE",
+            ),
+            nullable=False,
+            index=True
+        ),
+        sa.Column('job_id', UUIDType, nullable=False)
+    )
+
+
+def downgrade():
+    """Downgrade database."""
+    op.drop_table('crawler_record_fingerprint')
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2016 CERN.
+#
+# INSPIRE is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Content-addressed store of crawl results payloads.
+
+Big ``results_data`` payloads are written to the store as JSON lines files,
+named after the SHA-256 of their content, and only their digest is sent
+through Celery. Every user of a blob holds a reference to it, materialized
+by a marker file, and the blob is deleted when its last reference is
+released::
+
+    <root>/blobs/<digest[:2]>/<digest>
+    <root>/refs/<digest>/<reference>
+
+Taking the first reference and deleting the blob after the last one are
+serialized by POSIX locks on ``<root>/locks/<digest[:2]>``, which also work
+on network filesystems.
+
+The store does not need a Flask application, so that producers sending the
+``submit_results`` task by name, such as the hepcrawl pipeline, can write
+the payload themselves, with the job id as reference::
+
+    digest = BlobStore(root).put(dump_results(results_data), job_id)
+    celery.send_task(
+        'inspire_crawler.tasks.submit_results',
+        kwargs={..., 'results_data': None, 'results_blob': digest},
+    )
+"""
+
+from __future__ import absolute_import, print_function
+
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+def dump_results(results_data):
+    """Encode crawl results in the JSON lines format of the results blobs.
+
+    :return: the list of the lines, as bytes.
+    """
+    return [
+        json.dumps(crawl_result).encode('utf-8') + b'\n'
+        for crawl_result in results_data
+    ]
+
+
+class BlobStore(object):
+    """Content-addressed blobs with reference counting, on a filesystem.
+
+    The root directory must be shared by the producers of the payloads and
+    the Celery workers consuming them.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest):
+        """Return the path of a blob."""
+        return os.path.join(self.root, 'blobs', digest[:2], digest)
+
+    def _refs_path(self, digest):
+        return os.path.join(self.root, 'refs', digest)
+
+    @contextmanager
+    def _lock(self, digest):
+        _makedirs(os.path.join(self.root, 'locks'))
+        with open(os.path.join(self.root, 'locks', digest[:2]), 'a') as lock:
+            fcntl.lockf(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(lock, fcntl.LOCK_UN)
+
+    def put(self, chunks, reference):
+        """Store a blob and take a reference to it.
+
+        :param chunks: iterable of the bytes of the blob.
+        :param reference: name of the reference, such as a job id.
+        :return: the digest of the blob.
+        """
+        _makedirs(os.path.join(self.root, 'tmp'))
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+        try:
+            sha256 = hashlib.sha256()
+            with os.fdopen(fd, 'wb') as blob:
+                for chunk in chunks:
+                    sha256.update(chunk)
+                    blob.write(chunk)
+            digest = sha256.hexdigest()
+
+            with self._lock(digest):
+                _makedirs(self._refs_path(digest))
+                with open(
+                    os.path.join(self._refs_path(digest), reference), 'w'
+                ):
+                    pass
+                _makedirs(os.path.dirname(self.path(digest)))
+                os.rename(tmp_path, self.path(digest))
+        except Exception:
+            _remove(tmp_path)
+            raise
+
+        return digest
+
+    def release(self, digest, reference):
+        """Release a reference to a blob, deleting it if it was the last.
+
+        :return: whether the blob was deleted.
+        """
+        with self._lock(digest):
+            _remove(os.path.join(self._refs_path(digest), reference))
+            try:
+                os.rmdir(self._refs_path(digest))
+            except OSError as e:
+                if e.errno in (errno.ENOTEMPTY, errno.EEXIST):
+                    return False
+                elif e.errno != errno.ENOENT:
+                    raise
+
+            _remove(self.path(digest))
+        return True
+
+    def references(self):
+        """Iterate over the ``(digest, reference)`` pairs of the store."""
+        refs_path = os.path.join(self.root, 'refs')
+        if not os.path.isdir(refs_path):
+            return
+
+        for digest in sorted(os.listdir(refs_path)):
+            try:
+                references = os.listdir(os.path.join(refs_path, digest))
+            except OSError as e:
+                # Released in the meantime.
+                if e.errno != errno.ENOENT:
+                    raise
+                continue
+
+            for reference in sorted(references):
+                yield digest, reference
+
+    def collect(self):
+        """Delete the blobs that are not referenced anymore.
+
+        Blobs are normally deleted when their last reference is released,
+        this cleans up after interrupted producers.
+
+        :return: the digests of the deleted blobs.
+        """
+        deleted = []
+        blobs_path = os.path.join(self.root, 'blobs')
+        if not os.path.isdir(blobs_path):
+            return deleted
+
+        for prefix in sorted(os.listdir(blobs_path)):
+            for digest in sorted(os.listdir(os.path.join(blobs_path, prefix))):
+                with self._lock(digest):
+                    if not os.path.isdir(self._refs_path(digest)):
+                        _remove(self.path(digest))
+                        deleted.append(digest)
+
+        return deleted
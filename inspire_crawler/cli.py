@@ -35,6 +35,8 @@ from invenio_db import db
 from scrapyd_api.exceptions import ScrapydResponseError
 
 from . import models
+from .errors import CrawlerSpiderNotFound
+from .results import open_results, read_results_lines
 from .tasks import schedule_crawl
 from .utils import list_spiders
 
@@ -59,7 +61,7 @@ def _show_table(results):
         click.echo('    '.join(values))
 
 
-def _show_file(file_path, header_name='Shown'):
+def _show_file(file_path, header_name='Shown', read_lines=None):
     if file_path.startswith('file:/'):
         file_path = file_path[6:]
 
@@ -67,8 +69,13 @@ def _show_file(file_path, header_name='Shown'):
     if not os.path.exists(file_path):
         click.secho('    The file does not exist', fg='yellow')
     else:
-        with open(file_path) as fd:
-            click.echo_via_pager(fd.read())
+        click.echo_via_pager((read_lines or _read_lines)(file_path))
+
+
+def _read_lines(file_path):
+    with open_results(file_path) as fd:
+        for line in fd:
+            yield line.decode('utf-8', 'replace')
 
 
 @click.group()
@@ -150,6 +157,7 @@ def get_job_results(id):
     _show_file(
         file_path=crawler_job.results,
         header_name='Results',
+        read_lines=read_results_lines,
     )
 
 
@@ -237,6 +245,7 @@ def get_job_results_from_workflow(workflow_id):
     _show_file(
         file_path=query_result[0],
         header_name='Results',
+        read_lines=read_results_lines,
     )
 
 
@@ -282,12 +291,14 @@ def schedule_crawl_cli(spider_name, workflow_name, dont_force_crawl, kwarg):
             crawler_settings=settings,
             **extra_kwargs
         )
-    except ScrapydResponseError as error:
+    except (CrawlerSpiderNotFound, ScrapydResponseError) as error:
         message = str(error)
-        if 'spider' in message and 'not found' in message:
+        if isinstance(error, CrawlerSpiderNotFound) or (
+            'spider' in message and 'not found' in message
+        ):
             click.echo('%s' % error)
             click.echo('\n Available spiders:')
-            spiders = list_spiders()
+            spiders = list_spiders(refresh=True)
             click.echo('\n'.join(spiders))
             raise click.Abort()
         else:
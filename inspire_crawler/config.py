@@ -29,6 +29,40 @@ from __future__ import absolute_import, print_function
 CRAWLER_HOST_URL = "http://localhost:6800"
 """URL to Scrapyd HTTP server."""
 
+CRAWLER_HOST_URLS = []
+"""URLs of the scrapyd nodes to schedule crawls on.
+
+Each crawl is scheduled on the node with the most free slots, and the node is
+recorded on its ``CrawlerJob``. When empty, ``CRAWLER_HOST_URL`` is used.
+"""
+
+CRAWLER_NODE_SLOTS = {}
+"""Number of jobs each scrapyd node runs at once, by node URL.
+
+It should match the ``max_proc`` of the node. Nodes that are not listed get
+``CRAWLER_NODE_DEFAULT_SLOTS``.
+"""
+
+CRAWLER_NODE_DEFAULT_SLOTS = 4
+"""Number of jobs a scrapyd node runs at once, unless in CRAWLER_NODE_SLOTS."""
+
+CRAWLER_NODE_STATUS_CACHE_TTL = 5
+"""Seconds during which the status of the scrapyd nodes is cached."""
+
+CRAWLER_JOB_RESULTS_GRACE_PERIOD = 6 * 60 * 60
+"""Seconds after which a job finished in scrapyd without results is errored.
+
+Used by :func:`inspire_crawler.tasks.sync_job_statuses`. It should leave
+enough time for the results to go through the results queue.
+"""
+
+CRAWLER_SPIDERS_CACHE_TTL = 300
+"""Seconds during which the list of spiders deployed in scrapyd is cached.
+
+Spiders are checked against it before being scheduled, and it is refreshed
+on the spot for spiders that are not in it.
+"""
+
 CRAWLER_DATA_TYPE = "hep"
 """WorkflowObject `data_type` to set to all workflow objects."""
 
@@ -62,6 +96,28 @@ You can also pass arguments directly to the scheduler with kwargs.
 
 CRAWLER_OAIHARVEST_OUTPUT_DIRECTORY = "crawls"
 
+CRAWLER_OAIHARVEST_RECORDS_PER_JOB = 10000
+"""Maximum number of harvested OAI-PMH records crawled in a single job."""
+
+CRAWLER_OAIHARVEST_BYTES_PER_JOB = 64 * 1024 * 1024
+"""Maximum size in bytes of the harvested OAI-PMH records of a single job.
+
+Harvested records are written to as few files as these limits allow, each of
+them crawled in its own job, instead of one job every 1000 records.
+"""
+
+CRAWLER_OAIHARVEST_COMPRESSION = None
+"""Compression of the files of harvested OAI-PMH records.
+
+One of ``'gzip'``, ``'bz2'`` or ``'xz'``, the latter needing the ``xz``
+extra on Python 2. The spiders must be able to read compressed files.
+"""
+
+CRAWLER_OAIHARVEST_SCHEDULE_CONCURRENCY = None
+"""Maximum number of crawls of a harvest being scheduled at the same time.
+
+The crawls are scheduled by Celery tasks, all at once when ``None``.
+"""
 
 CRAWLER_CELERY_QUEUE = "harvests"
 """Name of the celery queue to use for harvests, if set to 'None' will not use
@@ -70,3 +126,178 @@ any specific name.
 
 CELERY_QUEUE_SPIDER_MAPPING = {}
 """Mapping of spider names to corresponding queues for submitting results"""
+
+CRAWLER_SUBMIT_RESULTS_BATCH_SIZE = 100
+"""Number of crawl results written to the database in a single transaction.
+
+Each batch of workflow objects is committed together with the rows linking
+them to their crawler job, and the workflows are started only once the batch
+is committed.
+"""
+
+CRAWLER_SHARE_WORKFLOW_ENGINE = False
+"""Whether to create one workflow engine per batch of crawl results.
+
+By default, every crawl result gets its own workflow engine row. When set to
+``True``, a single engine is created and saved for each batch of
+``CRAWLER_SUBMIT_RESULTS_BATCH_SIZE`` results and shared by all of its
+workflow objects, which saves one insert per record in the workflows table.
+The ``start`` task creates its own engine when running the workflow, so this
+only affects the engine the objects are attached to until they are started.
+"""
+
+CRAWLER_WORKFLOW_DISPATCH = 'task'
+"""How to start the workflows of each committed batch of crawl results.
+
+* ``'task'``: publish one ``start`` task per workflow object.
+* ``'group'``: publish the ``start`` tasks of a batch as a single Celery
+  group, sharing one producer connection.
+* ``'batch'``: publish a single ``start_many`` task per batch, that runs the
+  workflow on the objects of the batch one after the other.
+"""
+
+CRAWLER_SUBMIT_RESULTS_SHARD_SIZE = None
+"""Size in bytes above which a results file is processed in parallel.
+
+When set, results files bigger than this size are split in byte ranges of
+this size, each of them processed by its own ``submit_results_shard`` task,
+so that a single big job can be spread across all the Celery workers. The
+job is marked as finished once all of its shards are processed.
+"""
+
+CRAWLER_DEDUPLICATE_RECORDS = False
+"""Whether to skip the records that were already ingested by previous jobs.
+
+When enabled, a fingerprint of every ingested record is stored, and a record
+with a known fingerprint does not create a new workflow object: the existing
+object is linked to the crawler job instead, and no workflow is started.
+"""
+
+CRAWLER_FINGERPRINT_IGNORED_FIELDS = ['acquisition_source']
+"""Top level record fields ignored when computing record fingerprints.
+
+They should list the fields that change at every crawl of the same record,
+such as the date and submission number of its acquisition source.
+"""
+
+CRAWLER_JSON_DECODER = None
+"""Name of the JSON library decoding the crawl results.
+
+One of ``'orjson'``, ``'rapidjson'``, ``'ujson'``, ``'simplejson'`` or
+``'json'``. By default, the fastest of them that is installed is used.
+"""
+
+CRAWLER_RESULTS_DECODE_PROCESSES = None
+"""Number of processes decoding each results file.
+
+When set to more than one, uncompressed JSON lines files bigger than
+``CRAWLER_RESULTS_DECODE_CHUNK_SIZE`` are memory-mapped, split in chunks of
+lines of about that size, and the chunks are decoded in a pool of that many
+processes. The records are still ingested in the order of the file.
+"""
+
+CRAWLER_RESULTS_DECODE_CHUNK_SIZE = 8 * 1024 * 1024
+"""Size in bytes of the chunks of results decoded by each process."""
+
+CRAWLER_METRICS_ENABLED = False
+"""Whether to expose the crawler metrics at ``CRAWLER_METRICS_URL``."""
+
+CRAWLER_METRICS_URL = '/crawler/metrics'
+"""URL of the crawler metrics, in the Prometheus text format."""
+
+CRAWLER_METRICS_DIRECTORY = None
+"""Directory shared by the processes of the host to exchange their metrics.
+
+The Celery workers write a snapshot of their metrics there after each crawler
+task, and the metrics endpoint adds them up with its own. Without it, the
+endpoint only shows the metrics of the web process serving it. The snapshots
+of the processes that exited are added up in ``metrics-exited.json``.
+"""
+
+CRAWLER_METRICS_PUSHGATEWAY_URL = None
+"""URL of a Prometheus pushgateway to push the metrics to after each task.
+
+The metrics are pushed with the hostname as ``instance``, adding up all the
+processes sharing ``CRAWLER_METRICS_DIRECTORY``. Without it, the pushes of
+the processes of a host replace each other, so it must be set when the host
+runs more than one worker process.
+"""
+
+CRAWLER_RESULTS_BLOB_STORE = None
+"""Directory of the store of big results payloads.
+
+It must be shared by the producers of the ``submit_results`` tasks and the
+Celery workers. When set, the ``results_data`` payloads published with
+:func:`inspire_crawler.tasks.send_results` that are bigger than
+``CRAWLER_RESULTS_BLOB_THRESHOLD`` are written there instead of being sent
+inline in the task message, and are deleted once their job is finished.
+Producers outside of the application write their payloads there directly,
+see :mod:`inspire_crawler.blobstore`.
+"""
+
+CRAWLER_RESULTS_BLOB_THRESHOLD = 1024 * 1024
+"""Size in bytes above which ``results_data`` payloads are stored as blobs."""
+
+CRAWLER_CRAWL_RESULT_MAX_SIZES = {}
+"""Maximal length of the values of some keys of the crawl results.
+
+For instance ``{'errors': 100, 'source_data': 10 * 1024 * 1024}``. Crawl
+results exceeding them are ingested as workflow objects in error state, like
+the ones missing required keys.
+"""
+
+CRAWLER_MAX_INVALID_RESULTS_RATIO = None
+"""Fraction of invalid crawl results above which a job is rejected.
+
+The format of the crawl results is always validated before writing them.
+When set, all the results of a job are first checked, before any of them is
+ingested, and results with a larger proportion of invalid ones mark the job
+as failed without creating any workflow object, instead of creating a
+workflow object in error state for each invalid result.
+"""
+
+CRAWLER_QUEUE_DEPTH_CACHE_TTL = 10
+"""Seconds during which the depths of the results queues are cached.
+
+``schedule_crawl`` calls with a ``queue_size_limit`` read the depth of the
+results queue of their spider from a per-process cache, refreshed over a
+single broker connection for all the stale queues. Set it to ``0`` to read
+the depth from the broker at every call.
+"""
+
+CRAWLER_SCHEDULER_TARGET_DEPTH = 10000
+"""Depth of the results queues kept by ``schedule_crawl_adaptive``.
+
+Crawls of a spider are only scheduled while its results queue, given by
+``CELERY_QUEUE_SPIDER_MAPPING``, holds fewer messages, and they are paced
+by the rate at which the queue is drained.
+"""
+
+CRAWLER_SCHEDULER_BURST = 2
+"""Number of crawls of a spider that can be scheduled at once.
+
+This is the capacity of the token bucket of each spider.
+"""
+
+CRAWLER_SCHEDULER_MIN_COUNTDOWN = 60
+"""Minimal number of seconds after which a deferred crawl is retried."""
+
+CRAWLER_SCHEDULER_MAX_COUNTDOWN = 1800
+"""Maximal number of seconds after which a deferred crawl is retried."""
+
+CRAWLER_SCRAPYD_POOL_SIZE = 10
+"""Number of keep-alive connections to scrapyd kept by each process."""
+
+CRAWLER_SCRAPYD_TIMEOUT = (5, 60)
+"""Timeout of the requests to scrapyd, in seconds.
+
+Either a number, or a ``(connect timeout, read timeout)`` tuple.
+"""
+
+CRAWLER_SCRAPYD_RETRIES = 3
+"""Number of times failed requests to scrapyd are retried.
+
+Connection errors are retried for all requests. Read errors and 502, 503 and
+504 responses are only retried for idempotent requests, so that a crawl is
+never scheduled twice.
+"""
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2016 CERN.
+#
+# INSPIRE is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Decoders of the records stored in results files.
+
+JSON lines are decoded with the fastest JSON library installed, unless one is
+forced with ``CRAWLER_JSON_DECODER``.
+
+Records can also be stored in binary formats, ``'msgpack'`` and ``'cbor'``,
+in which every record is preceded by its length in bytes, as an unsigned
+32 bits big-endian integer.
+"""
+
+from __future__ import absolute_import, print_function
+
+import importlib
+import struct
+
+from .errors import CrawlerUnsupportedResultsFormat
+
+
+JSON_DECODERS = ('orjson', 'rapidjson', 'ujson', 'simplejson', 'json')
+"""JSON libraries that can decode results, from the fastest one."""
+
+LENGTH_PREFIX = struct.Struct('>I')
+
+_json_decoders = {}
+
+
+def _import_json_decoder(name):
+    if name not in _json_decoders:
+        try:
+            _json_decoders[name] = importlib.import_module(name).loads
+        except ImportError:
+            _json_decoders[name] = None
+
+    return _json_decoders[name]
+
+
+def get_json_decoder(name=None):
+    """Get the function decoding JSON documents.
+
+    :param name: name of the JSON library to use, one of
+        :data:`JSON_DECODERS`. When ``None``, the fastest installed library
+        is used.
+    :return: a function decoding a JSON document from UTF-8 encoded bytes.
+    """
+    if name is None:
+        for name in JSON_DECODERS:
+            loads = _import_json_decoder(name)
+            if loads is not None:
+                return loads
+
+    loads = None
+    if name in JSON_DECODERS:
+        loads = _import_json_decoder(name)
+
+    if loads is None:
+        raise CrawlerUnsupportedResultsFormat(
+            "JSON decoder {0} is not installed".format(name)
+        )
+
+    return loads
+
+
+def _msgpack_codec():
+    import msgpack
+    return (
+        lambda payload: msgpack.unpackb(payload, raw=False),
+        lambda record: msgpack.packb(record, use_bin_type=True),
+    )
+
+
+def _cbor_codec():
+    import cbor2
+    return cbor2.loads, cbor2.dumps
+
+
+BINARY_CODECS = {
+    'cbor': _cbor_codec,
+    'msgpack': _msgpack_codec,
+}
+
+
+def _get_binary_codec(results_format):
+    try:
+        return BINARY_CODECS[results_format]()
+    except ImportError:
+        raise CrawlerUnsupportedResultsFormat(
+            "Support for {0} records is not installed".format(results_format)
+        )
+
+
+def iter_binary_records(stream, results_format):
+    """Iterate over the length-prefixed records of a binary stream.
+
+    :param results_format: ``'msgpack'`` or ``'cbor'``.
+    """
+    loads, _ = _get_binary_codec(results_format)
+    while True:
+        prefix = stream.read(LENGTH_PREFIX.size)
+        if not prefix:
+            break
+
+        payload = b''
+        if len(prefix) == LENGTH_PREFIX.size:
+            length, = LENGTH_PREFIX.unpack(prefix)
+            payload = stream.read(length)
+
+        if not payload or len(payload) != length:
+            raise CrawlerUnsupportedResultsFormat(
+                "Truncated {0} record".format(results_format)
+            )
+
+        yield loads(payload)
+
+
+def pack_binary_record(record, results_format):
+    """Encode a record as stored in a binary results file.
+
+    :param results_format: ``'msgpack'`` or ``'cbor'``.
+    """
+    _, dumps = _get_binary_codec(results_format)
+    payload = dumps(record)
+    return LENGTH_PREFIX.pack(len(payload)) + payload
@@ -34,6 +34,10 @@ class CrawlerScheduleError(CrawlerError):
     """Problem scheduling crawler."""
 
 
+class CrawlerSpiderNotFound(CrawlerScheduleError):
+    """The spider to schedule is not deployed in scrapyd."""
+
+
 class CrawlerJobNotExistError(CrawlerError):
     """Problem getting crawler job."""
 
@@ -44,3 +48,20 @@ class CrawlerInvalidResultsPath(CrawlerError):
 
 class CrawlerJobError(CrawlerError):
     """There was an error with a job."""
+
+
+class CrawlerUnsupportedResultsFormat(CrawlerError):
+    """The results file is in a format that cannot be read."""
+
+
+class CrawlerResultsRejected(CrawlerJobError):
+    """Too many crawl results of a job are invalid."""
+
+
+class CrawlerWorkflowStartError(CrawlerError):
+    """Workflows failed on some workflow objects."""
+
+    def __init__(self, message, object_ids):
+        """Keep the ids of the objects the workflows failed on."""
+        super(CrawlerWorkflowStartError, self).__init__(message)
+        self.object_ids = object_ids
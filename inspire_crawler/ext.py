@@ -26,7 +26,7 @@
 
 from __future__ import absolute_import, print_function
 
-from . import config
+from . import config, views
 from .cli import crawler as crawler_cmd
 
 
@@ -43,6 +43,12 @@ class INSPIRECrawler(object):
         self.init_config(app)
         app.extensions['inspire-crawler'] = self
         app.cli.add_command(crawler_cmd)
+        if app.config['CRAWLER_METRICS_ENABLED']:
+            app.add_url_rule(
+                app.config['CRAWLER_METRICS_URL'],
+                'inspire_crawler_metrics',
+                views.metrics,
+            )
 
     def init_config(self, app):
         """Initialize configuration."""
@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2016 CERN.
+#
+# INSPIRE is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Metrics of the crawler scheduling and results ingestion.
+
+Metrics are collected in an in-process registry and exposed in the
+Prometheus text format, by the ``CRAWLER_METRICS_URL`` endpoint of the
+Flask application when ``CRAWLER_METRICS_ENABLED`` is set.
+
+Results are ingested by Celery workers, in other processes than the web
+application. To make their metrics available, every process can write a
+snapshot of its registry to ``CRAWLER_METRICS_DIRECTORY`` after each task,
+which the endpoint adds up with its own metrics, and/or push the metrics of
+the host to a Prometheus pushgateway at ``CRAWLER_METRICS_PUSHGATEWAY_URL``.
+The snapshots of the processes that exited are added up in a single one, so
+that the directory does not grow with every worker restart.
+"""
+
+from __future__ import absolute_import, print_function
+
+import errno
+import fcntl
+import glob
+import json
+import os
+import socket
+import threading
+from contextlib import contextmanager
+from timeit import default_timer
+
+import requests
+from flask import current_app
+
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+    60.0, 300.0, 900.0, 3600.0,
+)
+"""Default upper bounds of the histogram buckets, in seconds."""
+
+SIZE_BUCKETS = (0, 10, 100, 1000, 10000, 100000, 1000000)
+"""Upper bounds of the buckets of the histograms of sizes."""
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    labels = list(zip(labelnames, labelvalues)) + list(extra)
+    if not labels:
+        return ''
+
+    return '{' + ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', r'\\').replace('\n', r'\n')
+            .replace('"', r'\"'),
+        )
+        for name, value in labels
+    ) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value))
+
+
+class _Metric(object):
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def copy(self):
+        """Return an empty metric with the same definition."""
+        return type(self)(self.name, self.documentation, self.labelnames)
+
+    def render(self):
+        lines = [
+            '# HELP {} {}'.format(self.name, self.documentation),
+            '# TYPE {} {}'.format(self.name, self.type),
+        ]
+        for key in sorted(self.values):
+            lines.extend(self._render_samples(key, self.values[key]))
+
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """Increment the counter of the given label values."""
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def merge(self, values):
+        with self._lock:
+            for key, value in values:
+                key = tuple(key)
+                self.values[key] = self.values.get(key, 0) + value
+
+    def _render_samples(self, key, value):
+        yield '{}{} {}'.format(
+            self.name,
+            _format_labels(self.labelnames, key),
+            _format_value(value),
+        )
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def copy(self):
+        """Return an empty metric with the same definition."""
+        return type(self)(
+            self.name, self.documentation, self.labelnames, self.buckets[:-1]
+        )
+
+    def observe(self, value, **labels):
+        """Record an observation for the given label values."""
+        key = self._key(labels)
+        with self._lock:
+            counts = self.values.setdefault(
+                key, [0] * len(self.buckets) + [0.0]
+            )
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[idx] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a block, in seconds."""
+        start = default_timer()
+        try:
+            yield
+        finally:
+            self.observe(default_timer() - start, **labels)
+
+    def merge(self, values):
+        with self._lock:
+            for key, counts in values:
+                current = self.values.setdefault(
+                    tuple(key), [0] * len(self.buckets) + [0.0]
+                )
+                for idx, count in enumerate(counts):
+                    current[idx] += count
+
+    def _render_samples(self, key, counts):
+        for bound, count in zip(self.buckets, counts):
+            yield '{}_bucket{} {}'.format(
+                self.name,
+                _format_labels(
+                    self.labelnames, key, [('le', _format_value(bound))]
+                ),
+                _format_value(count),
+            )
+
+        labels = _format_labels(self.labelnames, key)
+        yield '{}_sum{} {}'.format(
+            self.name, labels, _format_value(counts[-1])
+        )
+        yield '{}_count{} {}'.format(
+            self.name, labels, _format_value(counts[-2])
+        )
+
+
+class Registry(object):
+    """Collection of metrics."""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """Create and register a :class:`Counter`."""
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), **kwargs):
+        """Create and register a :class:`Histogram`."""
+        return self.register(
+            Histogram(name, documentation, labelnames, **kwargs)
+        )
+
+    def snapshot(self):
+        """Return the current values of the metrics, serializable to JSON."""
+        snapshot = {}
+        for name, metric in self.metrics.items():
+            with metric._lock:
+                snapshot[name] = [
+                    [list(key), value] for key, value in metric.values.items()
+                ]
+
+        return snapshot
+
+    def copy(self):
+        """Return an empty registry with the same metrics."""
+        registry = Registry()
+        for metric in self.metrics.values():
+            registry.register(metric.copy())
+
+        return registry
+
+    def merged(self, snapshots):
+        """Return a new registry adding up this one and some snapshots."""
+        registry = self.copy()
+
+        for snapshot in [self.snapshot()] + list(snapshots):
+            for name, values in snapshot.items():
+                if name in registry.metrics:
+                    registry.metrics[name].merge(values)
+
+        return registry
+
+    def render(self):
+        """Render the metrics in the Prometheus text format."""
+        lines = []
+        for name in sorted(self.metrics):
+            lines.extend(self.metrics[name].render())
+
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+SCHEDULE_CRAWL_CALLS = REGISTRY.counter(
+    'crawler_schedule_crawl_total',
+    'Calls to schedule_crawl, by outcome: scheduled, skipped or error.',
+    ('spider', 'outcome'),
+)
+SCRAPYD_REQUEST_SECONDS = REGISTRY.histogram(
+    'crawler_scrapyd_request_seconds',
+    'Duration of the requests to scrapyd.',
+    ('endpoint',),
+)
+QUEUE_DEPTH = REGISTRY.histogram(
+    'crawler_queue_depth',
+    'Number of messages in the results queues, at every queue-depth check.',
+    ('queue',),
+    buckets=SIZE_BUCKETS,
+)
+RECORDS_INGESTED = REGISTRY.counter(
+    'crawler_records_ingested_total',
+    'Crawl results ingested into workflow objects.',
+    ('spider',),
+)
+ERRORS = REGISTRY.counter(
+    'crawler_errors_total',
+    'Errors by kind: crawl results with errors, or failed jobs.',
+    ('spider', 'kind'),
+)
+SUBMIT_RESULTS_SECONDS = REGISTRY.histogram(
+    'crawler_submit_results_seconds',
+    'Duration of the submit_results and submit_results_shard tasks.',
+    ('spider',),
+)
+
+
+_flushed_pid = None
+"""Pid of the process that last flushed its metrics from this module."""
+
+
+def _snapshot_path(directory, pid):
+    return os.path.join(directory, 'metrics-{}.json'.format(pid))
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno != errno.ESRCH
+
+    return True
+
+
+@contextmanager
+def _lock(directory, blocking=True):
+    """Lock the snapshots of a directory, yielding whether it is locked."""
+    with open(os.path.join(directory, 'metrics.lock'), 'a') as lock:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.lockf(lock, flags)
+        except IOError as e:
+            if e.errno not in (errno.EACCES, errno.EAGAIN):
+                raise
+            locked = False
+        else:
+            locked = True
+
+        try:
+            yield locked
+        finally:
+            if locked:
+                fcntl.lockf(lock, fcntl.LOCK_UN)
+
+
+def _write_snapshot(path, snapshot):
+    with open(path + '.tmp', 'w') as fd:
+        json.dump(snapshot, fd)
+    os.rename(path + '.tmp', path)
+
+
+def _read_snapshot(path):
+    try:
+        with open(path) as fd:
+            return json.load(fd)
+    except (IOError, ValueError):
+        current_app.logger.warning(
+            'Could not read the metrics in {}'.format(path)
+        )
+
+
+def _archive(directory, paths):
+    """Add up the snapshots of exited processes in a single one.
+
+    Must be called with the directory locked.
+    """
+    archive_path = _snapshot_path(directory, 'exited')
+    if os.path.exists(archive_path):
+        paths = [archive_path] + paths
+    snapshots = [_read_snapshot(path) for path in paths]
+    _write_snapshot(
+        archive_path,
+        REGISTRY.copy().merged(
+            snapshot for snapshot in snapshots if snapshot is not None
+        ).snapshot(),
+    )
+    for path in paths:
+        if path != archive_path:
+            os.remove(path)
+
+
+def _collect_snapshots(directory):
+    """Read the snapshots of the other processes, archiving exited ones.
+
+    Must be called with the directory locked.
+    """
+    own_path = _snapshot_path(directory, os.getpid())
+    exited = []
+    for path in glob.glob(_snapshot_path(directory, '*')):
+        pid = os.path.basename(path)[len('metrics-'):-len('.json')]
+        if pid.isdigit() and path != own_path and not _is_running(int(pid)):
+            exited.append(path)
+    if exited:
+        _archive(directory, exited)
+
+    snapshots = []
+    for path in sorted(glob.glob(_snapshot_path(directory, '*'))):
+        if path == own_path:
+            continue
+        snapshot = _read_snapshot(path)
+        if snapshot is not None:
+            snapshots.append(snapshot)
+
+    return snapshots
+
+
+def _push(pushgateway_url, registry):
+    requests.put(
+        '{}/metrics/job/inspire_crawler/instance/{}'.format(
+            pushgateway_url.rstrip('/'),
+            socket.gethostname(),
+        ),
+        data=registry.render(),
+        headers={'Content-Type': 'text/plain; version=0.0.4'},
+        timeout=5,
+    ).raise_for_status()
+
+
+def flush():
+    """Publish the metrics of the current process, as configured.
+
+    Called at the end of the crawler tasks, it writes a snapshot of the
+    registry to ``CRAWLER_METRICS_DIRECTORY`` and pushes the metrics to
+    ``CRAWLER_METRICS_PUSHGATEWAY_URL``, when they are set. Failures are
+    logged and never fail the task.
+
+    The metrics are pushed under the hostname, adding up the snapshots of
+    all the processes of the host. Pushes are serialized, so that older
+    totals never replace newer ones: a process finding another one pushing
+    skips its push, and its metrics are pushed by the next one.
+    """
+    global _flushed_pid
+
+    directory = current_app.config['CRAWLER_METRICS_DIRECTORY']
+    pushgateway_url = current_app.config['CRAWLER_METRICS_PUSHGATEWAY_URL']
+    try:
+        if directory:
+            path = _snapshot_path(directory, os.getpid())
+            if _flushed_pid != os.getpid():
+                # Left by an exited process with the same pid.
+                with _lock(directory):
+                    if os.path.exists(path):
+                        _archive(directory, [path])
+                _flushed_pid = os.getpid()
+            _write_snapshot(path, REGISTRY.snapshot())
+
+        if pushgateway_url and directory:
+            with _lock(directory, blocking=False) as locked:
+                if locked:
+                    _push(
+                        pushgateway_url,
+                        REGISTRY.merged(_collect_snapshots(directory)),
+                    )
+        elif pushgateway_url:
+            _push(pushgateway_url, REGISTRY)
+    except (IOError, OSError, requests.RequestException):
+        current_app.logger.exception('Could not publish the metrics.')
+
+
+def render():
+    """Render the metrics of all the processes in the Prometheus format."""
+    snapshots = []
+    directory = current_app.config['CRAWLER_METRICS_DIRECTORY']
+    if directory:
+        try:
+            with _lock(directory):
+                snapshots = _collect_snapshots(directory)
+        except (IOError, OSError):
+            current_app.logger.exception(
+                'Could not read the metrics in {}'.format(directory)
+            )
+
+    return REGISTRY.merged(snapshots).render()
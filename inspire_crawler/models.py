@@ -31,7 +31,10 @@ from enum import Enum
 
 from invenio_db import db
 
-from sqlalchemy_utils.types import ChoiceType, UUIDType
+from sqlalchemy import case
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy_utils.types import ChoiceType, JSONType, UUIDType
 from sqlalchemy.orm.exc import NoResultFound
 
 from invenio_workflows.models import WorkflowObjectModel
@@ -39,6 +42,30 @@ from invenio_workflows.models import WorkflowObjectModel
 from .errors import CrawlerJobNotExistError
 
 
+def _insert_if_missing(table, **values):
+    """Insert a row, unless one with the same primary key exists.
+
+    On PostgreSQL, it is an ``INSERT ... ON CONFLICT DO NOTHING``, that waits
+    for concurrent transactions inserting the same key. On other databases,
+    the insert is made in a savepoint rolled back on conflict.
+
+    :return: whether the row was inserted.
+    """
+    if db.session.bind.dialect.name == 'postgresql':
+        result = db.session.execute(
+            postgresql.insert(table).values(**values).on_conflict_do_nothing()
+        )
+        return bool(result.rowcount)
+
+    try:
+        with db.session.begin_nested():
+            db.session.execute(table.insert().values(**values))
+    except IntegrityError:
+        return False
+
+    return True
+
+
 class JobStatus(Enum):
     """Constants for possible status of any given PID."""
 
@@ -79,11 +106,23 @@ class CrawlerJob(db.Model):
                           default=datetime.now,
                           nullable=False,
                           index=True)
+    shards_pending = db.Column(db.Integer, nullable=True)
+    stats = db.Column(
+        JSONType().with_variant(
+            postgresql.JSON(none_as_null=True),
+            'postgresql',
+        ),
+        nullable=True,
+    )
+    node = db.Column(db.String(255), nullable=True)
 
     @classmethod
     def create(cls, job_id, spider, workflow, results=None,
-               logs=None, status=JobStatus.PENDING):
-        """Create a new entry for a scheduled crawler job."""
+               logs=None, status=JobStatus.PENDING, node=None):
+        """Create a new entry for a scheduled crawler job.
+
+        :param node: URL of the scrapyd node running the job.
+        """
         obj = cls(
             job_id=job_id,
             spider=spider,
@@ -91,6 +130,7 @@ class CrawlerJob(db.Model):
             results=results,
             logs=logs,
             status=status,
+            node=node,
         )
         db.session.add(obj)
         return obj
@@ -105,6 +145,82 @@ class CrawlerJob(db.Model):
         except NoResultFound:
             raise CrawlerJobNotExistError(job_id)
 
+    @classmethod
+    def get_for_update(cls, job_id):
+        """Get a job, reloaded from the database and locked until commit."""
+        try:
+            return cls.query.filter_by(
+                job_id=job_id
+            ).populate_existing().with_for_update().one()
+        except NoResultFound:
+            raise CrawlerJobNotExistError(job_id)
+
+    @classmethod
+    def finish(cls, job_id, status):
+        """Set the final status of a job.
+
+        The shards of the job that are still pending, if any, are cancelled
+        by setting the counter of pending shards to zero.
+        """
+        cls.query.filter_by(job_id=job_id).update(
+            {
+                cls.status: status,
+                cls.shards_pending: case(
+                    [(cls.shards_pending.isnot(None), 0)], else_=None
+                ),
+            },
+            synchronize_session=False,
+        )
+
+    @classmethod
+    def complete_shard(cls, job_id):
+        """Account for a processed shard of the results of a job.
+
+        The counter of pending shards is decremented, and the job marked as
+        finished when it reaches zero, in the same transaction. The row lock
+        taken by the first update serializes concurrent shards of a job.
+        Jobs that errored in the meantime are left as they are.
+
+        :return: whether it was the last pending shard of the job.
+        """
+        query = cls.query.filter(
+            cls.job_id == job_id,
+            cls.status != JobStatus.ERROR,
+        )
+        query.update(
+            {cls.shards_pending: cls.shards_pending - 1},
+            synchronize_session=False,
+        )
+        finished = query.filter(cls.shards_pending <= 0).update(
+            {cls.status: JobStatus.FINISHED},
+            synchronize_session=False,
+        )
+        return bool(finished)
+
+    @classmethod
+    def update_statuses(cls, job_ids, status, previous_statuses,
+                        without_results=False):
+        """Move several jobs forward to a status in a single statement.
+
+        :param previous_statuses: statuses the jobs can move to ``status``
+            from. The jobs with any other status are left as they are, so
+            that a job never moves back, e.g. from running to pending.
+        :param without_results: only update the jobs whose results have not
+            been submitted.
+        :return: the number of jobs updated.
+        """
+        if not job_ids:
+            return 0
+
+        query = cls.query.filter(
+            cls.job_id.in_(job_ids),
+            cls.status.in_(previous_statuses),
+        )
+        if without_results:
+            query = query.filter(cls.results.is_(None))
+
+        return query.update({cls.status: status}, synchronize_session=False)
+
     def save(self):
         """Save object to persistent storage."""
         with db.session.begin_nested():
@@ -127,8 +243,185 @@ class CrawlerWorkflowObject(db.Model):
         primary_key=True
     )
 
+    @classmethod
+    def bulk_create(cls, job_id, object_ids):
+        """Link several workflow objects to a crawler job at once.
+
+        All the rows are sent in a single ``executemany`` statement, that
+        the database drivers turn into a bulk insert where supported.
+        """
+        if not object_ids:
+            return
+
+        db.session.execute(
+            cls.__table__.insert(),
+            [
+                {'job_id': job_id, 'object_id': object_id}
+                for object_id in object_ids
+            ],
+        )
+
+    @classmethod
+    def filter_unlinked(cls, job_id, object_ids):
+        """Return the given workflow objects that are not linked to a job."""
+        linked = set(
+            object_id for object_id, in db.session.query(cls.object_id).filter(
+                cls.job_id == job_id,
+                cls.object_id.in_(object_ids),
+            )
+        )
+        return [
+            object_id for object_id in object_ids if object_id not in linked
+        ]
+
+
+class CrawlerIngestionCheckpoint(db.Model):
+    """Progress of the ingestion of the results of a job.
+
+    Results split in shards get one checkpoint per shard, identified by the
+    offset of the shard in the results file. Results processed as a whole
+    are identified by the offset ``0``.
+
+    ``unpublished`` holds the ids of the objects of the last committed batch
+    whose workflows are not started yet, and ``dispatched`` tells whether the
+    task processing a shard was published.
+
+    Redelivered tasks can run concurrently with the original ones, so the
+    progress of a checkpoint is only moved forward with its row locked, by
+    the worker that last read it, see :meth:`get_for_update`.
+    """
+
+    __tablename__ = 'crawler_ingestion_checkpoint'
+
+    job_id = db.Column(UUIDType, primary_key=True)
+    shard = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    ingested = db.Column(db.Integer, nullable=False, default=0)
+    finished = db.Column(
+        db.Boolean(name='finished'),
+        nullable=False,
+        default=False
+    )
+    unpublished = db.Column(
+        JSONType().with_variant(
+            postgresql.JSON(none_as_null=True),
+            'postgresql',
+        ),
+        nullable=True,
+    )
+    dispatched = db.Column(
+        db.Boolean(name='dispatched'),
+        nullable=False,
+        default=False,
+        server_default=db.false(),
+    )
+
+    @classmethod
+    def get_or_create(cls, job_id, shard=0):
+        """Get the checkpoint of a job shard, creating it if needed.
+
+        A missing checkpoint is inserted first, so that concurrent workers
+        creating it do not conflict.
+        """
+        _insert_if_missing(
+            cls.__table__,
+            job_id=job_id,
+            shard=shard,
+            ingested=0,
+            finished=False,
+            dispatched=False,
+        )
+        return cls.query.filter_by(job_id=job_id, shard=shard).one()
+
+    @classmethod
+    def get_for_update(cls, job_id, shard=0):
+        """Get an existing checkpoint, reloaded and locked until commit."""
+        return cls.query.filter_by(
+            job_id=job_id,
+            shard=shard,
+        ).populate_existing().with_for_update().one()
+
+
+class CrawlerRecordFingerprint(db.Model):
+    """Fingerprint of the content of a record already ingested."""
+
+    __tablename__ = 'crawler_record_fingerprint'
+
+    fingerprint = db.Column(db.String(64), primary_key=True)
+    object_id = db.Column(
+        db.Integer,
+        db.ForeignKey(
+            WorkflowObjectModel.id,
+            ondelete="CASCADE",
+            onupdate="CASCADE",
+        ),
+        nullable=False,
+        index=True,
+    )
+    job_id = db.Column(UUIDType, nullable=False)
+
+    @classmethod
+    def create(cls, fingerprint, object_id, job_id):
+        """Record the fingerprint of the record of a workflow object.
+
+        :return: whether it was recorded, ``False`` if the fingerprint was
+            already recorded, e.g. by a concurrent job.
+        """
+        return _insert_if_missing(
+            cls.__table__,
+            fingerprint=fingerprint,
+            object_id=object_id,
+            job_id=job_id,
+        )
+
+    @classmethod
+    def get_object_ids(cls, fingerprints):
+        """Get the workflow objects already created for some fingerprints.
+
+        :return: a dictionary of the ids of the workflow objects, by
+            fingerprint, for the fingerprints that are known.
+        """
+        if not fingerprints:
+            return {}
+
+        return dict(
+            db.session.query(cls.fingerprint, cls.object_id).filter(
+                cls.fingerprint.in_(fingerprints)
+            )
+        )
+
+
+class CrawlerSpiderBucket(db.Model):
+    """Token bucket limiting the rate at which a spider is scheduled."""
+
+    __tablename__ = 'crawler_spider_bucket'
+
+    spider = db.Column(db.String(255), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated = db.Column(db.DateTime, nullable=False)
+    queue_depth = db.Column(db.Integer, nullable=True)
+    measured = db.Column(db.DateTime, nullable=True)
+    drain_rate = db.Column(db.Float, nullable=True)
+
+    @classmethod
+    def get_for_update(cls, spider, tokens, now):
+        """Get the bucket of a spider, locking it until commit.
+
+        A missing bucket is inserted first, so that concurrent workers
+        creating it do not conflict, and then locked like existing ones.
+
+        :param tokens: initial number of tokens of a new bucket.
+        :param now: creation time of a new bucket.
+        """
+        _insert_if_missing(
+            cls.__table__, spider=spider, tokens=tokens, updated=now
+        )
+        return cls.query.filter_by(spider=spider).with_for_update().one()
+
 
 __all__ = (
+    'CrawlerIngestionCheckpoint',
     'CrawlerJob',
+    'CrawlerRecordFingerprint',
+    'CrawlerSpiderBucket',
     'CrawlerWorkflowObject',
 )
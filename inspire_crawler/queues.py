@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2016 CERN.
+#
+# INSPIRE is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Monitoring of the depth of the Celery queues of crawl results."""
+
+from __future__ import absolute_import, print_function
+
+import threading
+from timeit import default_timer
+
+from flask import current_app
+from flask_celeryext.app import current_celery_app
+
+from . import metrics
+
+
+class QueueDepthMonitor(object):
+    """Cache of the number of messages waiting in Celery queues.
+
+    Depths are read with passive ``queue_declare`` calls, and cached for
+    ``ttl`` seconds. When the depth of a queue is stale, the depths of all
+    the stale queues seen so far are refreshed together, over a single
+    broker connection, so that a burst of scheduling calls for different
+    spiders opens one connection per TTL instead of one per call.
+
+    Queues that do not exist yet are reported as empty.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._depths = {}
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, queue, now):
+        return (
+            queue in self._depths and
+            now - self._depths[queue][1] < self.ttl
+        )
+
+    def get_depth(self, queue):
+        """Return the number of messages waiting in a queue."""
+        with self._lock:
+            now = default_timer()
+            if not self._is_fresh(queue, now):
+                stale = set(
+                    name for name in self._depths
+                    if not self._is_fresh(name, now)
+                )
+                stale.add(queue)
+                self.refresh(sorted(stale))
+
+            return self._depths[queue][0]
+
+    def refresh(self, queues):
+        """Read the depths of some queues from the broker.
+
+        Each queue is declared on its own channel, as the broker closes the
+        channel of a failed passive declaration, e.g. of a missing queue.
+        """
+        with current_celery_app.connection_or_acquire() as conn:
+            for queue in queues:
+                channel = conn.channel()
+                try:
+                    depth = channel.queue_declare(
+                        queue=queue, passive=True
+                    ).message_count
+                except conn.channel_errors:
+                    current_app.logger.warning(
+                        'Could not read the depth of queue {}'.format(queue),
+                        exc_info=True,
+                    )
+                    depth = 0
+                finally:
+                    channel.close()
+
+                self._depths[queue] = (depth, default_timer())
+                metrics.QUEUE_DEPTH.observe(depth, queue=queue)
+
+    def clear(self):
+        """Forget the cached depths."""
+        with self._lock:
+            self._depths.clear()
+
+
+_monitors = {}
+
+
+def get_queue_depth(queue):
+    """Return the number of messages in a queue, cached per process.
+
+    Depths are cached for ``CRAWLER_QUEUE_DEPTH_CACHE_TTL`` seconds.
+    """
+    ttl = current_app.config['CRAWLER_QUEUE_DEPTH_CACHE_TTL']
+    monitor = _monitors.get(ttl)
+    if monitor is None:
+        monitor = _monitors.setdefault(ttl, QueueDepthMonitor(ttl))
+
+    return monitor.get_depth(queue)
@@ -27,31 +27,63 @@ from __future__ import absolute_import, print_function
 
 import pathlib2
 
+from celery import chain, group
 from flask import current_app
 
 from invenio_oaiharvester.signals import oaiharvest_finished
-from invenio_oaiharvester.utils import write_to_dir
 
-from .tasks import schedule_crawl
+from .spool import spool_records
+from .tasks import schedule_crawl, schedule_crawl_or_log
 
 
 @oaiharvest_finished.connect
 def receive_oaiharvest_job(request, records, name, **kwargs):
-    """Receive a list of harvested OAI-PMH records and schedule crawls."""
+    """Receive a list of harvested OAI-PMH records and schedule crawls.
+
+    The crawls are scheduled by Celery tasks, so that the harvest does not
+    wait for scrapyd. With ``CRAWLER_OAIHARVEST_SCHEDULE_CONCURRENCY`` set,
+    the tasks are split in as many chains, so that at most this number of
+    them run at once. The tasks of the chains log their errors instead of
+    raising them, so that a crawl that cannot be scheduled does not prevent
+    the following ones.
+    """
     spider = kwargs.get('spider')
     workflow = kwargs.get('workflow')
     if not spider or not workflow:
         return
 
-    files_created, _ = write_to_dir(
+    file_uris = []
+    for source_file in spool_records(
         records,
-        output_dir=current_app.config['CRAWLER_OAIHARVEST_OUTPUT_DIRECTORY']
-    )
-
-    for source_file in files_created:
+        current_app.config['CRAWLER_OAIHARVEST_OUTPUT_DIRECTORY'],
+        current_app.config['CRAWLER_OAIHARVEST_RECORDS_PER_JOB'],
+        current_app.config['CRAWLER_OAIHARVEST_BYTES_PER_JOB'],
+        current_app.config['CRAWLER_OAIHARVEST_COMPRESSION'],
+    ):
         # URI is required by scrapy.
-        file_uri = pathlib2.Path(source_file).as_uri()
-        schedule_crawl(spider, workflow, source_file=file_uri)
+        file_uris.append(pathlib2.Path(source_file).as_uri())
+
+    concurrency = current_app.config[
+        'CRAWLER_OAIHARVEST_SCHEDULE_CONCURRENCY'
+    ]
+    if concurrency and len(file_uris) > concurrency:
+        signatures = [
+            chain(
+                schedule_crawl_or_log.si(
+                    spider, workflow, source_file=file_uri
+                )
+                for file_uri in file_uris[partition::concurrency]
+            )
+            for partition in range(concurrency)
+        ]
+    else:
+        signatures = [
+            schedule_crawl.si(spider, workflow, source_file=file_uri)
+            for file_uri in file_uris
+        ]
+
+    if signatures:
+        group(signatures).apply_async()
 
 
 __all__ = (
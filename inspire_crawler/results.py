@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2016 CERN.
+#
+# INSPIRE is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Reading of the results files produced by the crawler.
+
+Results files store one crawl result per line, in JSON, unless their name
+ends with ``.msgpack`` or ``.cbor``, before any compression extension, in
+which case they store length-prefixed binary records as described in
+:mod:`inspire_crawler.decoders`.
+"""
+
+from __future__ import absolute_import, print_function
+
+import bz2
+import gzip
+import io
+import json
+import mmap
+import multiprocessing
+import os
+from contextlib import closing
+from timeit import default_timer
+
+from flask import current_app
+
+from .decoders import get_json_decoder, iter_binary_records
+from .errors import CrawlerUnsupportedResultsFormat
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESSION_EXTENSIONS = {
+    '.bz2': 'bz2',
+    '.gz': 'gzip',
+    '.xz': 'xz',
+    '.zst': 'zstd',
+}
+"""Compression of the results files, by file extension."""
+
+COMPRESSION_MAGIC_NUMBERS = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+)
+"""Compression of the results files, by leading bytes of their content."""
+
+FORMAT_EXTENSIONS = {
+    '.cbor': 'cbor',
+    '.msgpack': 'msgpack',
+}
+"""Binary formats of the results files, by file extension."""
+
+
+def get_compression(path):
+    """Detect the compression of a file.
+
+    The compression is guessed from the file extension, then from the first
+    bytes of the file for files without a known extension.
+
+    :return: ``'gzip'``, ``'bz2'``, ``'xz'``, ``'zstd'``, or ``None`` for
+        uncompressed files.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in COMPRESSION_EXTENSIONS:
+        return COMPRESSION_EXTENSIONS[extension]
+
+    with open(path, 'rb') as fd:
+        header = fd.read(6)
+
+    for magic_number, compression in COMPRESSION_MAGIC_NUMBERS:
+        if header.startswith(magic_number):
+            return compression
+
+    return None
+
+
+def get_format(path):
+    """Detect the format of the records of a results file.
+
+    :return: ``'msgpack'``, ``'cbor'``, or ``'jsonl'`` for JSON lines.
+    """
+    root, extension = os.path.splitext(path)
+    if extension.lower() in COMPRESSION_EXTENSIONS:
+        extension = os.path.splitext(root)[1]
+
+    return FORMAT_EXTENSIONS.get(extension.lower(), 'jsonl')
+
+
+def is_splittable(path):
+    """Whether a results file can be read from arbitrary byte offsets.
+
+    Only uncompressed JSON lines files can, as their records are found by
+    looking for the next line break.
+    """
+    return get_compression(path) is None and get_format(path) == 'jsonl'
+
+
+def open_results(path):
+    """Open a results file in binary mode, decompressing it on the fly.
+
+    Data is decompressed while it is read, so that even big compressed files
+    can be read line by line without inflating them in memory.
+    """
+    compression = get_compression(path)
+    if compression is None:
+        return open(path, 'rb')
+    elif compression == 'gzip':
+        return gzip.open(path, 'rb')
+    elif compression == 'bz2':
+        return bz2.BZ2File(path, 'rb')
+    elif compression == 'xz' and lzma is not None:
+        return lzma.open(path, 'rb')
+    elif compression == 'zstd' and zstandard is not None:
+        return io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'))
+        )
+
+    raise CrawlerUnsupportedResultsFormat(
+        "Support for {0} compression is not installed, needed for: {1}".format(
+            compression, path
+        )
+    )
+
+
+def read_results(path, start=0, end=None, stats=None):
+    """Iterate lazily over the crawl results of a results file.
+
+    :param start: byte offset from which to read. Only the lines starting at
+        or after this offset are returned.
+    :param end: byte offset at which to stop. Only the lines starting before
+        this offset are returned, so that contiguous ranges of a file get each
+        line exactly once, whether or not they are aligned to line boundaries.
+        Byte ranges can only be used on the files that are
+        :func:`is_splittable`.
+
+    :param stats: optional :class:`inspire_crawler.stats.IngestionStats`
+        accounting for the time spent reading and decoding the file.
+
+    When ``CRAWLER_RESULTS_DECODE_PROCESSES`` is set, big files that are
+    :func:`is_splittable` are memory-mapped and decoded by chunks of lines
+    in a pool of processes, while still returning records in file order.
+    """
+    results_format = get_format(path)
+    if results_format == 'jsonl' and _can_decode_in_parallel(path):
+        return _read_json_lines_in_parallel(path, start, end, stats)
+    elif results_format == 'jsonl':
+        return _read_json_lines(path, start, end, stats)
+
+    if start or end is not None:
+        raise CrawlerUnsupportedResultsFormat(
+            "Cannot read {0} records by byte range".format(results_format)
+        )
+
+    records = _read_binary_records(path, results_format)
+    if stats is not None:
+        records = stats.timed(records, 'decode')
+
+    return records
+
+
+def read_results_lines(path):
+    """Iterate over the crawl results of a results file as JSON lines.
+
+    The lines of JSON lines files are returned as they are, without being
+    decoded, so that they can be shown verbatim.
+    """
+    results_format = get_format(path)
+    if results_format == 'jsonl':
+        with open_results(path) as records:
+            for line in records:
+                yield line.decode('utf-8')
+    else:
+        for record in _read_binary_records(path, results_format):
+            yield json.dumps(record) + '\n'
+
+
+def _read_json_lines(path, start, end, stats):
+    loads = get_json_decoder(current_app.config['CRAWLER_JSON_DECODER'])
+    if stats is not None:
+        loads = _timed(loads, stats, 'decode')
+
+    with open_results(path) as records:
+        if start:
+            # Skip the line that started in the previous range, if any.
+            records.seek(start - 1)
+            records.readline()
+
+        readline = records.readline
+        if stats is not None:
+            readline = _timed(readline, stats, 'read')
+
+        position = records.tell()
+        while end is None or position < end:
+            line = readline()
+            if not line:
+                break
+
+            position += len(line)
+            line = line.strip()
+            if not line:
+                continue
+
+            current_app.logger.debug('Reading line: %s', line)
+            yield loads(line)
+
+
+def _timed(function, stats, stage):
+    def _timed_function(*args):
+        start = default_timer()
+        result = function(*args)
+        stats.add(stage, default_timer() - start)
+        return result
+
+    return _timed_function
+
+
+def _can_decode_in_parallel(path):
+    processes = current_app.config['CRAWLER_RESULTS_DECODE_PROCESSES']
+    return (
+        processes and processes > 1 and
+        # Daemonic processes are not allowed to have children.
+        not multiprocessing.current_process().daemon and
+        is_splittable(path) and
+        os.path.getsize(path) >
+        current_app.config['CRAWLER_RESULTS_DECODE_CHUNK_SIZE']
+    )
+
+
+def _next_line_start(data, offset):
+    """Return the offset of the first line starting at or after an offset."""
+    if offset <= 0:
+        return 0
+
+    line_end = data.find(b'\n', offset - 1)
+    return len(data) if line_end == -1 else line_end + 1
+
+
+def _split_lines(path, start, end, chunk_size):
+    """Split a byte range of a file in chunks of whole lines.
+
+    :return: the ``(start, end)`` offsets of the chunks, in file order.
+    """
+    with open(path, 'rb') as fd:
+        data = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+
+    with closing(data):
+        first = _next_line_start(data, start)
+        last = _next_line_start(data, len(data) if end is None else end)
+
+        chunks = []
+        while first < last:
+            chunk_end = _next_line_start(data, first + chunk_size)
+            chunks.append((first, min(chunk_end, last)))
+            first = chunk_end
+
+    return chunks
+
+
+_decoding_state = {}
+
+
+def _init_decoding_process(path, decoder):
+    with open(path, 'rb') as fd:
+        _decoding_state['data'] = mmap.mmap(
+            fd.fileno(), 0, access=mmap.ACCESS_READ
+        )
+    _decoding_state['loads'] = get_json_decoder(decoder)
+
+
+def _decode_chunk(chunk):
+    start, end = chunk
+    loads = _decoding_state['loads']
+    return [
+        loads(line)
+        for line in _decoding_state['data'][start:end].split(b'\n')
+        if line.strip()
+    ]
+
+
+def _read_json_lines_in_parallel(path, start, end, stats):
+    chunks = _split_lines(
+        path,
+        start,
+        end,
+        current_app.config['CRAWLER_RESULTS_DECODE_CHUNK_SIZE'],
+    )
+    current_app.logger.debug(
+        'Decoding %s in %d chunks', path, len(chunks)
+    )
+    pool = multiprocessing.Pool(
+        current_app.config['CRAWLER_RESULTS_DECODE_PROCESSES'],
+        initializer=_init_decoding_process,
+        initargs=(path, current_app.config['CRAWLER_JSON_DECODER']),
+    )
+    try:
+        decoded_chunks = pool.imap(_decode_chunk, chunks)
+        while True:
+            start_time = default_timer()
+            records = next(decoded_chunks, None)
+            if records is None:
+                break
+            if stats is not None:
+                stats.add('decode', default_timer() - start_time, len(records))
+
+            for record in records:
+                yield record
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _read_binary_records(path, results_format):
+    with open_results(path) as records:
+        for record in iter_binary_records(records, results_format):
+            yield record
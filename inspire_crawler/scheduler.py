@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2016 CERN.
+#
+# INSPIRE is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Adaptive rate limiting of the crawls of each spider.
+
+Every spider has a token bucket, stored in the database so that it is shared
+by all the Celery workers. Scheduling a crawl takes a token, and tokens are
+refilled at the rate the results queue of the spider is drained, converted
+into crawls per second using the average number of records of the recent
+jobs of the spider. Crawls are only scheduled while the queue is below
+``CRAWLER_SCHEDULER_TARGET_DEPTH``, so that it stays around that depth.
+The token of a crawl that could not be scheduled is given back.
+"""
+
+from __future__ import absolute_import, print_function
+
+from datetime import datetime
+
+from flask import current_app
+
+from .models import CrawlerJob, CrawlerSpiderBucket, JobStatus
+from .queues import get_queue_depth
+
+DRAIN_RATE_SMOOTHING = 0.3
+"""Weight of the latest measure in the moving average of drain rates."""
+
+RECENT_JOBS = 10
+"""Number of recent jobs giving the average size of the crawls of a spider."""
+
+
+def get_results_queue(spider):
+    """Return the Celery queue receiving the records of a spider."""
+    return current_app.config['CELERY_QUEUE_SPIDER_MAPPING'].get(
+        spider, current_app.config['CRAWLER_CELERY_QUEUE']
+    )
+
+
+def get_crawl_size(spider):
+    """Return the average number of records of the recent crawls."""
+    jobs = CrawlerJob.query.filter_by(
+        spider=spider,
+        status=JobStatus.FINISHED,
+    ).order_by(CrawlerJob.scheduled.desc()).limit(RECENT_JOBS)
+    sizes = [job.stats['records'] for job in jobs if job.stats]
+    if not sizes:
+        return 1.0
+
+    return max(float(sum(sizes)) / len(sizes), 1.0)
+
+
+def _measure_drain_rate(bucket, depth, now):
+    # Depths are cached, and a queue that is both filled and drained during
+    # the interval only gives a lower bound of its drain rate, so only
+    # decreasing depths measured long enough apart are taken into account.
+    min_interval = max(
+        current_app.config['CRAWLER_QUEUE_DEPTH_CACHE_TTL'], 1
+    )
+    if bucket.measured is not None:
+        interval = (now - bucket.measured).total_seconds()
+        if interval < min_interval:
+            return
+
+        if depth <= bucket.queue_depth:
+            measured = (bucket.queue_depth - depth) / interval
+            if bucket.drain_rate is None:
+                bucket.drain_rate = measured
+            else:
+                bucket.drain_rate = (
+                    DRAIN_RATE_SMOOTHING * measured +
+                    (1 - DRAIN_RATE_SMOOTHING) * bucket.drain_rate
+                )
+
+    bucket.queue_depth = depth
+    bucket.measured = now
+
+
+def acquire(spider, now=None):
+    """Try to take a token to schedule a crawl of a spider.
+
+    The bucket of the spider stays locked until the current transaction is
+    committed.
+
+    :return: ``0`` when the crawl can be scheduled, otherwise the number of
+        seconds after which to try again.
+    """
+    config = current_app.config
+    capacity = config['CRAWLER_SCHEDULER_BURST']
+    target_depth = config['CRAWLER_SCHEDULER_TARGET_DEPTH']
+    now = now or datetime.now()
+
+    bucket = CrawlerSpiderBucket.get_for_update(spider, capacity, now)
+    depth = get_queue_depth(get_results_queue(spider))
+    _measure_drain_rate(bucket, depth, now)
+
+    refill_rate = (bucket.drain_rate or 0) / get_crawl_size(spider)
+    if depth == 0:
+        # The consumers are idle, there is no rate to follow.
+        bucket.tokens = capacity
+    else:
+        elapsed = max((now - bucket.updated).total_seconds(), 0)
+        bucket.tokens = min(capacity, bucket.tokens + refill_rate * elapsed)
+    bucket.updated = now
+
+    if depth < target_depth and bucket.tokens >= 1:
+        bucket.tokens -= 1
+        return 0
+
+    countdown = config['CRAWLER_SCHEDULER_MAX_COUNTDOWN']
+    if refill_rate:
+        countdown = (1 - bucket.tokens) / refill_rate
+        if depth >= target_depth:
+            countdown = max(
+                countdown, (depth - target_depth) / bucket.drain_rate
+            )
+
+    return min(
+        max(countdown, config['CRAWLER_SCHEDULER_MIN_COUNTDOWN']),
+        config['CRAWLER_SCHEDULER_MAX_COUNTDOWN'],
+    )
+
+
+def release(spider, now=None):
+    """Give back the token of a crawl that could not be scheduled.
+
+    The bucket of the spider stays locked until the current transaction is
+    committed.
+    """
+    capacity = current_app.config['CRAWLER_SCHEDULER_BURST']
+    bucket = CrawlerSpiderBucket.get_for_update(
+        spider, capacity, now or datetime.now()
+    )
+    bucket.tokens = min(capacity, bucket.tokens + 1)
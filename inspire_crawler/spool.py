@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2016 CERN.
+#
+# INSPIRE is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Spooling of harvested OAI-PMH records to files to be crawled.
+
+Records are streamed to disk as they are received, in files rolled over at a
+maximum number of records or size, each of them meant to be crawled in a
+single job.
+"""
+
+from __future__ import absolute_import, print_function
+
+import bz2
+import gzip
+import os
+import tempfile
+from datetime import datetime
+
+from invenio_oaiharvester.utils import check_or_create_dir
+
+from .results import lzma
+
+SPOOL_COMPRESSIONS = {
+    None: ('', lambda path: open(path, 'wb')),
+    'bz2': ('.bz2', lambda path: bz2.BZ2File(path, 'wb')),
+    'gzip': ('.gz', lambda path: gzip.open(path, 'wb')),
+    'xz': ('.xz', lambda path: lzma.open(path, 'wb')),
+}
+"""File extension and opener of the spool files, by compression."""
+
+
+def _umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def _open_spool_file(output_path, compression):
+    if compression not in SPOOL_COMPRESSIONS or (
+        compression == 'xz' and lzma is None
+    ):
+        raise ValueError(
+            'Unsupported spool compression: {}'.format(compression)
+        )
+
+    extension, opener = SPOOL_COMPRESSIONS[compression]
+    fd, path = tempfile.mkstemp(
+        prefix='oaiharvest_' + datetime.now().strftime('%Y-%m-%d') + '_',
+        suffix='.xml' + extension,
+        dir=output_path,
+    )
+    try:
+        # Readable by the crawler, usually run by another user, like the
+        # files created by ``write_to_dir``, instead of the 0600 of mkstemp.
+        os.fchmod(fd, 0o666 & ~_umask())
+    finally:
+        os.close(fd)
+    return path, opener(path)
+
+
+def spool_records(records, output_dir, max_records, max_bytes,
+                  compression=None):
+    """Write harvested records to files of bounded size.
+
+    Each file holds the raw records in a ``ListRecords`` element. Records
+    are written as they are read from ``records``, which can be any
+    iterable, and a new file is started when the current one would exceed
+    ``max_records`` records or ``max_bytes`` bytes of raw records. A record
+    bigger than ``max_bytes`` gets a file of its own.
+
+    :param output_dir: directory of the files, relative to the working
+        directory of the OAI-PMH harvester, like for ``write_to_dir``.
+    :param compression: ``'gzip'``, ``'bz2'``, ``'xz'``, or ``None`` to
+        write uncompressed files.
+    :return: an iterator over the paths of the files, each of them returned
+        once it is complete.
+    """
+    output_path = check_or_create_dir(output_dir)
+    path, spool_file = None, None
+    count, size = 0, 0
+    try:
+        for record in records:
+            raw = record.raw
+            if not isinstance(raw, bytes):
+                raw = raw.encode('utf-8')
+
+            if spool_file is not None and (
+                count >= max_records or size + len(raw) > max_bytes
+            ):
+                spool_file.write(b'</ListRecords>')
+                spool_file.close()
+                spool_file = None
+                yield path
+
+            if spool_file is None:
+                path, spool_file = _open_spool_file(output_path, compression)
+                spool_file.write(b'<ListRecords>')
+                count, size = 0, 0
+
+            spool_file.write(raw)
+            count += 1
+            size += len(raw)
+
+        if spool_file is not None:
+            spool_file.write(b'</ListRecords>')
+            spool_file.close()
+            spool_file = None
+            yield path
+    finally:
+        if spool_file is not None:
+            spool_file.close()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2016 CERN.
+#
+# INSPIRE is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Instrumentation of the ingestion of crawl results."""
+
+from __future__ import absolute_import, print_function
+
+from contextlib import contextmanager
+from timeit import default_timer
+
+
+STAGES = (
+    'read',
+    'decode',
+    'check',
+    'build',
+    'deduplicate',
+    'create',
+    'link',
+    'commit',
+    'publish',
+)
+"""Stages of the ingestion of crawl results, in processing order.
+
+* ``read``: reading, and decompressing, the lines of the results file.
+* ``decode``: decoding the records.
+* ``check``: checking the format of the crawl results.
+* ``build``: building the data and extra data of the workflow objects.
+* ``deduplicate``: looking up the fingerprints of the records.
+* ``create``: creating the workflow engines and objects.
+* ``link``: linking the workflow objects to the crawler job.
+* ``commit``: committing the batches of workflow objects.
+* ``publish``: publishing the tasks starting the workflows.
+"""
+
+
+class IngestionStats(object):
+    """Time spent and number of items processed in each ingestion stage.
+
+    Timers rely on :func:`timeit.default_timer`, and only add a couple of
+    function calls to each timed operation.
+    """
+
+    def __init__(self, records=0, seconds=0.0, stages=None):
+        self.records = records
+        self.seconds = seconds
+        self.stages = dict(
+            (stage, list(totals)) for stage, totals in (stages or {}).items()
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        """Load the stats serialized by :meth:`to_dict`."""
+        data = data or {}
+        return cls(
+            records=data.get('records', 0),
+            seconds=data.get('seconds', 0.0),
+            stages=dict(
+                (stage, (totals['seconds'], totals['count']))
+                for stage, totals in data.get('stages', {}).items()
+            ),
+        )
+
+    def to_dict(self):
+        """Serialize the stats to a JSON-compatible dictionary."""
+        return {
+            'records': self.records,
+            'seconds': round(self.seconds, 6),
+            'stages': dict(
+                (stage, {'seconds': round(seconds, 6), 'count': count})
+                for stage, (seconds, count) in self.stages.items()
+            ),
+        }
+
+    def add(self, stage, seconds, count=1):
+        """Account for ``count`` items processed in ``seconds`` by a stage."""
+        totals = self.stages.setdefault(stage, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += count
+
+    @contextmanager
+    def timer(self, stage, count=1):
+        """Time the execution of a block as part of a stage."""
+        start = default_timer()
+        try:
+            yield
+        finally:
+            self.add(stage, default_timer() - start, count)
+
+    def timed(self, iterable, stage):
+        """Iterate over ``iterable``, timing the production of each item."""
+        iterator = iter(iterable)
+        while True:
+            start = default_timer()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.add(stage, default_timer() - start)
+            yield item
+
+    def merge(self, other):
+        """Add the totals of other stats to these ones."""
+        self.records += other.records
+        self.seconds += other.seconds
+        for stage, (seconds, count) in other.stages.items():
+            self.add(stage, seconds, count)
+
+    def summary(self):
+        """Return a one-line summary of the stats, for logging."""
+        stages = ', '.join(
+            '{} {:.3f}s/{}'.format(stage, *self.stages[stage])
+            for stage in STAGES
+            if stage in self.stages
+        )
+        return '{} records in {:.3f}s ({})'.format(
+            self.records, self.seconds, stages
+        )
@@ -25,16 +25,22 @@
 
 from __future__ import absolute_import, print_function
 
-import copy
+import hashlib
+import itertools
 import json
 import os
+from datetime import datetime, timedelta
+from timeit import default_timer
+from uuid import UUID
 
+from requests import RequestException
+from scrapyd_api.exceptions import ScrapydResponseError
 from six.moves.urllib.parse import urlparse
+from sqlalchemy.exc import SQLAlchemyError
 
-from celery import shared_task
+from celery import group, shared_task
 
 from flask import current_app
-from flask_celeryext.app import current_celery_app
 
 from invenio_db import db
 
@@ -45,15 +51,38 @@ from invenio_workflows import (
     workflow_object_class,
 )
 
+from . import metrics, scheduler
+from .blobstore import BlobStore, dump_results
 from .errors import (
     CrawlerInvalidResultsPath,
     CrawlerJobError,
+    CrawlerResultsRejected,
     CrawlerScheduleError,
+    CrawlerSpiderNotFound,
+    CrawlerWorkflowStartError,
 )
-from .models import CrawlerJob, JobStatus, CrawlerWorkflowObject
+from .models import (
+    CrawlerIngestionCheckpoint,
+    CrawlerJob,
+    CrawlerRecordFingerprint,
+    CrawlerWorkflowObject,
+    JobStatus,
+)
+from .queues import get_queue_depth
+from .results import is_splittable, read_results
+from .stats import IngestionStats
+from .validation import compile_validator, validate_crawl_results
+
 
+def _extract_results_data(results_path, start=0, end=None, stats=None):
+    """Return a lazy iterator over the crawl results stored in a file.
 
-def _extract_results_data(results_path):
+    The existence of the file is checked eagerly, but the records themselves
+    are decoded one line at a time while they are consumed, so memory usage
+    does not grow with the size of the results file. See
+    :func:`inspire_crawler.results.read_results` for the meaning of ``start``,
+    ``end`` and ``stats``.
+    """
     if not os.path.exists(results_path):
         raise CrawlerInvalidResultsPath(
             "Path specified in result does not exist: {0}".format(
@@ -64,50 +93,205 @@ def _extract_results_data(results_path):
     current_app.logger.info(
         'Parsing records from {}'.format(results_path)
     )
-    results_data = []
-    with open(results_path) as records:
-        lines = (
-            line.strip() for line in records if line.strip()
-        )
+    return read_results(results_path, start, end, stats)
 
-        for line in lines:
-            current_app.logger.debug(
-                'Reading line: {}'.format(line)
-            )
-            crawl_result = json.loads(line)
-            results_data.append(crawl_result)
 
-    current_app.logger.debug(
-        'Read {} records from {}'.format(len(results_data), results_path)
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+
+        yield chunk
+
+
+def _create_engine(workflow):
+    engine = WorkflowEngine.with_name(workflow)
+    engine.save()
+    return engine
+
+
+def _fingerprint(data):
+    """Return a stable hash of the normalized content of a record.
+
+    The top level fields listed in ``CRAWLER_FINGERPRINT_IGNORED_FIELDS``,
+    that change at every crawl, are not taken into account.
+    """
+    ignored_fields = current_app.config['CRAWLER_FINGERPRINT_IGNORED_FIELDS']
+    normalized = dict(
+        (key, value) for key, value in data.items()
+        if key not in ignored_fields
+    )
+    serialized = json.dumps(normalized, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+def _find_duplicates(objects_data):
+    """Find the crawl results of a batch that were already ingested.
+
+    :return: a tuple with the list of fingerprints of the results, ``None``
+        for results with errors, and a dictionary of the ids of the objects
+        already created for some of these fingerprints.
+    """
+    fingerprints = [
+        None if status is not None else _fingerprint(data)
+        for data, _, status in objects_data
+    ]
+    duplicates = CrawlerRecordFingerprint.get_object_ids(
+        [fingerprint for fingerprint in fingerprints if fingerprint]
     )
-    return results_data
-
-
-def _check_crawl_result_format(crawl_result):
-    crawl_result['record']
-    crawl_result['errors']
-    crawl_result['source_data']
-    crawl_result['file_name']
-
-
-def _crawl_result_from_exception(exception, wrong_crawl_result):
-    return {
-        'record': {},
-        'errors': [
-            {
-                'exception': exception.__class__.__name__,
-                'traceback':
-                    'Wrong crawl result format. Missing the key `{}`'
-                    .format(exception.message),
-            }
-        ],
-        'source_data': wrong_crawl_result,
-        'file_name': wrong_crawl_result.get('file_name')
+    return fingerprints, duplicates
+
+
+def _build_object_data(crawl_result, job_id, results_path):
+    """Split a crawl result into the data and extra data of its object.
+
+    The record is not copied: ``source_data`` shares its content with the
+    object data, and only the dictionaries that get modified are shallow
+    copied, so that an inline ``results_data`` payload is left untouched.
+    The shared references are harmless, as the objects are committed, and
+    thus expired and reloaded from the database, before any workflow runs.
+
+    The format of the crawl result must have been validated with
+    :func:`inspire_crawler.validation.validate_crawl_results`.
+
+    :return: a ``(data, extra_data, status)`` tuple, the status being ``None``
+        for well formed results.
+    """
+    crawl_result = dict(crawl_result)
+
+    record = crawl_result.pop('record')
+    if crawl_result['errors']:
+        return record, {'crawl_errors': crawl_result}, ObjectStatus.ERROR
+
+    record = dict(record)
+    extra_data = {
+        'crawler_job_id': job_id,
+        'crawler_results_path': results_path,
+        'source_file': crawl_result['file_name']
     }
+    record_extra = record.pop('extra_data', {})
+    if record_extra:
+        extra_data['record_extra'] = record_extra
+
+    object_extra_data = dict(extra_data)
+    object_extra_data['source_data'] = {
+        'data': record,
+        'extra_data': extra_data,
+    }
+    return record, object_extra_data, None
+
+
+def _create_workflow_object(data, extra_data, status, engine):
+    current_app.logger.debug('Parsing record: {}'.format(data))
+    obj = workflow_object_class.create(data=data)
+    obj.id_workflow = str(engine.uuid)
+    if status is not None:
+        obj.status = status
+
+    obj.extra_data.update(extra_data)
+    obj.data_type = current_app.config['CRAWLER_DATA_TYPE']
+    obj.save()
+    return obj
+
+
+class _WorkflowDispatcher(object):
+    """Collect the workflow objects to start and publish their tasks.
+
+    The objects are only published when calling :meth:`publish`, which must
+    happen once the transaction that created them is committed, according to
+    ``CRAWLER_WORKFLOW_DISPATCH``. Their ids are committed in the ingestion
+    checkpoint together with them, see :func:`_publish_workflows`.
+    """
+
+    def __init__(self, workflow_name, queue):
+        self.workflow_name = workflow_name
+        self.queue = queue
+        self.mode = current_app.config['CRAWLER_WORKFLOW_DISPATCH']
+        self.object_ids = []
+
+    def add(self, object_id):
+        self.object_ids.append(object_id)
+
+    def publish(self):
+        object_ids, self.object_ids = self.object_ids, []
+        if not object_ids:
+            return
+
+        if self.mode == 'batch':
+            start_many.apply_async(
+                kwargs={
+                    'workflow_name': self.workflow_name,
+                    'object_ids': object_ids,
+                },
+                queue=self.queue,
+            )
+        elif self.mode == 'group':
+            group(
+                start.signature(
+                    kwargs={
+                        'workflow_name': self.workflow_name,
+                        'object_id': object_id,
+                    },
+                    queue=self.queue,
+                )
+                for object_id in object_ids
+            ).apply_async()
+        else:
+            for object_id in object_ids:
+                start.apply_async(
+                    kwargs={
+                        'workflow_name': self.workflow_name,
+                        'object_id': object_id,
+                    },
+                    queue=self.queue,
+                )
 
 
 @shared_task(ignore_results=True)
-def submit_results(job_id, errors, log_file, results_uri, spider_name, results_data=None):
+def start_many(workflow_name, object_ids):
+    """Run a workflow on several workflow objects, one after the other.
+
+    A failure on one object is logged and does not prevent the workflow from
+    running on the following ones, but the task fails once all the objects
+    are processed. Database errors are not isolated, as they would affect
+    the following objects as well.
+
+    :param workflow_name: name of the workflow to run.
+    :param object_ids: ids of the workflow objects to run it on.
+    :raises inspire_crawler.errors.CrawlerWorkflowStartError: with the ids of
+        the objects the workflow failed on.
+    """
+    failed_ids = []
+    for object_id in object_ids:
+        try:
+            start(workflow_name=workflow_name, object_id=object_id)
+        except SQLAlchemyError:
+            raise
+        except Exception:
+            # Workflow tasks can raise anything, the engine stores the error
+            # on the object when it exists.
+            db.session.rollback()
+            current_app.logger.exception(
+                'Workflow {} failed on object {}'.format(
+                    workflow_name, object_id
+                )
+            )
+            failed_ids.append(object_id)
+
+    if failed_ids:
+        raise CrawlerWorkflowStartError(
+            'Workflow {} failed on objects {}'.format(
+                workflow_name, failed_ids
+            ),
+            failed_ids,
+        )
+
+
+@shared_task(ignore_results=True, acks_late=True)
+def submit_results(job_id, errors, log_file, results_uri, spider_name,
+                   results_data=None, results_blob=None):
     """Receive the submission of the results of a crawl job.
 
     Then it spawns the appropiate workflow according to whichever workflow
@@ -121,104 +305,599 @@ def submit_results(job_id, errors, log_file, results_uri, spider_name, results_d
     :param results_data: Optional data payload with the results list, to skip
         retrieving them from the `results_uri`, useful for slow or unreliable
         storages.
+    :param results_blob: Optional digest of a payload stored in the
+        ``CRAWLER_RESULTS_BLOB_STORE`` instead of being sent inline as
+        ``results_data``, see :func:`send_results`. Its reference is released
+        once the job is finished, whether it succeeded or not, and kept on
+        other errors, so that a retried or redelivered task can resume.
+
+    When no ``results_data`` is given, the results file is streamed: records
+    are decoded and turned into workflow objects one by one, instead of
+    loading the whole file in memory first.
+
+    Workflow objects are written in batches of
+    ``CRAWLER_SUBMIT_RESULTS_BATCH_SIZE`` records, each batch being committed
+    in a single transaction together with its job links, and the workflows
+    are started once the batch is committed, as configured by
+    ``CRAWLER_WORKFLOW_DISPATCH``. With
+    ``CRAWLER_SHARE_WORKFLOW_ENGINE`` enabled, all the objects of a batch are
+    attached to the same workflow engine instead of one engine per record.
+
+    Results files can be compressed with gzip, bzip2, xz or zstandard, in
+    which case they are decompressed while being streamed, and can store
+    binary records instead of JSON lines, see :mod:`inspire_crawler.results`.
+
+    Uncompressed JSON lines files bigger than
+    ``CRAWLER_SUBMIT_RESULTS_SHARD_SIZE`` are split in byte ranges, each of
+    them processed by a separate :func:`submit_results_shard` task.
+
+    With ``CRAWLER_DEDUPLICATE_RECORDS`` enabled, records identical to ones
+    ingested before are not turned into new workflow objects: the existing
+    object is linked to the job instead.
+
+    The number of results ingested is checkpointed with every committed
+    batch, so that a redelivered or retried task resumes where the previous
+    attempt stopped instead of creating duplicate workflow objects. The
+    objects whose workflows were not started yet are checkpointed as well,
+    and started first when resuming. A redelivered task running at the same
+    time as the original one stops as soon as the other one moved the
+    checkpoint.
+
+    The time spent in each stage of the ingestion is stored in the ``stats``
+    of the job, see :mod:`inspire_crawler.stats`, and summarized in the logs.
     """
+    try:
+        finished = _submit_results(
+            job_id, errors, log_file, results_uri, spider_name,
+            results_data, results_blob,
+        )
+    except (CrawlerJobError, CrawlerResultsRejected):
+        # The job is finished as errored, and will not be resumed.
+        _release_results_blob(job_id, results_blob)
+        raise
+
+    if finished:
+        _release_results_blob(job_id, results_blob)
+
+
+def _release_results_blob(job_id, results_blob):
+    if results_blob is not None:
+        _get_blob_store().release(results_blob, str(job_id))
+
+
+def _submit_results(job_id, errors, log_file, results_uri, spider_name,
+                    results_data, results_blob):
+    """Process the results of a job.
+
+    :return: whether the job was finished by this task.
+    """
+    stats = IngestionStats()
+    start_time = default_timer()
     results_path = urlparse(results_uri).path
     job = CrawlerJob.get_by_job(job_id)
     job.logs = log_file
     job.results = results_uri
 
     if errors:
-        job.status = JobStatus.ERROR
-        job.save()
-        db.session.commit()
+        _finish_job(job_id, JobStatus.ERROR, stats)
+        metrics.ERRORS.inc(spider=spider_name, kind='job')
+        metrics.flush()
         raise CrawlerJobError(str(errors))
 
-    if results_data is None:
-        results_data = _extract_results_data(results_path)
+    shard_size = current_app.config['CRAWLER_SUBMIT_RESULTS_SHARD_SIZE']
+    source_path = None
+    if results_blob is not None:
+        source_path = _get_blob_store().path(results_blob)
+    elif results_data is None:
+        source_path = results_path
+        results_data = _extract_results_data(results_path, stats=stats)
+        if (
+            shard_size and
+            is_splittable(results_path) and
+            os.path.getsize(results_path) > shard_size
+        ):
+            if job.shards_pending is None:
+                # Otherwise checked before the shards were first dispatched.
+                _check_results(
+                    job_id, spider_name, _extract_results_data(results_path),
+                    stats,
+                )
+            _submit_shards(
+                job, job_id, results_uri, spider_name, shard_size
+            )
+            return False
 
-    for crawl_result in results_data:
-        crawl_result = copy.deepcopy(crawl_result)
-        try:
-            _check_crawl_result_format(crawl_result)
-        except KeyError as e:
-            crawl_result = _crawl_result_from_exception(e, crawl_result)
-
-        record = crawl_result.pop('record')
-        crawl_errors = crawl_result['errors']
-        file = crawl_result['file_name']
-
-        current_app.logger.debug('Parsing record: {}'.format(record))
-        engine = WorkflowEngine.with_name(job.workflow)
-        engine.save()
-        obj = workflow_object_class.create(data=record)
-        obj.id_workflow = str(engine.uuid)
-        if crawl_errors:
-            obj.status = ObjectStatus.ERROR
-            obj.extra_data['crawl_errors'] = crawl_result
+    checkpoint = CrawlerIngestionCheckpoint.get_or_create(job_id)
+    if not checkpoint.finished:
+        if results_blob is not None:
+            results_data = _extract_results_data(source_path, stats=stats)
+        if not checkpoint.ingested:
+            _check_results(
+                job_id,
+                spider_name,
+                results_data if source_path is None else
+                _extract_results_data(source_path),
+                stats,
+            )
+        ingested = checkpoint.ingested
+        records_count = _ingest_results(
+            job_id,
+            job.workflow,
+            results_data,
+            results_path,
+            spider_name,
+            checkpoint,
+            stats,
+        )
+        if records_count is None or not _lock_checkpoint(
+            checkpoint, ingested + records_count
+        ):
+            return False
 
-        else:
-            extra_data = {
-                'crawler_job_id': job_id,
-                'crawler_results_path': results_path,
-                'source_file': file
-            }
-            record_extra = record.pop('extra_data', {})
-            if record_extra:
-                extra_data['record_extra'] = record_extra
-
-            obj.extra_data['source_data'] = {
-                'data': copy.deepcopy(record),
-                'extra_data': copy.deepcopy(extra_data),
-            }
-            obj.extra_data.update(extra_data)
-
-        obj.data_type = current_app.config['CRAWLER_DATA_TYPE']
-        obj.save()
+        current_app.logger.info('Parsed {} records.'.format(records_count))
+        checkpoint.finished = True
+
+    stats.seconds = default_timer() - start_time
+    job_stats = _finish_job(job_id, JobStatus.FINISHED, stats)
+    current_app.logger.info('Job {}: {}'.format(job_id, job_stats.summary()))
+    metrics.SUBMIT_RESULTS_SECONDS.observe(stats.seconds, spider=spider_name)
+    metrics.flush()
+    return True
+
+
+def _merge_job_stats(job_id, stats):
+    """Add the stats of a task to the stats of its job.
+
+    The row of the job is locked until commit, so that the stats of
+    concurrent shards are added up safely.
+
+    :return: the stats of the whole job.
+    """
+    job = CrawlerJob.get_for_update(job_id)
+    job_stats = IngestionStats.from_dict(job.stats)
+    job_stats.merge(stats)
+    job.stats = job_stats.to_dict()
+    return job_stats
+
+
+def _finish_job(job_id, status, stats):
+    """Set the final status of a job, add the stats of the task, and commit.
+
+    :return: the stats of the whole job.
+    """
+    db.session.flush()
+    CrawlerJob.finish(job_id, status)
+    job_stats = _merge_job_stats(job_id, stats)
+    db.session.commit()
+    return job_stats
+
+
+def _get_blob_store():
+    root = current_app.config['CRAWLER_RESULTS_BLOB_STORE']
+    if not root:
+        raise CrawlerInvalidResultsPath(
+            'CRAWLER_RESULTS_BLOB_STORE is needed to use results blobs.'
+        )
+
+    return BlobStore(root)
+
+
+def send_results(job_id, errors, log_file, results_uri, spider_name,
+                 results_data=None, **options):
+    """Publish a :func:`submit_results` task, spilling big payloads to disk.
+
+    When ``CRAWLER_RESULTS_BLOB_STORE`` is set, and ``results_data`` is
+    bigger than ``CRAWLER_RESULTS_BLOB_THRESHOLD`` bytes once serialized,
+    it is written to the blob store as JSON lines, and only its digest is
+    sent in the task message.
+
+    It needs an application context, producers without one write the blob
+    with :class:`inspire_crawler.blobstore.BlobStore` instead.
+
+    :param options: options of the ``apply_async`` call, such as ``queue``.
+    """
+    kwargs = {
+        'job_id': job_id,
+        'errors': errors,
+        'log_file': log_file,
+        'results_uri': results_uri,
+        'spider_name': spider_name,
+        'results_data': results_data,
+    }
+    threshold = current_app.config['CRAWLER_RESULTS_BLOB_THRESHOLD']
+    store_root = current_app.config['CRAWLER_RESULTS_BLOB_STORE']
+    if store_root and results_data is not None:
+        lines = dump_results(results_data)
+        if sum(len(line) for line in lines) > threshold:
+            kwargs['results_data'] = None
+            kwargs['results_blob'] = BlobStore(store_root).put(
+                lines, str(job_id)
+            )
+
+    return submit_results.apply_async(kwargs=kwargs, **options)
+
+
+def _submit_shards(job, job_id, results_uri, spider_name, shard_size):
+    results_path = urlparse(results_uri).path
+    offsets = range(0, os.path.getsize(results_path), shard_size)
+    if job.shards_pending is None:
+        # On redelivery, shards already completed must not be counted
+        # again, and they are skipped thanks to their checkpoints.
+        job.shards_pending = len(offsets)
+    # The results arrived, even if the job was errored for being late.
+    job.status = JobStatus.PENDING
+    job.save()
+    # Checkpoints are created before any shard starts, so that shards and
+    # coordinator do not insert them concurrently.
+    checkpoints = [
+        CrawlerIngestionCheckpoint.get_or_create(job_id, offset)
+        for offset in offsets
+    ]
+    db.session.commit()
+
+    current_app.logger.info(
+        'Splitting {} in {} shards.'.format(results_path, len(offsets))
+    )
+    for offset, checkpoint in zip(offsets, checkpoints):
+        if checkpoint.dispatched:
+            # The task was redelivered, the shard is already in flight.
+            current_app.logger.info(
+                'Bytes {}-{} of job {} are already dispatched.'.format(
+                    offset, offset + shard_size, job_id
+                )
+            )
+            continue
+
+        submit_results_shard.apply_async(
+            kwargs={
+                'job_id': job_id,
+                'results_uri': results_uri,
+                'spider_name': spider_name,
+                'start': offset,
+                'end': offset + shard_size,
+            },
+        )
+        # Flagged once published, so that no shard is lost. A shard
+        # dispatched again after a crash in between is completed once.
+        checkpoint.dispatched = True
         db.session.commit()
 
-        crawler_object = CrawlerWorkflowObject(
-            job_id=job_id, object_id=obj.id
+
+@shared_task(ignore_results=True, acks_late=True)
+def submit_results_shard(job_id, results_uri, spider_name, start, end):
+    """Process a byte range of the results file of a crawl job.
+
+    Shards are created by :func:`submit_results` for results files bigger
+    than ``CRAWLER_SUBMIT_RESULTS_SHARD_SIZE``, and the job is marked as
+    finished by the last shard to complete.
+
+    :param job_id: Id of the crawler job.
+    :param results_uri: URI to the file containing the results of the crawl
+       job.
+    :param spider_name: name of the spider that produced the results.
+    :param start: offset of the first byte of the shard.
+    :param end: offset of the byte following the shard.
+    """
+    results_path = urlparse(results_uri).path
+    job = CrawlerJob.get_by_job(job_id)
+    if job.status == JobStatus.ERROR:
+        current_app.logger.info(
+            'Skipping bytes {}-{} of errored job {}.'.format(
+                start, end, job_id
+            )
         )
-        db.session.add(crawler_object)
-        queue = current_app.config['CELERY_QUEUE_SPIDER_MAPPING'].get(
-            spider_name, current_app.config['CRAWLER_CELERY_QUEUE']
+        return
+
+    checkpoint = CrawlerIngestionCheckpoint.get_or_create(job_id, start)
+    if checkpoint.finished:
+        current_app.logger.info(
+            'Bytes {}-{} of job {} are already processed.'.format(
+                start, end, job_id
+            )
         )
+        return
 
-        if not crawl_errors:
-            start.apply_async(
-                kwargs={
-                    'workflow_name': job.workflow,
-                    'object_id': obj.id,
-                },
-                queue=queue,
+    stats = IngestionStats()
+    start_time = default_timer()
+    results_data = _extract_results_data(results_path, start, end, stats)
+    ingested = checkpoint.ingested
+    records_count = _ingest_results(
+        job_id, job.workflow, results_data, results_path, spider_name,
+        checkpoint, stats,
+    )
+    # The shard is only completed once, even if it was dispatched again.
+    if records_count is None or not _lock_checkpoint(
+        checkpoint, ingested + records_count
+    ):
+        return
+
+    current_app.logger.info(
+        'Parsed {} records from bytes {}-{}.'.format(records_count, start, end)
+    )
+    checkpoint.finished = True
+    finished = CrawlerJob.complete_shard(job_id)
+    stats.seconds = default_timer() - start_time
+    job_stats = _merge_job_stats(job_id, stats)
+    db.session.commit()
+    if finished:
+        current_app.logger.info(
+            'All the shards of job {} are processed.'.format(job_id)
+        )
+        current_app.logger.info(
+            'Job {}: {}'.format(job_id, job_stats.summary())
+        )
+    metrics.SUBMIT_RESULTS_SECONDS.observe(stats.seconds, spider=spider_name)
+    metrics.flush()
+
+
+def _check_results(job_id, spider_name, results_data, stats):
+    """Reject the results of a job with too many invalid crawl results.
+
+    All the results are checked before any of them is ingested, so that no
+    workflow is started for a rejected job. Does nothing unless
+    ``CRAWLER_MAX_INVALID_RESULTS_RATIO`` is set.
+    """
+    max_invalid_ratio = current_app.config['CRAWLER_MAX_INVALID_RESULTS_RATIO']
+    if max_invalid_ratio is None:
+        return
+
+    validate = compile_validator(
+        current_app.config['CRAWLER_CRAWL_RESULT_MAX_SIZES']
+    )
+    check_start = default_timer()
+    total, invalid = 0, 0
+    for crawl_result in results_data:
+        total += 1
+        if validate(crawl_result) is not None:
+            invalid += 1
+    stats.add('check', default_timer() - check_start, total)
+
+    if invalid > max_invalid_ratio * total:
+        _reject_results(job_id, spider_name, invalid, total, stats)
+
+
+def _reject_results(job_id, spider_name, invalid, total, stats):
+    _finish_job(job_id, JobStatus.ERROR, stats)
+    metrics.ERRORS.inc(spider=spider_name, kind='rejected')
+    metrics.flush()
+    raise CrawlerResultsRejected(
+        'Rejected the results of job {}: {} of {} crawl results are '
+        'invalid.'.format(job_id, invalid, total)
+    )
+
+
+def _ingest_results(job_id, workflow, results_data, results_path,
+                    spider_name, checkpoint, stats):
+    queue = current_app.config['CELERY_QUEUE_SPIDER_MAPPING'].get(
+        spider_name, current_app.config['CRAWLER_CELERY_QUEUE']
+    )
+    batch_size = current_app.config['CRAWLER_SUBMIT_RESULTS_BATCH_SIZE']
+    share_engine = current_app.config['CRAWLER_SHARE_WORKFLOW_ENGINE']
+    deduplicate = current_app.config['CRAWLER_DEDUPLICATE_RECORDS']
+    validate = compile_validator(
+        current_app.config['CRAWLER_CRAWL_RESULT_MAX_SIZES']
+    )
+
+    dispatcher = _WorkflowDispatcher(workflow, queue)
+    ingested = checkpoint.ingested
+    if checkpoint.unpublished:
+        if not _lock_checkpoint(checkpoint, ingested):
+            return None
+
+        # The previous attempt stopped before starting the workflows of its
+        # last committed batch.
+        for object_id in checkpoint.unpublished or []:
+            dispatcher.add(object_id)
+        current_app.logger.info(
+            'Starting {} workflows of the previous attempt.'.format(
+                len(dispatcher.object_ids)
             )
+        )
+        _publish_workflows(dispatcher, checkpoint, stats)
 
-    current_app.logger.info('Parsed {} records.'.format(len(results_data)))
+    if ingested:
+        current_app.logger.info(
+            'Resuming ingestion after {} records.'.format(ingested)
+        )
+        results_data = itertools.islice(results_data, ingested, None)
 
-    job.status = JobStatus.FINISHED
-    job.save()
+    records_count = 0
+    for crawl_results in _chunked(results_data, batch_size):
+        with stats.timer('check', len(crawl_results)):
+            crawl_results, _ = validate_crawl_results(
+                crawl_results, validate
+            )
+
+        build_start = default_timer()
+        objects_data = [
+            _build_object_data(crawl_result, job_id, results_path)
+            for crawl_result in crawl_results
+        ]
+        stats.add('build', default_timer() - build_start, len(crawl_results))
+        fingerprints = [None] * len(objects_data)
+        duplicates = {}
+        if deduplicate:
+            with stats.timer('deduplicate', len(objects_data)):
+                fingerprints, duplicates = _find_duplicates(objects_data)
+
+        engine = None
+        object_ids = []
+        duplicate_ids = set()
+        for (data, extra_data, status), fingerprint in zip(
+            objects_data, fingerprints
+        ):
+            if fingerprint in duplicates:
+                duplicate_ids.add(duplicates[fingerprint])
+                continue
+
+            with stats.timer('create'):
+                if fingerprint:
+                    # Also holds a new engine, so that it is rolled back
+                    # with the object on conflict.
+                    savepoint = db.session.begin_nested()
+                new_engine = engine is None or not share_engine
+                if new_engine:
+                    engine = _create_engine(workflow)
+
+                obj = _create_workflow_object(
+                    data, extra_data, status, engine
+                )
+
+            if fingerprint:
+                if not CrawlerRecordFingerprint.create(
+                    fingerprint, obj.id, job_id
+                ):
+                    # Another job ingested the same record in the meantime.
+                    savepoint.rollback()
+                    if new_engine:
+                        engine = None
+                    duplicates.update(
+                        CrawlerRecordFingerprint.get_object_ids([fingerprint])
+                    )
+                    duplicate_ids.add(duplicates[fingerprint])
+                    continue
+
+                savepoint.commit()
+                duplicates[fingerprint] = obj.id
+            object_ids.append(obj.id)
+            if status is None:
+                dispatcher.add(obj.id)
+
+        with stats.timer('link', len(object_ids)):
+            duplicate_ids.difference_update(object_ids)
+            if duplicate_ids:
+                object_ids.extend(CrawlerWorkflowObject.filter_unlinked(
+                    job_id, sorted(duplicate_ids)
+                ))
+
+            CrawlerWorkflowObject.bulk_create(
+                job_id=job_id,
+                object_ids=object_ids,
+            )
+        if not _lock_checkpoint(checkpoint, ingested + records_count):
+            return None
+
+        records_count += len(crawl_results)
+        stats.records += len(crawl_results)
+        metrics.RECORDS_INGESTED.inc(len(crawl_results), spider=spider_name)
+        crawl_errors = sum(
+            1 for _, _, status in objects_data if status is not None
+        )
+        if crawl_errors:
+            metrics.ERRORS.inc(crawl_errors, spider=spider_name, kind='crawl')
+        checkpoint.ingested = ingested + records_count
+        checkpoint.unpublished = list(dispatcher.object_ids) or None
+        with stats.timer('commit'):
+            db.session.commit()
+        _publish_workflows(dispatcher, checkpoint, stats)
+
+    return records_count
+
+
+def _lock_checkpoint(checkpoint, ingested):
+    """Lock a checkpoint, unless another worker moved it since it was read.
+
+    A redelivered task can run concurrently with the original one, in which
+    case only the first of them to move the checkpoint goes on, and the
+    other one rolls back its current batch and stops.
+
+    :param ingested: number of results ingested according to this worker.
+    :return: whether the checkpoint is locked and can be moved forward.
+    """
+    job_id, shard = checkpoint.job_id, checkpoint.shard
+    current = CrawlerIngestionCheckpoint.get_for_update(job_id, shard)
+    if current.finished or current.ingested != ingested:
+        db.session.rollback()
+        current_app.logger.info(
+            'Checkpoint {} of job {} was moved by another worker, '
+            'stopping.'.format(shard, job_id)
+        )
+        return False
+
+    return True
+
+
+def _publish_workflows(dispatcher, checkpoint, stats):
+    """Start the workflows of a committed batch and clear its checkpoint.
+
+    A worker lost in between leaves them in the checkpoint, and they are
+    started by the next attempt, so that no workflow is lost.
+    """
+    with stats.timer('publish', len(dispatcher.object_ids)):
+        dispatcher.publish()
+    if checkpoint.unpublished:
+        checkpoint.unpublished = None
+        db.session.commit()
+
+
+@shared_task(bind=True, ignore_results=True, max_retries=None)
+def schedule_crawl_adaptive(self, spider, workflow, **kwargs):
+    """Schedule a crawl at the pace the results of its spider are consumed.
+
+    Instead of being skipped when the results queue of the spider is full,
+    as with the ``queue_size_limit`` of :func:`schedule_crawl`, the crawl is
+    deferred and retried later, according to the token bucket of the spider,
+    see :mod:`inspire_crawler.scheduler`. The token is given back when the
+    crawl is not scheduled, e.g. because of a scrapyd error.
+
+    Takes the same arguments as :func:`schedule_crawl`.
+    """
+    countdown = scheduler.acquire(spider)
     db.session.commit()
+    if countdown:
+        current_app.logger.info(
+            'Deferring crawl of {} by {:.0f}s.'.format(spider, countdown)
+        )
+        metrics.SCHEDULE_CRAWL_CALLS.inc(spider=spider, outcome='deferred')
+        metrics.flush()
+        raise self.retry(countdown=countdown)
+
+    try:
+        job_id = schedule_crawl(spider, workflow, **kwargs)
+    except Exception:
+        db.session.rollback()
+        scheduler.release(spider)
+        db.session.commit()
+        raise
+
+    if job_id is None:
+        # Skipped, as the results queue is full.
+        scheduler.release(spider)
+        db.session.commit()
+    return job_id
 
 
 @shared_task(ignore_results=True)
 def schedule_crawl(spider, workflow, **kwargs):
     """Schedule a crawl using configuration from the workflow objects."""
-    from inspire_crawler.utils import get_crawler_instance
+    from inspire_crawler.utils import (
+        add_pending_job,
+        check_spider,
+        choose_crawler_node,
+        get_crawler_instance,
+    )
 
     queue_size_limit = kwargs.get('queue_size_limit')
     if queue_size_limit:
         del kwargs['queue_size_limit']
         default_queue =  current_app.config.get('CRAWLER_CELERY_QUEUE', 'celery')
         spider_results_queue_name = current_app.config['CELERY_QUEUE_SPIDER_MAPPING'].get(spider, default_queue)
-        with current_celery_app.connection_or_acquire() as conn:
-            current_queue_size = conn.default_channel.queue_declare(
-                queue=spider_results_queue_name, passive=True
-            ).message_count
+        current_queue_size = get_queue_depth(spider_results_queue_name)
         if current_queue_size > queue_size_limit:
             current_app.logger.info('Queue is full. Current size: {}. Skipping crawl'.format(current_queue_size))
+            metrics.SCHEDULE_CRAWL_CALLS.inc(spider=spider, outcome='skipped')
+            metrics.flush()
             return
 
-    crawler = get_crawler_instance()
+    try:
+        check_spider(spider)
+    except CrawlerSpiderNotFound:
+        metrics.SCHEDULE_CRAWL_CALLS.inc(spider=spider, outcome='error')
+        metrics.flush()
+        raise
+
+    node = choose_crawler_node()
+    crawler = get_crawler_instance(node=node)
     crawler_settings = current_app.config.get('CRAWLER_SETTINGS')
     crawler_settings.update(kwargs.get("crawler_settings", {}))
 
@@ -226,26 +905,33 @@ def schedule_crawl(spider, workflow, **kwargs):
     crawler_arguments.update(
         current_app.config.get('CRAWLER_SPIDER_ARGUMENTS', {}).get(spider, {})
     )
-    job_id = crawler.schedule(
-        project=current_app.config.get('CRAWLER_PROJECT'),
-        spider=spider,
-        settings=crawler_settings,
-        **crawler_arguments
-    )
+    with metrics.SCRAPYD_REQUEST_SECONDS.time(endpoint='schedule'):
+        job_id = crawler.schedule(
+            project=current_app.config.get('CRAWLER_PROJECT'),
+            spider=spider,
+            settings=crawler_settings,
+            **crawler_arguments
+        )
     if job_id:
+        add_pending_job(node)
         crawler_job = CrawlerJob.create(
             job_id=job_id,
             spider=spider,
             workflow=workflow,
+            node=node,
         )
         db.session.commit()
         current_app.logger.info(
-            "Scheduled scrapyd job with id: {0}".format(job_id)
+            "Scheduled scrapyd job with id: {0} on {1}".format(job_id, node)
         )
         current_app.logger.info(
             "Created crawler job with id:{0}".format(crawler_job.id)
         )
+        metrics.SCHEDULE_CRAWL_CALLS.inc(spider=spider, outcome='scheduled')
+        metrics.flush()
     else:
+        metrics.SCHEDULE_CRAWL_CALLS.inc(spider=spider, outcome='error')
+        metrics.flush()
         raise CrawlerScheduleError(
             "Could not schedule '{0}' spider for project '{1}'".format(
                 spider, current_app.config.get('CRAWLER_PROJECT')
@@ -253,3 +939,136 @@ def schedule_crawl(spider, workflow, **kwargs):
         )
 
     return str(crawler_job.job_id)
+
+
+@shared_task(ignore_results=True)
+def schedule_crawl_or_log(spider, workflow, **kwargs):
+    """Schedule a crawl, logging the errors instead of raising them.
+
+    Meant for chains of crawls, that would otherwise stop at the first crawl
+    that cannot be scheduled. Takes the same arguments as
+    :func:`schedule_crawl`.
+    """
+    try:
+        return schedule_crawl(spider, workflow, **kwargs)
+    except (CrawlerScheduleError, RequestException, ScrapydResponseError):
+        current_app.logger.exception(
+            'Could not schedule crawl of {} with {}'.format(spider, kwargs)
+        )
+        metrics.ERRORS.inc(spider=spider, kind='schedule')
+        metrics.flush()
+
+
+@shared_task(ignore_results=True)
+def collect_results_blobs():
+    """Delete the results blobs that are not referenced anymore.
+
+    Blobs are deleted when their last reference is released, this cleans up
+    after interrupted producers, and releases the references of the jobs
+    whose results were submitted, but that were interrupted before releasing
+    them. Meant to be run periodically, e.g. with ``CELERYBEAT_SCHEDULE``,
+    when ``CRAWLER_RESULTS_BLOB_STORE`` is set.
+    """
+    store = _get_blob_store()
+    references = {}
+    for digest, reference in store.references():
+        try:
+            job_id = UUID(reference)
+        except ValueError:
+            continue
+        references.setdefault(job_id, []).append((digest, reference))
+
+    if references:
+        finished_jobs = CrawlerJob.query.filter(
+            CrawlerJob.job_id.in_(list(references)),
+            CrawlerJob.status.in_([JobStatus.FINISHED, JobStatus.ERROR]),
+            CrawlerJob.results.isnot(None),
+        )
+        for job in finished_jobs:
+            for digest, reference in references[job.job_id]:
+                store.release(digest, reference)
+                current_app.logger.info(
+                    'Released results blob {} of finished job {}.'.format(
+                        digest, job.job_id
+                    )
+                )
+
+    deleted = store.collect()
+    if deleted:
+        current_app.logger.info(
+            'Deleted {} unreferenced results blobs.'.format(len(deleted))
+        )
+
+
+def _parse_scrapyd_time(value):
+    """Parse a time of the scrapyd API, such as ``2017-01-31 12:00:00.1``."""
+    if not value:
+        return None
+
+    return datetime.strptime(value.split('.')[0], '%Y-%m-%d %H:%M:%S')
+
+
+@shared_task(ignore_results=True)
+def sync_job_statuses():
+    """Synchronize the status of the unfinished jobs with scrapyd.
+
+    The jobs of each scrapyd node running unfinished jobs are listed with a
+    single request, and the jobs updated with a single statement per status:
+
+    * the pending jobs running in scrapyd are marked as running;
+    * the pending or running jobs that finished in scrapyd, but whose
+      results were not submitted within ``CRAWLER_JOB_RESULTS_GRACE_PERIOD``
+      seconds, are marked as errored.
+
+    Statuses only move forward, so that a job that scrapyd briefly reports
+    as pending is not moved back from running, and finished jobs are never
+    updated. Jobs that scrapyd does not know anymore are left as they are.
+    Meant to be run periodically, e.g. with ``CELERYBEAT_SCHEDULE``.
+    """
+    from inspire_crawler.utils import list_jobs
+
+    nodes = set(
+        node or current_app.config.get('CRAWLER_HOST_URL')
+        for node, in db.session.query(CrawlerJob.node).filter(
+            CrawlerJob.status.in_([JobStatus.PENDING, JobStatus.RUNNING])
+        ).distinct()
+    )
+    finished_before = datetime.now() - timedelta(
+        seconds=current_app.config['CRAWLER_JOB_RESULTS_GRACE_PERIOD']
+    )
+
+    running_ids, errored_ids = [], []
+    for node in sorted(nodes):
+        try:
+            jobs = list_jobs(node)
+        except (RequestException, ScrapydResponseError):
+            current_app.logger.warning(
+                'Could not list the jobs of scrapyd node {}'.format(node),
+                exc_info=True,
+            )
+            continue
+
+        running_ids.extend(job['id'] for job in jobs.get('running', []))
+        for job in jobs.get('finished', []):
+            end_time = _parse_scrapyd_time(job.get('end_time'))
+            if end_time is not None and end_time < finished_before:
+                errored_ids.append(job['id'])
+
+    for status, job_ids, previous_statuses, without_results in (
+        (JobStatus.RUNNING, running_ids, [JobStatus.PENDING], False),
+        (
+            JobStatus.ERROR,
+            errored_ids,
+            [JobStatus.PENDING, JobStatus.RUNNING],
+            True,
+        ),
+    ):
+        updated = CrawlerJob.update_statuses(
+            job_ids, status, previous_statuses,
+            without_results=without_results,
+        )
+        if updated:
+            current_app.logger.info(
+                'Marked {} crawler jobs as {}.'.format(updated, status)
+            )
+    db.session.commit()
@@ -25,23 +25,250 @@
 
 from __future__ import absolute_import, print_function
 
+import os
+import threading
+from timeit import default_timer
+
 from flask import current_app
+from requests import RequestException
+from requests.adapters import HTTPAdapter
 from scrapyd_api import ScrapydAPI
+from scrapyd_api.client import Client
+from scrapyd_api.exceptions import ScrapydResponseError
+from urllib3.util.retry import Retry
+
+from . import metrics
+from .errors import CrawlerSpiderNotFound
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+_node_statuses = {}
+
+_spiders = {}
+
+
+def _create_client(pool_size, retries):
+    client = Client()
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        # Only idempotent requests are retried on read errors and error
+        # statuses, so that a crawl is never scheduled twice.
+        max_retries=Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=(502, 503, 504),
+            raise_on_status=False,
+        ),
+    )
+    client.mount('http://', adapter)
+    client.mount('https://', adapter)
+    return client
+
+
+def get_crawler_client():
+    """Return the HTTP client shared by the requests to scrapyd.
+
+    It is a keep-alive session, whose connections are pooled and reused by
+    all the calls of the process. A new client is created in forked
+    processes, such as Celery workers, so that they never share sockets with
+    their parent.
+    """
+    key = (
+        os.getpid(),
+        current_app.config['CRAWLER_SCRAPYD_POOL_SIZE'],
+        current_app.config['CRAWLER_SCRAPYD_RETRIES'],
+    )
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            if os.getpid() not in set(pid for pid, _, _ in _clients):
+                # Forget the clients inherited from the parent process.
+                _clients.clear()
+            client = _clients.setdefault(key, _create_client(*key[1:]))
+
+    return client
+
+
+def reset_crawler_client():
+    """Close the HTTP clients of the process and forget the cached data."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+    _node_statuses.clear()
+    invalidate_spiders()
 
 
 def get_crawler_instance(*args, **kwargs):
-    """Return current search client."""
-    return ScrapydAPI(
-        current_app.config.get('CRAWLER_HOST_URL'),
-        *args,
-        **kwargs
+    """Return current search client.
+
+    It uses the pooled client of :func:`get_crawler_client`, unless another
+    ``client`` or some ``auth`` credentials are given.
+
+    :param node: URL of the scrapyd node to use, by default
+        ``CRAWLER_HOST_URL``.
+    """
+    node = kwargs.pop('node', None) or current_app.config.get(
+        'CRAWLER_HOST_URL'
+    )
+    if 'auth' not in kwargs:
+        kwargs.setdefault('client', get_crawler_client())
+    kwargs.setdefault('timeout', current_app.config['CRAWLER_SCRAPYD_TIMEOUT'])
+    return ScrapydAPI(node, *args, **kwargs)
+
+
+def get_crawler_nodes():
+    """Return the URLs of the scrapyd nodes crawls can be scheduled on."""
+    return (
+        current_app.config['CRAWLER_HOST_URLS'] or
+        [current_app.config.get('CRAWLER_HOST_URL')]
+    )
+
+
+def get_node_status(node):
+    """Return the status of a scrapyd node, cached for a few seconds.
+
+    :return: the ``daemonstatus.json`` response of the node, with the number
+        of ``running`` and ``pending`` jobs, or ``None`` when the node cannot
+        be reached. Both are cached for ``CRAWLER_NODE_STATUS_CACHE_TTL``
+        seconds.
+    """
+    cached = _node_statuses.get(node)
+    now = default_timer()
+    ttl = current_app.config['CRAWLER_NODE_STATUS_CACHE_TTL']
+    if cached is not None and now - cached[1] < ttl:
+        return cached[0]
+
+    try:
+        with metrics.SCRAPYD_REQUEST_SECONDS.time(endpoint='daemonstatus'):
+            status = get_crawler_client().get(
+                node.rstrip('/') + '/daemonstatus.json',
+                timeout=current_app.config['CRAWLER_SCRAPYD_TIMEOUT'],
+            )
+    except (RequestException, ScrapydResponseError):
+        current_app.logger.warning(
+            'Could not get the status of scrapyd node {}'.format(node),
+            exc_info=True,
+        )
+        status = None
+
+    _node_statuses[node] = (status, now)
+    return status
+
+
+def get_free_slots(node):
+    """Return the number of jobs a scrapyd node can start right away."""
+    status = get_node_status(node)
+    if status is None:
+        return None
+
+    slots = current_app.config['CRAWLER_NODE_SLOTS'].get(
+        node, current_app.config['CRAWLER_NODE_DEFAULT_SLOTS']
     )
+    return slots - status.get('running', 0) - status.get('pending', 0)
+
+
+def choose_crawler_node():
+    """Return the scrapyd node with the most free slots.
+
+    Nodes that cannot be reached are skipped, and the first node is returned
+    when none of them can. Ties are broken in the order of
+    ``CRAWLER_HOST_URLS``.
+    """
+    nodes = get_crawler_nodes()
+    if len(nodes) == 1:
+        return nodes[0]
+
+    best_node, best_slots = nodes[0], None
+    for node in nodes:
+        slots = get_free_slots(node)
+        if slots is not None and (best_slots is None or slots > best_slots):
+            best_node, best_slots = node, slots
 
+    return best_node
 
-def list_spiders():
+
+def add_pending_job(node):
+    """Account for a job scheduled on a node in its cached status.
+
+    So that the following crawls scheduled by the process before the cache
+    expires are spread over the other nodes.
+    """
+    cached = _node_statuses.get(node)
+    if cached is not None and cached[0] is not None:
+        status = dict(cached[0])
+        status['pending'] = status.get('pending', 0) + 1
+        _node_statuses[node] = (status, cached[1])
+
+
+def list_jobs(node=None):
+    """Return the jobs of the project on a scrapyd node.
+
+    :return: the ``listjobs.json`` response of the node, with the lists of
+        ``pending``, ``running`` and ``finished`` jobs.
+    """
+    crawler = get_crawler_instance(node=node)
+    with metrics.SCRAPYD_REQUEST_SECONDS.time(endpoint='listjobs'):
+        return crawler.list_jobs(current_app.config.get('CRAWLER_PROJECT'))
+
+
+def list_spiders(refresh=False):
     """Show the list of currently available spiders in the scrapyd server.
+
+    The list is cached for ``CRAWLER_SPIDERS_CACHE_TTL`` seconds.
+
+    :param refresh: whether to get the list from scrapyd even if it is
+        cached.
+    """
+    project = current_app.config.get('CRAWLER_PROJECT')
+    cached = _spiders.get(project)
+    now = default_timer()
+    if (
+        not refresh and
+        cached is not None and
+        now - cached[1] < current_app.config['CRAWLER_SPIDERS_CACHE_TTL']
+    ):
+        return cached[0]
+
+    crawler = get_crawler_instance(node=get_crawler_nodes()[0])
+    with metrics.SCRAPYD_REQUEST_SECONDS.time(endpoint='listspiders'):
+        spiders = crawler.list_spiders(project=project)
+
+    _spiders[project] = (spiders, now)
+    return spiders
+
+
+def invalidate_spiders():
+    """Forget the cached list of spiders, e.g. after deploying spiders."""
+    _spiders.clear()
+
+
+def check_spider(spider):
+    """Check that a spider is deployed before scheduling it.
+
+    The cached list of spiders is refreshed once when the spider is not in
+    it, in case it was deployed since. The check is skipped when scrapyd
+    cannot be reached, leaving the error to the scheduling request.
+
+    :raises inspire_crawler.errors.CrawlerSpiderNotFound: if the spider is
+        not deployed.
     """
-    crawler = get_crawler_instance()
-    return crawler.list_spiders(
-        project=current_app.config.get('CRAWLER_PROJECT'),
+    try:
+        if spider in list_spiders() or spider in list_spiders(refresh=True):
+            return
+    except (RequestException, ScrapydResponseError):
+        current_app.logger.warning(
+            'Could not get the list of spiders, not checking {}'.format(
+                spider
+            ),
+            exc_info=True,
+        )
+        return
+
+    raise CrawlerSpiderNotFound(
+        "Spider '{0}' not found in project '{1}'".format(
+            spider, current_app.config.get('CRAWLER_PROJECT')
+        )
     )
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2016 CERN.
+#
+# INSPIRE is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Validation of the format of crawl results."""
+
+from __future__ import absolute_import, print_function
+
+import six
+
+
+CRAWL_RESULT_SCHEMA = (
+    ('record', (dict,)),
+    ('errors', (list,)),
+    ('source_data', six.string_types + (dict, type(None))),
+    ('file_name', six.string_types + (type(None),)),
+)
+"""Required keys of crawl results, with the types allowed for their values.
+
+Keys are checked in this order, and only the first problem is reported.
+"""
+
+_TYPE_NAMES = {
+    dict: 'an object',
+    list: 'a list',
+    type(None): 'null',
+}
+
+
+def _describe_types(types):
+    names = []
+    for type_ in types:
+        name = _TYPE_NAMES.get(type_, 'a string')
+        if name not in names:
+            names.append(name)
+
+    return ' or '.join(names)
+
+
+def compile_validator(max_sizes=None):
+    """Compile a function checking the format of crawl results.
+
+    The schema is resolved once, so that checking a result only costs a few
+    lookups and ``isinstance`` calls.
+
+    :param max_sizes: maximal length of the values of some keys of the crawl
+        results, such as ``{'source_data': 10485760}``.
+    :return: a function returning ``None`` for valid crawl results, or the
+        ``(exception, message)`` describing the first problem found.
+    """
+    max_sizes = max_sizes or {}
+    checks = tuple(
+        (key, types, _describe_types(types), max_sizes.get(key))
+        for key, types in CRAWL_RESULT_SCHEMA
+    )
+
+    def validate(crawl_result):
+        if not isinstance(crawl_result, dict):
+            return 'TypeError', 'Wrong crawl result format. Not an object'
+
+        for key, types, type_names, max_size in checks:
+            if key not in crawl_result:
+                return (
+                    'KeyError',
+                    'Wrong crawl result format. Missing the key `{}`'.format(
+                        key
+                    ),
+                )
+
+            value = crawl_result[key]
+            if not isinstance(value, types):
+                return (
+                    'TypeError',
+                    'Wrong crawl result format. The key `{}` must be {}'
+                    .format(key, type_names),
+                )
+
+            if (
+                max_size is not None and value is not None and
+                len(value) > max_size
+            ):
+                return (
+                    'ValueError',
+                    'Wrong crawl result format. The key `{}` is longer than '
+                    '{}'.format(key, max_size),
+                )
+
+        return None
+
+    return validate
+
+
+def invalid_crawl_result(crawl_result, exception, message):
+    """Return the crawl result with errors replacing an invalid one."""
+    file_name = None
+    if isinstance(crawl_result, dict):
+        file_name = crawl_result.get('file_name')
+
+    return {
+        'record': {},
+        'errors': [
+            {
+                'exception': exception,
+                'traceback': message,
+            }
+        ],
+        'source_data': crawl_result,
+        'file_name': file_name,
+    }
+
+
+def validate_crawl_results(crawl_results, validate):
+    """Validate a chunk of crawl results before writing them.
+
+    :param validate: function compiled by :func:`compile_validator`.
+    :return: a tuple with the list of crawl results, in which invalid ones
+        are replaced by crawl results with errors, and the number of invalid
+        results.
+    """
+    checked = []
+    invalid = 0
+    for crawl_result in crawl_results:
+        problem = validate(crawl_result)
+        if problem is not None:
+            crawl_result = invalid_crawl_result(crawl_result, *problem)
+            invalid += 1
+        checked.append(crawl_result)
+
+    return checked, invalid
@@ -57,6 +57,19 @@ extras_require = {
         'invenio-db[versioning]==1.0.4',
     ],
     'tests': tests_require,
+    'msgpack': [
+        'msgpack>=0.5.2',
+    ],
+    'cbor': [
+        'cbor2>=4.0,<=5.2.0.post1; python_version < "3"',
+        'cbor2>=4.0; python_version >= "3"',
+    ],
+    'xz': [
+        'backports.lzma; python_version < "3"',
+    ],
+    'zstd': [
+        'zstandard',
+    ],
 }
 
 extras_require['all'] = []
@@ -24,11 +24,16 @@
 
 from __future__ import absolute_import, print_function
 
+import importlib
+import os
+
 import pytest
 from sqlalchemy import inspect
 
 from invenio_db.utils import drop_alembic_version_table
 
+from inspire_crawler import alembic
+
 
 def test_alembic_revision_34b150f80576(app, db):
     ext = app.extensions['invenio-db']
@@ -57,3 +62,194 @@ def test_alembic_revision_34b150f80576(app, db):
         assert 'crawler_workflows_object' not in inspector.get_table_names()
 
     drop_alembic_version_table()
+
+
+def test_alembic_revision_cb885fdea005(app, db):
+    ext = app.extensions['invenio-db']
+
+    if db.engine.name == 'sqlite':
+        raise pytest.skip('Upgrades are not supported on SQLite.')
+
+    db.drop_all()
+    drop_alembic_version_table()
+
+    ext.alembic.upgrade(target='cb885fdea005')
+    with app.app_context():
+        inspector = inspect(db.engine)
+        columns = [col['name'] for col in inspector.get_columns('crawler_job')]
+        assert 'shards_pending' in columns
+
+    ext.alembic.downgrade(target='34b150f80576')
+    with app.app_context():
+        inspector = inspect(db.engine)
+        columns = [col['name'] for col in inspector.get_columns('crawler_job')]
+        assert 'shards_pending' not in columns
+
+    drop_alembic_version_table()
+
+
+def test_alembic_revision_93f5b1abbcf9(app, db):
+    ext = app.extensions['invenio-db']
+
+    if db.engine.name == 'sqlite':
+        raise pytest.skip('Upgrades are not supported on SQLite.')
+
+    db.drop_all()
+    drop_alembic_version_table()
+
+    ext.alembic.upgrade(target='93f5b1abbcf9')
+    with app.app_context():
+        inspector = inspect(db.engine)
+        assert 'crawler_ingestion_checkpoint' in inspector.get_table_names()
+
+    ext.alembic.downgrade(target='cb885fdea005')
+    with app.app_context():
+        inspector = inspect(db.engine)
+        assert 'crawler_ingestion_checkpoint' not in \
+            inspector.get_table_names()
+
+    drop_alembic_version_table()
+
+
+def test_alembic_revision_fb89b148289c(app, db):
+    ext = app.extensions['invenio-db']
+
+    if db.engine.name == 'sqlite':
+        raise pytest.skip('Upgrades are not supported on SQLite.')
+
+    db.drop_all()
+    drop_alembic_version_table()
+
+    ext.alembic.upgrade(target='fb89b148289c')
+    with app.app_context():
+        inspector = inspect(db.engine)
+        assert 'crawler_record_fingerprint' in inspector.get_table_names()
+
+    ext.alembic.downgrade(target='93f5b1abbcf9')
+    with app.app_context():
+        inspector = inspect(db.engine)
+        assert 'crawler_record_fingerprint' not in inspector.get_table_names()
+
+    drop_alembic_version_table()
+
+
+def test_alembic_revision_4c9a1e6f2b7d(app, db):
+    ext = app.extensions['invenio-db']
+
+    if db.engine.name == 'sqlite':
+        raise pytest.skip('Upgrades are not supported on SQLite.')
+
+    db.drop_all()
+    drop_alembic_version_table()
+
+    ext.alembic.upgrade(target='4c9a1e6f2b7d')
+    with app.app_context():
+        inspector = inspect(db.engine)
+        columns = [col['name'] for col in inspector.get_columns('crawler_job')]
+        assert 'stats' in columns
+
+    ext.alembic.downgrade(target='fb89b148289c')
+    with app.app_context():
+        inspector = inspect(db.engine)
+        columns = [col['name'] for col in inspector.get_columns('crawler_job')]
+        assert 'stats' not in columns
+
+    drop_alembic_version_table()
+
+
+def test_alembic_revision_7e2d5c8a9f31(app, db):
+    ext = app.extensions['invenio-db']
+
+    if db.engine.name == 'sqlite':
+        raise pytest.skip('Upgrades are not supported on SQLite.')
+
+    db.drop_all()
+    drop_alembic_version_table()
+
+    ext.alembic.upgrade(target='7e2d5c8a9f31')
+    with app.app_context():
+        inspector = inspect(db.engine)
+        assert 'crawler_spider_bucket' in inspector.get_table_names()
+
+    ext.alembic.downgrade(target='4c9a1e6f2b7d')
+    with app.app_context():
+        inspector = inspect(db.engine)
+        assert 'crawler_spider_bucket' not in inspector.get_table_names()
+
+    drop_alembic_version_table()
+
+
+def test_alembic_revision_a3f81c6d0e42(app, db):
+    ext = app.extensions['invenio-db']
+
+    if db.engine.name == 'sqlite':
+        raise pytest.skip('Upgrades are not supported on SQLite.')
+
+    db.drop_all()
+    drop_alembic_version_table()
+
+    ext.alembic.upgrade(target='a3f81c6d0e42')
+    with app.app_context():
+        inspector = inspect(db.engine)
+        columns = [col['name'] for col in inspector.get_columns('crawler_job')]
+        assert 'node' in columns
+
+    ext.alembic.downgrade(target='7e2d5c8a9f31')
+    with app.app_context():
+        inspector = inspect(db.engine)
+        columns = [col['name'] for col in inspector.get_columns('crawler_job')]
+        assert 'node' not in columns
+
+    drop_alembic_version_table()
+
+
+def test_alembic_revision_5d0b7a2e9c14(app, db):
+    ext = app.extensions['invenio-db']
+
+    if db.engine.name == 'sqlite':
+        raise pytest.skip('Upgrades are not supported on SQLite.')
+
+    db.drop_all()
+    drop_alembic_version_table()
+
+    ext.alembic.upgrade(target='5d0b7a2e9c14')
+    with app.app_context():
+        inspector = inspect(db.engine)
+        columns = [
+            col['name']
+            for col in inspector.get_columns('crawler_ingestion_checkpoint')
+        ]
+        assert 'unpublished' in columns
+        assert 'dispatched' in columns
+
+    ext.alembic.downgrade(target='a3f81c6d0e42')
+    with app.app_context():
+        inspector = inspect(db.engine)
+        columns = [
+            col['name']
+            for col in inspector.get_columns('crawler_ingestion_checkpoint')
+        ]
+        assert 'unpublished' not in columns
+        assert 'dispatched' not in columns
+
+    drop_alembic_version_table()
+
+
+def test_alembic_revisions_import():
+    """Import every revision, as the upgrade tests are skipped on SQLite."""
+    revisions = {}
+    for filename in os.listdir(os.path.dirname(alembic.__file__)):
+        name, extension = os.path.splitext(filename)
+        if extension != '.py' or name == '__init__':
+            continue
+
+        module = importlib.import_module('inspire_crawler.alembic.' + name)
+        assert name.startswith(module.revision + '_')
+        revisions[module.revision] = module
+
+    for revision in (
+        '4c9a1e6f2b7d', '7e2d5c8a9f31', 'a3f81c6d0e42', '5d0b7a2e9c14'
+    ):
+        module = revisions[revision]
+        assert module.down_revision in revisions
+        assert callable(module.upgrade) and callable(module.downgrade)
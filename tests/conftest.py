@@ -39,6 +39,7 @@ from invenio_workflows import InvenioWorkflows
 from invenio_workflows_ui import InvenioWorkflowsUI
 from invenio_oaiharvester import InvenioOAIHarvester
 from inspire_crawler import INSPIRECrawler
+from inspire_crawler.utils import reset_crawler_client
 
 from sqlalchemy_utils.functions import create_database, database_exists
 
@@ -71,6 +72,7 @@ def app(request):
 
     with app.app_context():
         yield app
+        reset_crawler_client()
 
     shutil.rmtree(instance_path)
 
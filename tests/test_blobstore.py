@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2018 CERN.
+#
+# INSPIRE is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, print_function
+
+import hashlib
+import os
+
+from inspire_crawler.blobstore import BlobStore, dump_results
+from inspire_crawler.results import read_results
+
+
+def test_put_and_release(tmpdir):
+    store = BlobStore(str(tmpdir))
+
+    digest = store.put([b'first\n', b'second\n'], 'job-1')
+
+    assert digest == hashlib.sha256(b'first\nsecond\n').hexdigest()
+    with open(store.path(digest), 'rb') as fd:
+        assert fd.read() == b'first\nsecond\n'
+    assert store.release(digest, 'job-1')
+    assert not os.path.exists(store.path(digest))
+
+
+def test_blob_shared_by_several_references(tmpdir):
+    store = BlobStore(str(tmpdir))
+
+    digest = store.put([b'content\n'], 'job-1')
+    assert store.put([b'content\n'], 'job-2') == digest
+
+    assert not store.release(digest, 'job-1')
+    assert os.path.exists(store.path(digest))
+    assert store.release(digest, 'job-2')
+    assert not os.path.exists(store.path(digest))
+
+
+def test_dump_results(app, tmpdir):
+    results_data = [{'record': {'title': u'\xe9'}}, {'record': {}}]
+    store = BlobStore(str(tmpdir))
+
+    digest = store.put(dump_results(results_data), 'job-1')
+
+    with app.app_context():
+        assert list(read_results(store.path(digest))) == results_data
+
+
+def test_references(tmpdir):
+    store = BlobStore(str(tmpdir))
+    assert list(store.references()) == []
+
+    first = store.put([b'first\n'], 'job-1')
+    second = store.put([b'second\n'], 'job-2')
+    store.put([b'second\n'], 'job-3')
+
+    assert sorted(store.references()) == sorted([
+        (first, 'job-1'), (second, 'job-2'), (second, 'job-3'),
+    ])
+
+
+def test_collect(tmpdir):
+    store = BlobStore(str(tmpdir))
+    assert store.collect() == []
+
+    referenced = store.put([b'referenced\n'], 'job-1')
+    orphan = store.put([b'orphan\n'], 'job-2')
+    os.remove(os.path.join(str(tmpdir), 'refs', orphan, 'job-2'))
+    os.rmdir(os.path.join(str(tmpdir), 'refs', orphan))
+
+    assert store.collect() == [orphan]
+    assert os.path.exists(store.path(referenced))
+    assert not os.path.exists(store.path(orphan))
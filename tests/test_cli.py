@@ -24,6 +24,8 @@
 
 from __future__ import absolute_import, print_function
 
+import gzip
+
 import requests_mock
 from click.testing import CliRunner
 from mock import patch, MagicMock
@@ -57,6 +59,29 @@ def test_schedule_crawl_cli(mock_schedule_crawl, mock_models, script_info):
     assert str(mock_crawl_job.id) in result.output
 
 
+def test_schedule_crawl_cli_unknown_spider(script_info):
+    with requests_mock.Mocker() as requests_mocker:
+        requests_mocker.register_uri(
+            'GET', 'http://localhost:6800/listspiders.json?project=hepcrawl',
+            json={'spiders': ['APS', 'BASE'], 'status': 'ok'})
+
+        runner = CliRunner()
+
+        result = runner.invoke(
+            crawler,
+            ['schedule', 'ASP', 'article'],
+            obj=script_info,
+        )
+
+        assert result.exit_code == 1
+        assert "Spider 'ASP' not found" in result.output
+        assert 'Available spiders:\nAPS\nBASE\n' in result.output
+        assert not any(
+            request.path == '/schedule.json'
+            for request in requests_mocker.request_history
+        )
+
+
 def test_list_spiders_cli(script_info):
     with requests_mock.Mocker() as requests_mocker:
         requests_mocker.register_uri(
@@ -69,3 +94,44 @@ def test_list_spiders_cli(script_info):
 
         assert result.exit_code == 0
         assert 'APS\nBASE\nCDS\n' == result.output
+
+
+@patch('inspire_crawler.cli.models')
+def test_job_results_cli_decompresses_results(mock_models, script_info,
+                                              tmpdir):
+    results_path = tmpdir.join('results.jl.gz')
+    with gzip.open(str(results_path), 'wb') as fd:
+        fd.write(b'{"record": {"title": "First"}}\n')
+        fd.write(b'{"record": {"title": "Second"}}\n')
+
+    mock_crawl_job = MagicMock()
+    mock_crawl_job.results = 'file:/' + str(results_path)
+    mock_models.CrawlerJob.query.filter_by.return_value.one.return_value = \
+        mock_crawl_job
+
+    runner = CliRunner()
+
+    result = runner.invoke(crawler, ['job', 'results', '1'], obj=script_info)
+
+    assert result.exit_code == 0
+    assert '{"record": {"title": "First"}}\n' in result.output
+    assert '{"record": {"title": "Second"}}\n' in result.output
+
+
+@patch('inspire_crawler.cli.models')
+def test_job_logs_cli_replaces_invalid_bytes(mock_models, script_info,
+                                             tmpdir):
+    log_path = tmpdir.join('job.log')
+    log_path.write_binary(b'INFO: Crawled \xff\xfe page\nINFO: Done\n')
+
+    mock_crawl_job = MagicMock()
+    mock_crawl_job.logs = 'file:/' + str(log_path)
+    mock_models.CrawlerJob.query.filter_by.return_value.one_or_none \
+        .return_value = mock_crawl_job
+
+    runner = CliRunner()
+
+    result = runner.invoke(crawler, ['job', 'logs', '1'], obj=script_info)
+
+    assert result.exit_code == 0
+    assert u'INFO: Crawled \ufffd\ufffd page\nINFO: Done\n' in result.output
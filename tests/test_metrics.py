@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2018 CERN.
+#
+# INSPIRE is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, print_function
+
+import json
+import os
+import socket
+import subprocess
+
+import requests_mock
+from flask import Flask
+
+from inspire_crawler import INSPIRECrawler, metrics
+from inspire_crawler.metrics import Registry
+
+
+def test_registry_render():
+    registry = Registry()
+    counter = registry.counter('test_total', 'A counter.', ('spider',))
+    histogram = registry.histogram(
+        'test_seconds', 'A histogram.', buckets=(1, 10)
+    )
+    counter.inc(spider='arXiv')
+    counter.inc(2, spider='arXiv')
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    assert registry.render() == '\n'.join([
+        '# HELP test_seconds A histogram.',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{le="1.0"} 1.0',
+        'test_seconds_bucket{le="10.0"} 2.0',
+        'test_seconds_bucket{le="+Inf"} 2.0',
+        'test_seconds_sum 5.5',
+        'test_seconds_count 2.0',
+        '# HELP test_total A counter.',
+        '# TYPE test_total counter',
+        'test_total{spider="arXiv"} 3.0',
+    ]) + '\n'
+
+
+def test_registry_merged():
+    registry = Registry()
+    counter = registry.counter('test_total', 'A counter.', ('spider',))
+    counter.inc(spider='arXiv')
+    snapshot = registry.snapshot()
+
+    merged = registry.merged([json.loads(json.dumps(snapshot))])
+
+    assert 'test_total{spider="arXiv"} 2.0' in merged.render()
+    assert counter.values == {('arXiv',): 1}
+
+
+def test_metrics_endpoint(tmpdir):
+    app = Flask(__name__)
+    app.config.update(
+        CRAWLER_METRICS_ENABLED=True,
+        CRAWLER_METRICS_DIRECTORY=str(tmpdir),
+    )
+    INSPIRECrawler(app)
+    other_process = Registry()
+    other_process.counter(
+        'crawler_records_ingested_total', '', ('spider',)
+    ).inc(1000, spider='test-metrics')
+    tmpdir.join('metrics-1.json').write(json.dumps(other_process.snapshot()))
+
+    with app.app_context():
+        metrics.RECORDS_INGESTED.inc(spider='test-metrics')
+        metrics.flush()
+        assert tmpdir.join('metrics-{}.json'.format(os.getpid())).check()
+
+    response = app.test_client().get('/crawler/metrics')
+
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    assert b'crawler_records_ingested_total{spider="test-metrics"} 1001.0' \
+        in response.data
+
+
+def test_flush_to_pushgateway(app):
+    app.config['CRAWLER_METRICS_PUSHGATEWAY_URL'] = 'http://pushgateway:9091'
+    with requests_mock.Mocker() as requests_mocker:
+        requests_mocker.put(
+            requests_mock.ANY, status_code=500
+        )
+        metrics.flush()
+        requests_mocker.put(requests_mock.ANY)
+        metrics.flush()
+
+        request = requests_mocker.request_history[-1]
+        assert request.url == (
+            'http://pushgateway:9091/metrics/job/inspire_crawler/instance/' +
+            socket.gethostname()
+        )
+        assert 'crawler_records_ingested_total' in request.text
+
+
+def _exited_pid():
+    process = subprocess.Popen(['true'])
+    process.wait()
+    return process.pid
+
+
+def test_render_archives_exited_processes(app, tmpdir):
+    app.config['CRAWLER_METRICS_DIRECTORY'] = str(tmpdir)
+    other_process = Registry()
+    other_process.counter(
+        'crawler_records_ingested_total', '', ('spider',)
+    ).inc(1000, spider='test-exited')
+    for pid in (_exited_pid(), _exited_pid()):
+        tmpdir.join('metrics-{}.json'.format(pid)).write(
+            json.dumps(other_process.snapshot())
+        )
+
+    for _ in range(2):
+        rendered = metrics.render()
+        assert 'crawler_records_ingested_total{spider="test-exited"} 2000.0' \
+            in rendered
+
+    assert sorted(
+        path.basename for path in tmpdir.listdir('metrics-*.json')
+    ) == ['metrics-exited.json']
+
+
+def test_flush_to_pushgateway_adds_up_processes(app, tmpdir):
+    app.config.update(
+        CRAWLER_METRICS_DIRECTORY=str(tmpdir),
+        CRAWLER_METRICS_PUSHGATEWAY_URL='http://pushgateway:9091',
+    )
+    other_process = Registry()
+    other_process.counter(
+        'crawler_records_ingested_total', '', ('spider',)
+    ).inc(1000, spider='test-push')
+    tmpdir.join('metrics-1.json').write(json.dumps(other_process.snapshot()))
+
+    with requests_mock.Mocker() as requests_mocker:
+        requests_mocker.put(requests_mock.ANY)
+        metrics.flush()
+
+        request = requests_mocker.request_history[-1]
+        assert request.url.endswith('/instance/' + socket.gethostname())
+        assert 'crawler_records_ingested_total{spider="test-push"} 1000.0' \
+            in request.text
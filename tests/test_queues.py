@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2018 CERN.
+#
+# INSPIRE is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, print_function
+
+from mock import MagicMock, patch
+
+from inspire_crawler.queues import QueueDepthMonitor, get_queue_depth
+
+
+class ChannelError(Exception):
+    pass
+
+
+def _mock_broker(mock_celery_app, depths):
+    conn = mock_celery_app.connection_or_acquire.return_value \
+        .__enter__.return_value
+    conn.channel_errors = (ChannelError,)
+    channel = conn.channel.return_value
+
+    def queue_declare(queue, passive):
+        assert passive
+        if queue not in depths:
+            raise ChannelError('NOT_FOUND - no queue {}'.format(queue))
+        return MagicMock(message_count=depths[queue])
+
+    channel.queue_declare.side_effect = queue_declare
+    return channel
+
+
+@patch('inspire_crawler.queues.default_timer')
+@patch('inspire_crawler.queues.current_celery_app')
+def test_queue_depth_monitor(mock_celery_app, mock_timer, app):
+    depths = {'arxiv': 10, 'desy': 20}
+    channel = _mock_broker(mock_celery_app, depths)
+    monitor = QueueDepthMonitor(ttl=5)
+
+    mock_timer.return_value = 100
+    assert monitor.get_depth('arxiv') == 10
+    mock_timer.return_value = 102
+    assert monitor.get_depth('desy') == 20
+    depths.update(arxiv=11, desy=21)
+    assert monitor.get_depth('arxiv') == 10
+    assert mock_celery_app.connection_or_acquire.call_count == 2
+
+    # Both queues are stale, and refreshed together.
+    mock_timer.return_value = 110
+    assert monitor.get_depth('arxiv') == 11
+    assert monitor.get_depth('desy') == 21
+    assert mock_celery_app.connection_or_acquire.call_count == 3
+    assert channel.queue_declare.call_count == 4
+
+
+@patch('inspire_crawler.queues.current_celery_app')
+def test_get_queue_depth_without_cache(mock_celery_app, app):
+    app.config['CRAWLER_QUEUE_DEPTH_CACHE_TTL'] = 0
+    depths = {'arxiv': 10}
+    _mock_broker(mock_celery_app, depths)
+
+    assert get_queue_depth('arxiv') == 10
+    depths['arxiv'] = 11
+    assert get_queue_depth('arxiv') == 11
+
+
+@patch('inspire_crawler.queues.default_timer')
+@patch('inspire_crawler.queues.current_celery_app')
+def test_queue_depth_monitor_missing_queue(mock_celery_app, mock_timer, app):
+    depths = {'arxiv': 10}
+    channel = _mock_broker(mock_celery_app, depths)
+    monitor = QueueDepthMonitor(ttl=5)
+
+    mock_timer.return_value = 100
+    assert monitor.get_depth('desy') == 0
+    assert monitor.get_depth('arxiv') == 10
+
+    # The missing queue does not prevent refreshing the others.
+    mock_timer.return_value = 110
+    depths['arxiv'] = 11
+    monitor.refresh(['desy', 'arxiv'])
+    assert monitor.get_depth('arxiv') == 11
+    assert channel.close.call_count == channel.queue_declare.call_count
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2018 CERN.
+#
+# INSPIRE is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, print_function
+
+import bz2
+import gzip
+import json
+
+import pytest
+from mock import patch
+
+from inspire_crawler.decoders import get_json_decoder, pack_binary_record
+from inspire_crawler.errors import CrawlerUnsupportedResultsFormat
+from inspire_crawler.results import (
+    get_compression,
+    get_format,
+    is_splittable,
+    lzma,
+    open_results,
+    read_results,
+    read_results_lines,
+    zstandard,
+)
+
+
+RECORDS = [
+    {'record': {'titles': [{'title': 'First'}]}, 'errors': []},
+    {'record': {'titles': [{'title': 'Second'}]}, 'errors': []},
+]
+
+CONTENT = b''.join(
+    json.dumps(record).encode('utf-8') + b'\n' for record in RECORDS
+)
+
+BINARY_MODULES = {
+    'cbor': 'cbor2',
+    'msgpack': 'msgpack',
+}
+
+
+def _write(path, opener):
+    with opener(str(path), 'wb') as fd:
+        fd.write(CONTENT)
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    'file_name,opener,expected_compression',
+    [
+        ('results.jl', open, None),
+        ('results.jl.gz', gzip.open, 'gzip'),
+        ('results.jl.bz2', bz2.BZ2File, 'bz2'),
+    ],
+)
+def test_read_results(app, tmpdir, file_name, opener, expected_compression):
+    results_path = _write(tmpdir.join(file_name), opener)
+
+    assert get_compression(results_path) == expected_compression
+    with app.app_context():
+        assert list(read_results(results_path)) == RECORDS
+
+
+@pytest.mark.parametrize(
+    'opener,expected_compression',
+    [
+        (gzip.open, 'gzip'),
+        (bz2.BZ2File, 'bz2'),
+    ],
+)
+def test_get_compression_from_magic_number(tmpdir, opener,
+                                           expected_compression):
+    results_path = _write(tmpdir.join('results.jl'), opener)
+
+    assert get_compression(results_path) == expected_compression
+    with open_results(results_path) as fd:
+        assert fd.read() == CONTENT
+
+
+@pytest.mark.skipif(lzma is None, reason='lzma is not installed')
+def test_read_results_xz(app, tmpdir):
+    results_path = _write(tmpdir.join('results.jl.xz'), lzma.open)
+
+    with app.app_context():
+        assert list(read_results(results_path)) == RECORDS
+
+
+@pytest.mark.skipif(zstandard is None, reason='zstandard is not installed')
+def test_read_results_zstd(app, tmpdir):
+    results_path = str(tmpdir.join('results.jl.zst'))
+    with open(results_path, 'wb') as fd:
+        fd.write(zstandard.ZstdCompressor().compress(CONTENT))
+
+    with app.app_context():
+        assert list(read_results(results_path)) == RECORDS
+
+
+@pytest.mark.skipif(
+    zstandard is not None,
+    reason='zstandard is installed',
+)
+def test_open_results_without_decompressor(tmpdir):
+    results_path = str(tmpdir.join('results.jl.zst'))
+    with open(results_path, 'wb') as fd:
+        fd.write(b'\x28\xb5\x2f\xfd')
+
+    with pytest.raises(CrawlerUnsupportedResultsFormat):
+        open_results(results_path)
+
+
+def test_get_json_decoder():
+    assert get_json_decoder('json') is json.loads
+    assert get_json_decoder() is not None
+
+
+def test_get_json_decoder_not_installed():
+    with pytest.raises(CrawlerUnsupportedResultsFormat):
+        get_json_decoder('not-a-json-library')
+
+
+@pytest.mark.parametrize(
+    'file_name,expected_format,expected_splittable',
+    [
+        ('results.jl', 'jsonl', True),
+        ('results.jl.gz', 'jsonl', False),
+        ('results.msgpack', 'msgpack', False),
+        ('results.cbor.bz2', 'cbor', False),
+    ],
+)
+def test_get_format(tmpdir, file_name, expected_format, expected_splittable):
+    results_path = str(tmpdir.join(file_name))
+    with open(results_path, 'wb'):
+        pass
+
+    assert get_format(results_path) == expected_format
+    assert is_splittable(results_path) == expected_splittable
+
+
+@pytest.mark.parametrize('results_format', ['msgpack', 'cbor'])
+@pytest.mark.parametrize('opener,extension', [(open, ''), (gzip.open, '.gz')])
+def test_read_results_binary(app, tmpdir, results_format, opener, extension):
+    pytest.importorskip(BINARY_MODULES[results_format])
+    results_path = str(tmpdir.join('results.' + results_format + extension))
+    with opener(results_path, 'wb') as fd:
+        for record in RECORDS:
+            fd.write(pack_binary_record(record, results_format))
+
+    assert list(read_results(results_path)) == RECORDS
+    assert [
+        json.loads(line) for line in read_results_lines(results_path)
+    ] == RECORDS
+    with pytest.raises(CrawlerUnsupportedResultsFormat):
+        list(read_results(results_path, start=10))
+
+
+def test_read_results_truncated_binary_record(app, tmpdir):
+    pytest.importorskip('msgpack')
+    results_path = str(tmpdir.join('results.msgpack'))
+    with open(results_path, 'wb') as fd:
+        fd.write(pack_binary_record(RECORDS[0], 'msgpack')[:-1])
+
+    with pytest.raises(CrawlerUnsupportedResultsFormat):
+        list(read_results(results_path))
+
+
+@pytest.mark.parametrize(
+    'start,end',
+    [(0, None), (0, 300), (300, 1000), (1000, None)],
+)
+def test_read_results_in_parallel(app, tmpdir, start, end):
+    results_path = str(tmpdir.join('results.jl'))
+    with open(results_path, 'wb') as fd:
+        for idx in range(100):
+            fd.write(json.dumps({'record': {'idx': idx}}).encode('utf-8'))
+            fd.write(b'\n\n' if idx % 10 else b'\n')
+
+    expected = list(read_results(results_path, start, end))
+
+    app.config.update(
+        CRAWLER_RESULTS_DECODE_PROCESSES=2,
+        CRAWLER_RESULTS_DECODE_CHUNK_SIZE=128,
+    )
+    with patch('inspire_crawler.results.multiprocessing') as multiprocessing:
+        multiprocessing.current_process.return_value.daemon = True
+        assert list(read_results(results_path, start, end)) == expected
+        assert not multiprocessing.Pool.called
+
+    assert list(read_results(results_path, start, end)) == expected
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2018 CERN.
+#
+# INSPIRE is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, print_function
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from celery.exceptions import Retry
+from mock import patch
+
+from inspire_crawler.models import (
+    CrawlerJob,
+    CrawlerSpiderBucket,
+    JobStatus,
+)
+from inspire_crawler.errors import CrawlerScheduleError
+from inspire_crawler.scheduler import acquire, get_crawl_size
+from inspire_crawler.tasks import schedule_crawl_adaptive
+
+
+NOW = datetime(2017, 1, 1, 12)
+
+
+def _at(seconds):
+    return NOW + timedelta(seconds=seconds)
+
+
+@patch('inspire_crawler.scheduler.get_queue_depth')
+def test_acquire_follows_drain_rate(mock_get_queue_depth, app, db):
+    mock_get_queue_depth.return_value = 1000
+
+    assert acquire('desy', _at(0)) == 0
+    assert acquire('desy', _at(0)) == 0
+    # The burst is spent, and no drain rate is known yet.
+    assert acquire('desy', _at(1)) == 1800
+    mock_get_queue_depth.assert_called_with('desy-harvest')
+
+    # 600 records drained in 60 seconds, for crawls of one record.
+    mock_get_queue_depth.return_value = 400
+    assert acquire('desy', _at(60)) == 0
+
+
+@patch('inspire_crawler.scheduler.get_queue_depth')
+def test_acquire_keeps_target_depth(mock_get_queue_depth, app, db):
+    app.config['CRAWLER_SCHEDULER_TARGET_DEPTH'] = 100
+    mock_get_queue_depth.return_value = 1000
+
+    assert acquire('desy', _at(0)) == 1800
+
+    mock_get_queue_depth.return_value = 900
+    assert acquire('desy', _at(10)) == pytest.approx(80)
+
+    mock_get_queue_depth.return_value = 0
+    assert acquire('desy', _at(20)) == 0
+
+
+def test_get_for_update_existing_bucket(app, db):
+    now = datetime.now()
+    bucket = CrawlerSpiderBucket.get_for_update('desy', 2, now)
+    bucket.tokens = 1
+    db.session.commit()
+
+    # As when another worker created the bucket in the meantime.
+    bucket = CrawlerSpiderBucket.get_for_update('desy', 2, now)
+    assert bucket.tokens == 1
+    assert CrawlerSpiderBucket.query.count() == 1
+
+
+def test_get_crawl_size(app, db):
+    assert get_crawl_size('desy') == 1.0
+
+    for records in (100, 300):
+        job = CrawlerJob.create(
+            job_id=uuid.uuid4().hex,
+            spider='desy',
+            workflow='article',
+            status=JobStatus.FINISHED,
+        )
+        job.stats = {'records': records, 'seconds': 1.0, 'stages': {}}
+    db.session.commit()
+
+    assert get_crawl_size('desy') == 200.0
+
+
+@patch('inspire_crawler.tasks.schedule_crawl')
+@patch('inspire_crawler.tasks.scheduler.acquire')
+def test_schedule_crawl_adaptive(mock_acquire, mock_schedule_crawl, app, db):
+    mock_acquire.return_value = 0
+    mock_schedule_crawl.return_value = 'job-id'
+    assert schedule_crawl_adaptive('desy', 'article', foo='bar') == 'job-id'
+    mock_schedule_crawl.assert_called_once_with('desy', 'article', foo='bar')
+
+    mock_acquire.return_value = 120
+    with pytest.raises(Retry):
+        schedule_crawl_adaptive('desy', 'article')
+    assert mock_schedule_crawl.call_count == 1
+
+
+@patch('inspire_crawler.scheduler.get_queue_depth')
+@patch('inspire_crawler.tasks.schedule_crawl')
+def test_schedule_crawl_adaptive_gives_back_token(mock_schedule_crawl,
+                                                  mock_get_queue_depth,
+                                                  app, db):
+    mock_get_queue_depth.return_value = 1000
+    mock_schedule_crawl.side_effect = CrawlerScheduleError('scrapyd is down')
+    for _ in range(3):
+        with pytest.raises(CrawlerScheduleError):
+            schedule_crawl_adaptive('desy', 'article')
+
+    mock_schedule_crawl.side_effect = None
+    mock_schedule_crawl.return_value = None
+    schedule_crawl_adaptive('desy', 'article')
+
+    assert CrawlerSpiderBucket.query.filter_by(
+        spider='desy'
+    ).one().tokens == pytest.approx(app.config['CRAWLER_SCHEDULER_BURST'])
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2018 CERN.
+#
+# INSPIRE is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, print_function
+
+import bz2
+import gzip
+import os
+import stat
+
+import pytest
+from mock import MagicMock
+
+from inspire_crawler.spool import spool_records
+
+
+def _records(*raws):
+    return [MagicMock(raw=raw) for raw in raws]
+
+
+def test_spool_records_rolls_over(app, tmpdir):
+    records = _records(
+        u'<record>a</record>',
+        u'<record>b</record>',
+        u'<record>\xe9\xe9</record>',
+        u'<record>' + u'x' * 100 + u'</record>',
+        u'<record>c</record>',
+    )
+
+    with app.app_context():
+        paths = list(spool_records(
+            iter(records), str(tmpdir), max_records=2, max_bytes=40
+        ))
+
+    contents = []
+    for path in paths:
+        assert path.startswith(str(tmpdir))
+        assert path.endswith('.xml')
+        with open(path, 'rb') as fd:
+            contents.append(fd.read())
+
+    assert contents == [
+        b'<ListRecords><record>a</record><record>b</record></ListRecords>',
+        b'<ListRecords><record>\xc3\xa9\xc3\xa9</record></ListRecords>',
+        b'<ListRecords><record>' + b'x' * 100 + b'</record></ListRecords>',
+        b'<ListRecords><record>c</record></ListRecords>',
+    ]
+
+
+def test_spool_records_file_mode(app, tmpdir):
+    umask = os.umask(0o022)
+    try:
+        with app.app_context():
+            paths = list(spool_records(
+                _records(u'<record>a</record>'), str(tmpdir), 10, 100
+            ))
+    finally:
+        os.umask(umask)
+
+    assert len(paths) == 1
+    assert stat.S_IMODE(os.stat(paths[0]).st_mode) == 0o644
+
+
+def test_spool_records_without_records(app, tmpdir):
+    with app.app_context():
+        assert list(spool_records([], str(tmpdir), 10, 100)) == []
+
+    assert tmpdir.listdir() == []
+
+
+@pytest.mark.parametrize('compression,extension,opener', [
+    ('gzip', '.xml.gz', gzip.open),
+    ('bz2', '.xml.bz2', bz2.BZ2File),
+])
+def test_spool_records_compressed(app, tmpdir, compression, extension,
+                                  opener):
+    records = _records(u'<record>a</record>', u'<record>b</record>')
+
+    with app.app_context():
+        path, = spool_records(
+            records, str(tmpdir), 10, 100, compression=compression
+        )
+
+    assert path.endswith(extension)
+    with opener(path, 'rb') as fd:
+        assert fd.read() == (
+            b'<ListRecords><record>a</record><record>b</record></ListRecords>'
+        )
+
+
+def test_spool_records_unsupported_compression(app, tmpdir):
+    with app.app_context():
+        with pytest.raises(ValueError):
+            list(spool_records(_records(u'<record/>'), str(tmpdir), 10, 100,
+                               compression='rar'))
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2018 CERN.
+#
+# INSPIRE is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, print_function
+
+from inspire_crawler.stats import IngestionStats
+
+
+def test_ingestion_stats():
+    stats = IngestionStats()
+    stats.records = 2
+    stats.seconds = 1.5
+    with stats.timer('create'):
+        pass
+    with stats.timer('commit', 2):
+        pass
+    assert list(stats.timed([1, 2], 'decode')) == [1, 2]
+
+    data = stats.to_dict()
+    assert data['records'] == 2
+    assert data['stages']['create']['count'] == 1
+    assert data['stages']['commit']['count'] == 2
+    assert data['stages']['decode']['count'] == 2
+
+    merged = IngestionStats.from_dict(data)
+    merged.merge(IngestionStats.from_dict(data))
+    assert merged.records == 4
+    assert merged.seconds == 3.0
+    assert merged.to_dict()['stages']['commit']['count'] == 4
+    assert merged.summary().startswith('4 records in 3.000s (decode ')
+
+
+def test_ingestion_stats_from_empty_dict():
+    assert IngestionStats.from_dict(None).to_dict() == {
+        'records': 0,
+        'seconds': 0.0,
+        'stages': {},
+    }
@@ -32,6 +32,7 @@ import pkg_resources
 import pytest
 import json
 import uuid
+from datetime import datetime, timedelta
 
 from mock import MagicMock, PropertyMock, patch
 
@@ -39,15 +40,36 @@ import requests_mock
 from six.moves.urllib.parse import urlparse
 
 from invenio_workflows import WorkflowObject, ObjectStatus
-from inspire_crawler.models import JobStatus, CrawlerJob, CrawlerWorkflowObject
-from inspire_crawler.tasks import submit_results
+from invenio_workflows.models import Workflow
+from inspire_crawler.blobstore import BlobStore, dump_results
+from inspire_crawler.models import (
+    JobStatus,
+    CrawlerIngestionCheckpoint,
+    CrawlerJob,
+    CrawlerWorkflowObject,
+)
+from inspire_crawler.tasks import (
+    _extract_results_data,
+    _find_duplicates,
+    _ingest_results,
+    collect_results_blobs,
+    start_many,
+    schedule_crawl,
+    send_results,
+    submit_results_shard,
+    submit_results,
+    sync_job_statuses,
+)
 from inspire_crawler.errors import (
     CrawlerInvalidResultsPath,
     CrawlerJobNotExistError,
     CrawlerScheduleError,
     CrawlerJobError,
+    CrawlerResultsRejected,
+    CrawlerWorkflowStartError,
 )
 from inspire_crawler.receivers import receive_oaiharvest_job
+from inspire_crawler.utils import reset_crawler_client
 
 
 @pytest.fixture()
@@ -215,6 +237,10 @@ def test_receivers(app, db, sample_record_string):
     with requests_mock.Mocker() as requests_mocker:
         job_id = uuid.uuid4().hex
 
+        requests_mocker.get(
+            'http://localhost:6800/listspiders.json?project=hepcrawl',
+            json={'spiders': ['Test'], 'status': 'ok'},
+        )
         requests_mocker.register_uri(
             'POST', 'http://localhost:6800/schedule.json',
             json={'jobid': job_id, 'status': 'ok'})
@@ -242,6 +268,10 @@ def test_receivers(app, db, sample_record_string):
 
 def test_receivers_exception(app, db, sample_record_string):
     with requests_mock.Mocker() as requests_mocker:
+        requests_mocker.get(
+            'http://localhost:6800/listspiders.json?project=hepcrawl',
+            json={'spiders': ['Test'], 'status': 'ok'},
+        )
         requests_mocker.register_uri(
             'POST', 'http://localhost:6800/schedule.json',
             json={'jobid': None, 'status': 'ok'})
@@ -261,6 +291,100 @@ def test_receivers_exception(app, db, sample_record_string):
                 )
 
 
+@patch('inspire_crawler.receivers.group')
+def test_receivers_schedule_one_job_per_group(mock_group, app, tmpdir,
+                                              sample_record_string):
+    app.config['CRAWLER_OAIHARVEST_OUTPUT_DIRECTORY'] = str(tmpdir)
+    app.config['CRAWLER_OAIHARVEST_RECORDS_PER_JOB'] = 2
+    records = [MagicMock(raw=sample_record_string) for _ in range(5)]
+
+    with app.app_context():
+        receive_oaiharvest_job(
+            request=None,
+            records=records,
+            name='',
+            spider='Test',
+            workflow='test'
+        )
+
+    mock_group.return_value.apply_async.assert_called_once_with()
+    signatures = mock_group.call_args[0][0]
+    assert [
+        signature.args for signature in signatures
+    ] == [('Test', 'test')] * 3
+    source_files = [
+        urlparse(signature.kwargs['source_file']).path
+        for signature in signatures
+    ]
+    assert [
+        open(source_file).read().count(sample_record_string)
+        for source_file in source_files
+    ] == [2, 2, 1]
+
+
+@patch('inspire_crawler.receivers.group')
+def test_receivers_schedule_with_concurrency(mock_group, app, tmpdir,
+                                             sample_record_string):
+    app.config['CRAWLER_OAIHARVEST_OUTPUT_DIRECTORY'] = str(tmpdir)
+    app.config['CRAWLER_OAIHARVEST_RECORDS_PER_JOB'] = 1
+    app.config['CRAWLER_OAIHARVEST_SCHEDULE_CONCURRENCY'] = 2
+    records = [MagicMock(raw=sample_record_string) for _ in range(5)]
+
+    with app.app_context():
+        receive_oaiharvest_job(
+            request=None,
+            records=records,
+            name='',
+            spider='Test',
+            workflow='test'
+        )
+
+    chains = mock_group.call_args[0][0]
+    assert [len(chain.tasks) for chain in chains] == [3, 2]
+    assert all(
+        signature.immutable for chain in chains for signature in chain.tasks
+    )
+    assert all(
+        signature.task == 'inspire_crawler.tasks.schedule_crawl_or_log'
+        for chain in chains for signature in chain.tasks
+    )
+
+
+def test_receivers_chain_continues_after_error(app, db, tmpdir,
+                                               sample_record_string):
+    app.config['CRAWLER_OAIHARVEST_OUTPUT_DIRECTORY'] = str(tmpdir)
+    app.config['CRAWLER_OAIHARVEST_RECORDS_PER_JOB'] = 1
+    app.config['CRAWLER_OAIHARVEST_SCHEDULE_CONCURRENCY'] = 1
+    records = [MagicMock(raw=sample_record_string) for _ in range(3)]
+    job_ids = [uuid.uuid4().hex, uuid.uuid4().hex]
+
+    with requests_mock.Mocker() as requests_mocker:
+        requests_mocker.get(
+            'http://localhost:6800/listspiders.json?project=hepcrawl',
+            json={'spiders': ['Test'], 'status': 'ok'},
+        )
+        requests_mocker.post(
+            'http://localhost:6800/schedule.json',
+            [{'json': {'jobid': None, 'status': 'ok'}}] + [
+                {'json': {'jobid': job_id, 'status': 'ok'}}
+                for job_id in job_ids
+            ],
+        )
+
+        with app.app_context():
+            receive_oaiharvest_job(
+                request=None,
+                records=records,
+                name='',
+                spider='Test',
+                workflow='test'
+            )
+
+        assert requests_mocker.call_count == 4
+    for job_id in job_ids:
+        assert CrawlerJob.get_by_job(job_id)
+
+
 def test_create_workflow_for_faulty_data(app, db, halt_workflow):
     """Test submit_results passing the data as payload."""
     job_id = uuid.uuid4().hex  # init random value
@@ -402,3 +526,1011 @@ def test_submit_results_put_task_in_corrct_queue(
             spider_name='desy'
         )
         assert mock_submit_results.call_args[1]['queue'] == 'desy-harvest'
+
+
+def test_extract_results_data_is_lazy(app, sample_records_filename,
+                                      sample_records):
+    with app.app_context():
+        results = _extract_results_data(sample_records_filename)
+
+        assert not isinstance(results, list)
+        assert next(results) == sample_records[0]
+        assert list(results) == sample_records[1:]
+
+        with pytest.raises(CrawlerInvalidResultsPath):
+            _extract_results_data(sample_records_filename + 'idontexist')
+
+
+@patch('inspire_crawler.tasks.start.apply_async')
+def test_submit_results_in_batches(mock_apply_async, app, db, halt_workflow,
+                                   sample_records):
+    job_id = uuid.uuid4().hex  # init random value
+    app.config['CRAWLER_SUBMIT_RESULTS_BATCH_SIZE'] = 3
+    with app.app_context():
+        CrawlerJob.create(
+            job_id=job_id,
+            spider="Test",
+            workflow=halt_workflow.__name__,
+            logs=None,
+            results=None,
+        )
+        db.session.commit()
+
+        submit_results(
+            job_id=job_id,
+            results_uri='idontexist',
+            results_data=sample_records * 2,
+            errors=None,
+            log_file="/foo/bar",
+            spider_name='Test'
+        )
+
+        object_ids = sorted(
+            crawler_object.object_id for crawler_object in
+            CrawlerWorkflowObject.query.filter_by(job_id=job_id)
+        )
+        started_ids = sorted(
+            call[1]['kwargs']['object_id']
+            for call in mock_apply_async.call_args_list
+        )
+
+        assert len(object_ids) == 4
+        assert started_ids == object_ids
+        assert CrawlerJob.get_by_job(job_id).status == JobStatus.FINISHED
+
+
+@pytest.mark.parametrize('share_engine,expected_engines', [
+    (False, 4),
+    (True, 2),
+])
+def test_submit_results_shares_workflow_engine(
+    app, db, halt_workflow, sample_records, share_engine, expected_engines
+):
+    job_id = uuid.uuid4().hex  # init random value
+    app.config['CRAWLER_SUBMIT_RESULTS_BATCH_SIZE'] = 2
+    app.config['CRAWLER_SHARE_WORKFLOW_ENGINE'] = share_engine
+    with app.app_context():
+        CrawlerJob.create(
+            job_id=job_id,
+            spider="Test",
+            workflow=halt_workflow.__name__,
+            logs=None,
+            results=None,
+        )
+        db.session.commit()
+
+        with patch('inspire_crawler.tasks.start.apply_async'):
+            submit_results(
+                job_id=job_id,
+                results_uri='idontexist',
+                results_data=sample_records * 2,
+                errors=None,
+                log_file="/foo/bar",
+                spider_name='Test'
+            )
+
+        engines = set(
+            str(WorkflowObject.get(crawler_object.object_id).id_workflow)
+            for crawler_object in
+            CrawlerWorkflowObject.query.filter_by(job_id=job_id)
+        )
+
+        assert len(engines) == expected_engines
+
+
+def test_submit_results_does_not_modify_results_data(
+    app, db, halt_workflow, sample_records
+):
+    job_id = uuid.uuid4().hex  # init random value
+    with app.app_context():
+        CrawlerJob.create(
+            job_id=job_id,
+            spider="Test",
+            workflow=halt_workflow.__name__,
+            logs=None,
+            results=None,
+        )
+        db.session.commit()
+
+        crawl_result = sample_records[0]
+        crawl_result['record']['extra_data'] = {'foo': 'bar'}
+        expected_crawl_result = json.loads(json.dumps(crawl_result))
+
+        with patch('inspire_crawler.tasks.start.apply_async'):
+            submit_results(
+                job_id=job_id,
+                results_uri='idontexist',
+                results_data=[crawl_result],
+                errors=None,
+                log_file="/foo/bar",
+                spider_name='Test'
+            )
+
+        assert crawl_result == expected_crawl_result
+
+        workflow_id = CrawlerWorkflowObject.query.filter_by(job_id=job_id) \
+            .one().object_id
+        workflow = WorkflowObject.get(workflow_id)
+        expected_record = dict(expected_crawl_result['record'])
+        del expected_record['extra_data']
+
+        assert workflow.data == expected_record
+        assert workflow.extra_data['record_extra'] == {'foo': 'bar'}
+        assert workflow.extra_data['source_data'] == {
+            'data': expected_record,
+            'extra_data': {
+                'crawler_job_id': job_id,
+                'crawler_results_path': 'idontexist',
+                'source_file': 'desy_records.xml',
+                'record_extra': {'foo': 'bar'},
+            },
+        }
+
+
+@pytest.mark.parametrize('dispatch,patched_task', [
+    ('batch', 'inspire_crawler.tasks.start_many.apply_async'),
+    ('group', 'inspire_crawler.tasks.group'),
+])
+def test_submit_results_dispatches_workflows_per_batch(
+    app, db, halt_workflow, sample_records, dispatch, patched_task
+):
+    job_id = uuid.uuid4().hex  # init random value
+    app.config['CRAWLER_SUBMIT_RESULTS_BATCH_SIZE'] = 3
+    app.config['CRAWLER_WORKFLOW_DISPATCH'] = dispatch
+    with app.app_context():
+        CrawlerJob.create(
+            job_id=job_id,
+            spider="desy",
+            workflow=halt_workflow.__name__,
+            logs=None,
+            results=None,
+        )
+        db.session.commit()
+
+        with patch(patched_task) as mock_dispatch:
+            submit_results(
+                job_id=job_id,
+                results_uri='idontexist',
+                results_data=sample_records * 2,
+                errors=None,
+                log_file="/foo/bar",
+                spider_name='desy'
+            )
+
+        if dispatch == 'batch':
+            batches = [
+                call[1]['kwargs']['object_ids']
+                for call in mock_dispatch.call_args_list
+            ]
+            assert mock_dispatch.call_args[1]['queue'] == 'desy-harvest'
+        else:
+            batches = [
+                [
+                    signature['kwargs']['object_id']
+                    for signature in call[0][0]
+                ]
+                for call in mock_dispatch.call_args_list
+            ]
+            assert mock_dispatch.return_value.apply_async.call_count == 2
+
+        object_ids = sorted(
+            crawler_object.object_id for crawler_object in
+            CrawlerWorkflowObject.query.filter_by(job_id=job_id)
+        )
+        assert [len(batch) for batch in batches] == [3, 1]
+        assert sorted(sum(batches, [])) == object_ids
+
+
+@patch('inspire_crawler.tasks.start.apply_async')
+def test_submit_results_records_stats(mock_apply_async, app, db,
+                                      halt_workflow, sample_records_uri):
+    job_id = uuid.uuid4().hex  # init random value
+    with app.app_context():
+        CrawlerJob.create(
+            job_id=job_id,
+            spider="Test",
+            workflow=halt_workflow.__name__,
+            logs=None,
+            results=None,
+        )
+        db.session.commit()
+
+        submit_results(
+            job_id=job_id,
+            results_uri=sample_records_uri,
+            errors=None,
+            log_file="/foo/bar",
+            spider_name='Test'
+        )
+
+        stats = CrawlerJob.get_by_job(job_id).stats
+        assert stats['records'] == 2
+        assert stats['seconds'] > 0
+        assert stats['stages']['read']['count'] == 3  # including EOF
+        for stage in ('decode', 'check', 'build', 'create'):
+            assert stats['stages'][stage]['count'] == 2
+        assert stats['stages']['commit']['count'] == 1
+        assert stats['stages']['publish']['count'] == 2
+
+
+@patch('inspire_crawler.tasks.start.apply_async')
+def test_send_results_spills_big_payloads(mock_apply_async, app, db,
+                                          halt_workflow, sample_records,
+                                          tmpdir):
+    job_id = uuid.uuid4().hex  # init random value
+    app.config.update(
+        CRAWLER_RESULTS_BLOB_STORE=str(tmpdir),
+        CRAWLER_RESULTS_BLOB_THRESHOLD=1024,
+    )
+    with app.app_context():
+        CrawlerJob.create(
+            job_id=job_id,
+            spider="Test",
+            workflow=halt_workflow.__name__,
+            logs=None,
+            results=None,
+        )
+        db.session.commit()
+
+        with patch(
+            'inspire_crawler.tasks.submit_results.apply_async',
+            wraps=submit_results.apply_async,
+        ) as mock_submit_results:
+            send_results(
+                job_id=job_id,
+                errors=None,
+                log_file="/foo/bar",
+                results_uri="https://example.com/results.jl",
+                spider_name='Test',
+                results_data=sample_records,
+            )
+
+        kwargs = mock_submit_results.call_args[1]['kwargs']
+        assert kwargs['results_data'] is None
+        assert kwargs['results_blob']
+        job = CrawlerJob.get_by_job(job_id)
+        assert job.status == JobStatus.FINISHED
+        assert CrawlerWorkflowObject.query.filter_by(job_id=job_id).count() \
+            == 2
+        assert not os.path.exists(
+            BlobStore(str(tmpdir)).path(kwargs['results_blob'])
+        )
+
+
+@patch('inspire_crawler.tasks.start.apply_async')
+def test_submit_results_blob_of_external_producer(mock_apply_async, app, db,
+                                                  halt_workflow,
+                                                  sample_records, tmpdir):
+    job_id = uuid.uuid4().hex  # init random value
+    # Producers sending the task by name have no application context.
+    store = BlobStore(str(tmpdir))
+    results_blob = store.put(dump_results(sample_records), job_id)
+
+    app.config['CRAWLER_RESULTS_BLOB_STORE'] = str(tmpdir)
+    with app.app_context():
+        CrawlerJob.create(
+            job_id=job_id,
+            spider="Test",
+            workflow=halt_workflow.__name__,
+            logs=None,
+            results=None,
+        )
+        db.session.commit()
+
+        submit_results.apply_async(kwargs={
+            'job_id': job_id,
+            'errors': None,
+            'log_file': '/foo/bar',
+            'results_uri': 'https://example.com/results.jl',
+            'spider_name': 'Test',
+            'results_data': None,
+            'results_blob': results_blob,
+        })
+
+        assert CrawlerJob.get_by_job(job_id).status == JobStatus.FINISHED
+        assert CrawlerWorkflowObject.query.filter_by(job_id=job_id).count() \
+            == len(sample_records)
+    assert not os.path.exists(store.path(results_blob))
+
+
+def test_submit_results_keeps_blob_on_transient_error(app, db,
+                                                      halt_workflow,
+                                                      sample_records, tmpdir):
+    job_id = uuid.uuid4().hex  # init random value
+    app.config['CRAWLER_RESULTS_BLOB_STORE'] = str(tmpdir)
+    store = BlobStore(str(tmpdir))
+    results_blob = store.put(
+        [
+            json.dumps(crawl_result).encode('utf-8') + b'\n'
+            for crawl_result in sample_records
+        ],
+        job_id,
+    )
+    with app.app_context():
+        CrawlerJob.create(
+            job_id=job_id,
+            spider="Test",
+            workflow=halt_workflow.__name__,
+            logs=None,
+            results=None,
+        )
+        db.session.commit()
+
+        def _submit_results():
+            submit_results(
+                job_id=job_id,
+                results_uri='idontexist',
+                results_blob=results_blob,
+                errors=None,
+                log_file="/foo/bar",
+                spider_name='Test'
+            )
+
+        with patch(
+            'inspire_crawler.tasks.start.apply_async',
+            side_effect=RuntimeError('Broker unavailable'),
+        ):
+            with pytest.raises(RuntimeError):
+                _submit_results()
+
+        # The retried task can resume.
+        assert os.path.exists(store.path(results_blob))
+
+        with patch('inspire_crawler.tasks.start.apply_async'):
+            _submit_results()
+
+        assert CrawlerJob.get_by_job(job_id).status == JobStatus.FINISHED
+    assert not os.path.exists(store.path(results_blob))
+
+
+@patch('inspire_crawler.tasks.start.apply_async')
+def test_submit_results_rejects_invalid_results(mock_apply_async, app, db,
+                                                halt_workflow,
+                                                sample_records):
+    job_id = uuid.uuid4().hex  # init random value
+    app.config['CRAWLER_MAX_INVALID_RESULTS_RATIO'] = 0.3
+    app.config['CRAWLER_SUBMIT_RESULTS_BATCH_SIZE'] = 1
+    with app.app_context():
+        CrawlerJob.create(
+            job_id=job_id,
+            spider="Test",
+            workflow=halt_workflow.__name__,
+            logs=None,
+            results=None,
+        )
+        db.session.commit()
+
+        with pytest.raises(CrawlerResultsRejected):
+            submit_results(
+                job_id=job_id,
+                results_uri='idontexist',
+                results_data=sample_records + [{'record': {}}],
+                errors=None,
+                log_file="/foo/bar",
+                spider_name='Test'
+            )
+
+        job = CrawlerJob.get_by_job(job_id)
+        assert job.status == JobStatus.ERROR
+        # Including the batches of valid results before the invalid one.
+        assert CrawlerWorkflowObject.query.filter_by(job_id=job_id).count() \
+            == 0
+        assert not mock_apply_async.called
+
+
+def test_submit_results_releases_blob_of_rejected_results(app, db,
+                                                          halt_workflow,
+                                                          sample_records,
+                                                          tmpdir):
+    job_id = uuid.uuid4().hex  # init random value
+    app.config['CRAWLER_MAX_INVALID_RESULTS_RATIO'] = 0.3
+    app.config['CRAWLER_RESULTS_BLOB_STORE'] = str(tmpdir)
+    store = BlobStore(str(tmpdir))
+    results_blob = store.put(
+        [
+            json.dumps(crawl_result).encode('utf-8') + b'\n'
+            for crawl_result in sample_records + [{'record': {}}]
+        ],
+        job_id,
+    )
+    with app.app_context():
+        CrawlerJob.create(
+            job_id=job_id,
+            spider="Test",
+            workflow=halt_workflow.__name__,
+            logs=None,
+            results=None,
+        )
+        db.session.commit()
+
+        with pytest.raises(CrawlerResultsRejected):
+            submit_results(
+                job_id=job_id,
+                results_uri='idontexist',
+                results_blob=results_blob,
+                errors=None,
+                log_file="/foo/bar",
+                spider_name='Test'
+            )
+
+    assert not os.path.exists(store.path(results_blob))
+
+
+def test_collect_results_blobs(app, db, tmpdir):
+    app.config['CRAWLER_RESULTS_BLOB_STORE'] = str(tmpdir)
+    store = BlobStore(str(tmpdir))
+    orphan = store.put([b'orphan\n'], 'job-1')
+    os.remove(os.path.join(str(tmpdir), 'refs', orphan, 'job-1'))
+    os.rmdir(os.path.join(str(tmpdir), 'refs', orphan))
+
+    job_ids = [uuid.uuid4().hex for _ in range(3)]
+    for job_id, status, results in (
+        (job_ids[0], JobStatus.FINISHED, 'file:///r.jl'),
+        (job_ids[1], JobStatus.PENDING, 'file:///r.jl'),
+        (job_ids[2], JobStatus.ERROR, None),
+    ):
+        CrawlerJob.create(
+            job_id=job_id,
+            spider='desy',
+            workflow='article',
+            results=results,
+            status=status,
+        )
+    db.session.commit()
+    blobs = [
+        store.put([job_id.encode('ascii') + b'\n'], job_id)
+        for job_id in job_ids
+    ]
+
+    with app.app_context():
+        collect_results_blobs()
+
+    assert not os.path.exists(store.path(orphan))
+    # Only the job whose results were submitted and that is finished.
+    assert [os.path.exists(store.path(blob)) for blob in blobs] == [
+        False, True, True,
+    ]
+
+
+@patch('inspire_crawler.utils.get_crawler_instance')
+@patch('inspire_crawler.tasks.get_queue_depth', return_value=11)
+def test_schedule_crawl_skips_when_queue_is_full(mock_get_queue_depth,
+                                                 mock_get_crawler_instance,
+                                                 app):
+    with app.app_context():
+        assert schedule_crawl('desy', 'article', queue_size_limit=10) is None
+
+    mock_get_queue_depth.assert_called_once_with('desy-harvest')
+    assert not mock_get_crawler_instance.called
+
+
+def test_schedule_crawl_on_node(app, db):
+    app.config['CRAWLER_HOST_URLS'] = [
+        'http://node1:6800', 'http://node2:6800'
+    ]
+    app.config['CELERY_QUEUE_SPIDER_MAPPING'] = {}
+    job_id = str(uuid.uuid4())
+    with requests_mock.Mocker() as requests_mocker:
+        requests_mocker.get(
+            'http://node1:6800/daemonstatus.json',
+            json={'status': 'ok', 'running': 4, 'pending': 0},
+        )
+        requests_mocker.get(
+            'http://node2:6800/daemonstatus.json',
+            json={'status': 'ok', 'running': 1, 'pending': 0},
+        )
+        requests_mocker.get(
+            'http://node1:6800/listspiders.json?project=hepcrawl',
+            json={'spiders': ['desy'], 'status': 'ok'},
+        )
+        requests_mocker.post(
+            'http://node2:6800/schedule.json',
+            json={'jobid': job_id, 'status': 'ok'},
+        )
+
+        with app.app_context():
+            reset_crawler_client()
+            assert schedule_crawl('desy', 'article') == job_id
+            reset_crawler_client()
+
+            job = CrawlerJob.get_by_job(job_id)
+            assert job.node == 'http://node2:6800'
+
+
+def test_start_many(app, db, halt_workflow):
+    with app.app_context():
+        obj = WorkflowObject.create(data={})
+        obj.save()
+        db.session.commit()
+
+        with pytest.raises(CrawlerWorkflowStartError) as excinfo:
+            start_many(
+                workflow_name=halt_workflow.__name__,
+                object_ids=[obj.id + 1, obj.id],
+            )
+
+        assert excinfo.value.object_ids == [obj.id + 1]
+        assert WorkflowObject.get(obj.id).status == ObjectStatus.WAITING
+
+
+@pytest.mark.parametrize('shard_size', [1, 100, 2000, 10 ** 6])
+def test_extract_results_data_ranges(app, sample_records_filename,
+                                     sample_records, shard_size):
+    size = os.path.getsize(sample_records_filename)
+    with app.app_context():
+        results = []
+        for start in range(0, size, shard_size):
+            results.extend(_extract_results_data(
+                sample_records_filename, start, start + shard_size
+            ))
+
+    assert results == sample_records
+
+
+@patch('inspire_crawler.tasks.start.apply_async')
+def test_submit_results_in_shards(mock_apply_async, app, db, halt_workflow,
+                                  sample_records, tmpdir):
+    job_id = uuid.uuid4().hex  # init random value
+    results_file = tmpdir.join('results.jl')
+    results_file.write('\n'.join(
+        json.dumps(crawl_result) for crawl_result in sample_records * 3
+    ))
+    app.config['CRAWLER_SUBMIT_RESULTS_SHARD_SIZE'] = 4096
+    with app.app_context():
+        CrawlerJob.create(
+            job_id=job_id,
+            spider="Test",
+            workflow=halt_workflow.__name__,
+            logs=None,
+            results=None,
+        )
+        db.session.commit()
+
+        with patch(
+            'inspire_crawler.tasks.submit_results_shard.apply_async',
+            wraps=submit_results_shard.apply_async,
+        ) as mock_submit_shard:
+            submit_results(
+                job_id=job_id,
+                results_uri='file://' + str(results_file),
+                errors=None,
+                log_file="/foo/bar",
+                spider_name='Test'
+            )
+
+        shards = results_file.size() // 4096 + 1
+        assert mock_submit_shard.call_count == shards
+
+        job = CrawlerJob.get_by_job(job_id)
+        assert job.status == JobStatus.FINISHED
+        assert job.shards_pending == 0
+        assert job.stats['records'] == 6
+        assert job.stats['stages']['create']['count'] == 6
+        assert CrawlerWorkflowObject.query.filter_by(job_id=job_id).count() \
+            == 6
+        assert mock_apply_async.call_count == 6
+
+
+def test_submit_results_redelivered_skips_dispatched_shards(
+        app, db, halt_workflow, sample_records, tmpdir):
+    job_id = uuid.uuid4().hex  # init random value
+    results_file = tmpdir.join('results.jl')
+    results_file.write('\n'.join(
+        json.dumps(crawl_result) for crawl_result in sample_records * 3
+    ))
+    app.config['CRAWLER_SUBMIT_RESULTS_SHARD_SIZE'] = 4096
+    with app.app_context():
+        CrawlerJob.create(
+            job_id=job_id,
+            spider="Test",
+            workflow=halt_workflow.__name__,
+            logs=None,
+            results=None,
+        )
+        db.session.commit()
+
+        def _submit_results():
+            submit_results(
+                job_id=job_id,
+                results_uri='file://' + str(results_file),
+                errors=None,
+                log_file="/foo/bar",
+                spider_name='Test'
+            )
+
+        shards = results_file.size() // 4096 + 1
+        assert shards > 1
+        with patch(
+            'inspire_crawler.tasks.submit_results_shard.apply_async',
+            side_effect=[None, RuntimeError('Worker lost')],
+        ):
+            with pytest.raises(RuntimeError):
+                _submit_results()
+
+        with patch(
+            'inspire_crawler.tasks.submit_results_shard.apply_async',
+        ) as mock_submit_shard:
+            _submit_results()
+            assert mock_submit_shard.call_count == shards - 1
+            assert [
+                call[1]['kwargs']['start']
+                for call in mock_submit_shard.call_args_list
+            ] == list(range(4096, shards * 4096, 4096))
+
+            _submit_results()
+            assert mock_submit_shard.call_count == shards - 1
+
+        assert CrawlerJob.get_by_job(job_id).shards_pending == shards
+
+
+@patch('inspire_crawler.tasks.start.apply_async')
+def test_submit_results_rejects_sharded_results(mock_apply_async, app, db,
+                                                halt_workflow,
+                                                sample_records, tmpdir):
+    job_id = uuid.uuid4().hex  # init random value
+    results_file = tmpdir.join('results.jl')
+    results_file.write('\n'.join(
+        json.dumps(crawl_result)
+        for crawl_result in sample_records * 3 + [{'record': {}}] * 3
+    ))
+    results_uri = 'file://' + str(results_file)
+    app.config['CRAWLER_SUBMIT_RESULTS_SHARD_SIZE'] = 4096
+    app.config['CRAWLER_MAX_INVALID_RESULTS_RATIO'] = 0.3
+    with app.app_context():
+        CrawlerJob.create(
+            job_id=job_id,
+            spider="Test",
+            workflow=halt_workflow.__name__,
+            logs=None,
+            results=None,
+        )
+        db.session.commit()
+
+        with patch(
+            'inspire_crawler.tasks.submit_results_shard.apply_async'
+        ) as mock_submit_shard:
+            with pytest.raises(CrawlerResultsRejected):
+                submit_results(
+                    job_id=job_id,
+                    results_uri=results_uri,
+                    errors=None,
+                    log_file="/foo/bar",
+                    spider_name='Test'
+                )
+            # The results are rejected before dispatching any shard.
+            assert not mock_submit_shard.called
+
+        job = CrawlerJob.get_by_job(job_id)
+        assert job.status == JobStatus.ERROR
+        assert job.shards_pending is None
+        assert job.stats['stages']['check']['count'] == 9
+
+        # The other shards of the job are skipped.
+        submit_results_shard(job_id, results_uri, 'Test', 4096, 8192)
+        job = CrawlerJob.get_by_job(job_id)
+        assert job.status == JobStatus.ERROR
+        assert CrawlerWorkflowObject.query.filter_by(job_id=job_id).count() \
+            == 0
+        assert not mock_apply_async.called
+
+
+def test_submit_results_resumes_from_checkpoint(app, db, halt_workflow,
+                                                sample_records):
+    job_id = uuid.uuid4().hex  # init random value
+    app.config['CRAWLER_SUBMIT_RESULTS_BATCH_SIZE'] = 1
+    with app.app_context():
+        CrawlerJob.create(
+            job_id=job_id,
+            spider="Test",
+            workflow=halt_workflow.__name__,
+            logs=None,
+            results=None,
+        )
+        db.session.commit()
+
+        def _submit_results():
+            submit_results(
+                job_id=job_id,
+                results_uri='idontexist',
+                results_data=sample_records * 2,
+                errors=None,
+                log_file="/foo/bar",
+                spider_name='Test'
+            )
+
+        with patch(
+            'inspire_crawler.tasks.start.apply_async',
+            side_effect=[None, RuntimeError('Worker lost')],
+        ):
+            with pytest.raises(RuntimeError):
+                _submit_results()
+
+        query = CrawlerWorkflowObject.query.filter_by(job_id=job_id)
+        assert query.count() == 2
+        assert CrawlerJob.get_by_job(job_id).status == JobStatus.PENDING
+
+        checkpoint = CrawlerIngestionCheckpoint.get_or_create(job_id)
+        assert checkpoint.unpublished == [query.all()[1].object_id]
+
+        with patch('inspire_crawler.tasks.start.apply_async') as mock_start:
+            _submit_results()
+            # The workflow of the batch whose publication failed is started.
+            assert mock_start.call_count == 3
+
+        assert query.count() == 4
+        assert checkpoint.unpublished is None
+        assert CrawlerJob.get_by_job(job_id).status == JobStatus.FINISHED
+
+        with patch('inspire_crawler.tasks.start.apply_async') as mock_start:
+            _submit_results()
+            assert not mock_start.called
+
+        assert query.count() == 4
+
+
+@patch('inspire_crawler.tasks.start.apply_async')
+def test_submit_results_stops_when_checkpoint_moved(mock_apply_async, app, db,
+                                                    halt_workflow,
+                                                    sample_records):
+    job_id = uuid.uuid4().hex  # init random value
+    with app.app_context():
+        CrawlerJob.create(
+            job_id=job_id,
+            spider="Test",
+            workflow=halt_workflow.__name__,
+            logs=None,
+            results=None,
+        )
+        db.session.commit()
+
+        get_for_update = CrawlerIngestionCheckpoint.get_for_update
+
+        def _moved_by_other_worker(job_id, shard=0):
+            checkpoint = get_for_update(job_id, shard)
+            # As if a redelivered task committed a batch in the meantime.
+            checkpoint.ingested += 1
+            return checkpoint
+
+        with patch.object(
+            CrawlerIngestionCheckpoint,
+            'get_for_update',
+            side_effect=_moved_by_other_worker,
+        ):
+            submit_results(
+                job_id=job_id,
+                results_uri='idontexist',
+                results_data=sample_records,
+                errors=None,
+                log_file="/foo/bar",
+                spider_name='Test'
+            )
+
+        assert CrawlerJob.get_by_job(job_id).status == JobStatus.PENDING
+        assert CrawlerWorkflowObject.query.filter_by(job_id=job_id).count() \
+            == 0
+        assert len(WorkflowObject.query()) == 0
+        assert not mock_apply_async.called
+
+
+@patch('inspire_crawler.tasks.start.apply_async')
+def test_submit_results_shard_completed_once(mock_apply_async, app, db,
+                                             halt_workflow, sample_records,
+                                             tmpdir):
+    job_id = uuid.uuid4().hex  # init random value
+    results_file = tmpdir.join('results.jl')
+    results_file.write('\n'.join(
+        json.dumps(crawl_result) for crawl_result in sample_records
+    ))
+    results_uri = 'file://' + str(results_file)
+    with app.app_context():
+        job = CrawlerJob.create(
+            job_id=job_id,
+            spider="Test",
+            workflow=halt_workflow.__name__,
+            logs=None,
+            results=None,
+        )
+        job.shards_pending = 2
+        db.session.commit()
+
+        def _submit_shard():
+            submit_results_shard(job_id, results_uri, 'Test', 0, 4096)
+
+        ingest_results = _ingest_results
+
+        def _dispatched_twice(*args):
+            # The same shard is processed by another worker meanwhile.
+            with patch('inspire_crawler.tasks._ingest_results',
+                       ingest_results):
+                _submit_shard()
+            return ingest_results(*args)
+
+        with patch(
+            'inspire_crawler.tasks._ingest_results',
+            side_effect=_dispatched_twice,
+        ):
+            _submit_shard()
+
+        job = CrawlerJob.get_by_job(job_id)
+        assert job.shards_pending == 1
+        assert job.status == JobStatus.PENDING
+        assert CrawlerWorkflowObject.query.filter_by(job_id=job_id).count() \
+            == len(sample_records)
+        assert mock_apply_async.call_count == len(sample_records)
+
+
+@patch('inspire_crawler.tasks.start.apply_async')
+def test_submit_results_deduplicates_records(mock_apply_async, app, db,
+                                             halt_workflow, sample_records):
+    app.config['CRAWLER_SUBMIT_RESULTS_BATCH_SIZE'] = 3
+    app.config['CRAWLER_DEDUPLICATE_RECORDS'] = True
+    job_ids = [uuid.uuid4().hex, uuid.uuid4().hex]
+    with app.app_context():
+        for job_id in job_ids:
+            CrawlerJob.create(
+                job_id=job_id,
+                spider="Test",
+                workflow=halt_workflow.__name__,
+                logs=None,
+                results=None,
+            )
+        db.session.commit()
+
+        submit_results(
+            job_id=job_ids[0],
+            results_uri='idontexist',
+            results_data=sample_records * 2,
+            errors=None,
+            log_file="/foo/bar",
+            spider_name='Test'
+        )
+        assert mock_apply_async.call_count == 2
+
+        recrawled_record = json.loads(json.dumps(sample_records[1]))
+        recrawled_record['record']['acquisition_source']['date'] = 'now'
+        submit_results(
+            job_id=job_ids[1],
+            results_uri='idontexist',
+            results_data=[sample_records[0], recrawled_record],
+            errors=None,
+            log_file="/foo/bar",
+            spider_name='Test'
+        )
+        assert mock_apply_async.call_count == 2
+
+        first_job_objects = set(
+            crawler_object.object_id for crawler_object in
+            CrawlerWorkflowObject.query.filter_by(job_id=job_ids[0])
+        )
+        second_job_objects = set(
+            crawler_object.object_id for crawler_object in
+            CrawlerWorkflowObject.query.filter_by(job_id=job_ids[1])
+        )
+        assert len(first_job_objects) == 2
+        assert first_job_objects == second_job_objects
+        assert len(WorkflowObject.query()) == 2
+
+
+@patch('inspire_crawler.tasks._WorkflowDispatcher.publish')
+def test_submit_results_deduplicates_concurrent_records(mock_publish, app, db,
+                                                        halt_workflow,
+                                                        sample_records):
+    app.config['CRAWLER_DEDUPLICATE_RECORDS'] = True
+    job_ids = [uuid.uuid4().hex, uuid.uuid4().hex]
+    with app.app_context():
+        for job_id in job_ids:
+            CrawlerJob.create(
+                job_id=job_id,
+                spider="Test",
+                workflow=halt_workflow.__name__,
+                logs=None,
+                results=None,
+            )
+        db.session.commit()
+
+        submit_results(
+            job_id=job_ids[0],
+            results_uri='idontexist',
+            results_data=sample_records,
+            errors=None,
+            log_file="/foo/bar",
+            spider_name='Test'
+        )
+        engines_count = Workflow.query.count()
+
+        # The second job checks the fingerprints before the first commits.
+        find_duplicates = _find_duplicates
+        with patch(
+            'inspire_crawler.tasks._find_duplicates',
+            side_effect=lambda data: (find_duplicates(data)[0], {}),
+        ):
+            submit_results(
+                job_id=job_ids[1],
+                results_uri='idontexist',
+                results_data=sample_records,
+                errors=None,
+                log_file="/foo/bar",
+                spider_name='Test'
+            )
+
+        job_objects = [
+            set(
+                crawler_object.object_id for crawler_object in
+                CrawlerWorkflowObject.query.filter_by(job_id=job_id)
+            )
+            for job_id in job_ids
+        ]
+        assert len(job_objects[0]) == len(sample_records)
+        assert job_objects[0] == job_objects[1]
+        assert len(WorkflowObject.query()) == len(sample_records)
+        # The engines of the duplicates are rolled back with them.
+        assert Workflow.query.count() == engines_count
+
+
+def test_sync_job_statuses(app, db):
+    app.config['CRAWLER_HOST_URLS'] = [
+        'http://localhost:6800', 'http://node2:6800'
+    ]
+    job_ids = [uuid.uuid4().hex for _ in range(7)]
+    for job_id, node, status, results in (
+        (job_ids[0], None, JobStatus.PENDING, None),
+        (job_ids[1], 'http://localhost:6800', JobStatus.RUNNING, None),
+        (job_ids[2], 'http://node2:6800', JobStatus.RUNNING, None),
+        (job_ids[3], 'http://node2:6800', JobStatus.PENDING, 'file:///r.jl'),
+        (job_ids[4], 'http://node2:6800', JobStatus.PENDING, None),
+        (job_ids[5], 'http://node2:6800', JobStatus.FINISHED, None),
+        (job_ids[6], 'http://node2:6800', JobStatus.PENDING, None),
+    ):
+        CrawlerJob.create(
+            job_id=job_id,
+            spider='desy',
+            workflow='article',
+            results=results,
+            status=status,
+            node=node,
+        )
+    db.session.commit()
+
+    long_ago = str(datetime.now() - timedelta(days=1))
+    recently = str(datetime.now())
+    with requests_mock.Mocker() as requests_mocker:
+        requests_mocker.get(
+            'http://localhost:6800/listjobs.json?project=hepcrawl',
+            json={
+                'status': 'ok',
+                'pending': [{'id': job_ids[1], 'spider': 'desy'}],
+                'running': [{'id': job_ids[0], 'spider': 'desy'}],
+                'finished': [],
+            },
+        )
+        requests_mocker.get(
+            'http://node2:6800/listjobs.json?project=hepcrawl',
+            json={
+                'status': 'ok',
+                'pending': [],
+                'running': [{'id': job_ids[5], 'spider': 'desy'}],
+                'finished': [
+                    {'id': job_id, 'spider': 'desy', 'end_time': end_time}
+                    for job_id, end_time in (
+                        (job_ids[2], long_ago),
+                        (job_ids[3], long_ago),
+                        (job_ids[4], recently),
+                    )
+                ],
+            },
+        )
+
+        sync_job_statuses()
+
+        assert requests_mocker.call_count == 2
+
+    db.session.expire_all()
+    assert [CrawlerJob.get_by_job(job_id).status for job_id in job_ids] == [
+        JobStatus.RUNNING,
+        JobStatus.RUNNING,
+        JobStatus.ERROR,
+        JobStatus.PENDING,
+        JobStatus.PENDING,
+        JobStatus.FINISHED,
+        JobStatus.PENDING,
+    ]
@@ -26,12 +26,172 @@
 
 from __future__ import absolute_import, print_function
 
-from mock import MagicMock, PropertyMock
+import requests_mock
+import pytest
+from mock import MagicMock, PropertyMock, patch
 
-from inspire_crawler.utils import get_crawler_instance
+from inspire_crawler.errors import CrawlerSpiderNotFound
+from inspire_crawler.utils import (
+    add_pending_job,
+    check_spider,
+    choose_crawler_node,
+    get_crawler_client,
+    get_crawler_instance,
+    invalidate_spiders,
+    list_spiders,
+    reset_crawler_client,
+)
+
+NODES = ['http://node1:6800', 'http://node2:6800', 'http://node3:6800']
 
 
 def test_utils(app):
     """Test tasks."""
     with app.app_context():
         assert get_crawler_instance()
+
+
+def test_get_crawler_instance_reuses_client(app):
+    with app.app_context():
+        crawler = get_crawler_instance()
+        assert crawler.client is get_crawler_instance().client
+        assert crawler.client is get_crawler_client()
+
+        with patch('inspire_crawler.utils.os.getpid', return_value=-1):
+            assert get_crawler_client() is not crawler.client
+
+        assert get_crawler_client() is not crawler.client
+
+
+def test_get_crawler_instance_with_auth(app):
+    with app.app_context():
+        crawler = get_crawler_instance(auth=('user', 'password'))
+        assert crawler.client is not get_crawler_client()
+        assert crawler.client.auth == ('user', 'password')
+
+
+def test_crawler_client_retries(app):
+    app.config['CRAWLER_SCRAPYD_RETRIES'] = 2
+    with app.app_context():
+        adapter = get_crawler_client().get_adapter('http://localhost:6800')
+        assert adapter.max_retries.total == 2
+        assert adapter._pool_maxsize == 10
+
+        with requests_mock.Mocker() as requests_mocker:
+            requests_mocker.get(
+                'http://localhost:6800/listspiders.json?project=hepcrawl',
+                json={'spiders': ['desy'], 'status': 'ok'},
+            )
+            assert list_spiders() == ['desy']
+            assert requests_mocker.last_request.timeout == (5, 60)
+
+
+def test_get_crawler_instance_on_node(app):
+    with app.app_context():
+        crawler = get_crawler_instance(node='http://node2:6800')
+        assert crawler.target == 'http://node2:6800'
+        assert get_crawler_instance().target == 'http://localhost:6800'
+
+
+def test_choose_crawler_node(app):
+    app.config['CRAWLER_HOST_URLS'] = NODES
+    app.config['CRAWLER_NODE_SLOTS'] = {'http://node3:6800': 10}
+    with app.app_context(), requests_mock.Mocker() as requests_mocker:
+        reset_crawler_client()
+        requests_mocker.get(
+            'http://node1:6800/daemonstatus.json',
+            json={'status': 'ok', 'running': 1, 'pending': 0},
+        )
+        requests_mocker.get(
+            'http://node2:6800/daemonstatus.json',
+            json={'status': 'ok', 'running': 0, 'pending': 0},
+        )
+        requests_mocker.get(
+            'http://node3:6800/daemonstatus.json',
+            json={'status': 'ok', 'running': 4, 'pending': 3},
+        )
+
+        assert choose_crawler_node() == 'http://node2:6800'
+        add_pending_job('http://node2:6800')
+        add_pending_job('http://node2:6800')
+        assert choose_crawler_node() == 'http://node1:6800'
+        # The statuses are cached.
+        assert requests_mocker.call_count == 3
+
+        reset_crawler_client()
+
+
+def test_choose_crawler_node_skips_unreachable_nodes(app):
+    app.config['CRAWLER_HOST_URLS'] = NODES
+    with app.app_context(), requests_mock.Mocker() as requests_mocker:
+        reset_crawler_client()
+        requests_mocker.get(
+            'http://node1:6800/daemonstatus.json', status_code=500,
+        )
+        requests_mocker.get(
+            'http://node2:6800/daemonstatus.json',
+            json={'status': 'error', 'message': 'boom'},
+        )
+        requests_mocker.get(
+            'http://node3:6800/daemonstatus.json',
+            json={'status': 'ok', 'running': 4, 'pending': 0},
+        )
+        assert choose_crawler_node() == 'http://node3:6800'
+
+        reset_crawler_client()
+        requests_mocker.get(
+            'http://node3:6800/daemonstatus.json', status_code=500,
+        )
+        assert choose_crawler_node() == 'http://node1:6800'
+
+        reset_crawler_client()
+
+
+def test_list_spiders_is_cached(app):
+    with app.app_context(), requests_mock.Mocker() as requests_mocker:
+        requests_mocker.get(
+            'http://localhost:6800/listspiders.json?project=hepcrawl',
+            json={'spiders': ['desy'], 'status': 'ok'},
+        )
+        assert list_spiders() == ['desy']
+        assert list_spiders() == ['desy']
+        assert requests_mocker.call_count == 1
+
+        assert list_spiders(refresh=True) == ['desy']
+        assert requests_mocker.call_count == 2
+
+        invalidate_spiders()
+        assert list_spiders() == ['desy']
+        assert requests_mocker.call_count == 3
+
+        app.config['CRAWLER_SPIDERS_CACHE_TTL'] = 0
+        assert list_spiders() == ['desy']
+        assert requests_mocker.call_count == 4
+
+
+def test_check_spider(app):
+    with app.app_context(), requests_mock.Mocker() as requests_mocker:
+        requests_mocker.get(
+            'http://localhost:6800/listspiders.json?project=hepcrawl',
+            [
+                {'json': {'spiders': ['desy'], 'status': 'ok'}},
+                {'json': {'spiders': ['desy', 'arXiv'], 'status': 'ok'}},
+            ],
+        )
+        check_spider('desy')
+        # A newly deployed spider is found by refreshing the list.
+        check_spider('arXiv')
+        assert requests_mocker.call_count == 2
+
+        with pytest.raises(CrawlerSpiderNotFound):
+            check_spider('dsey')
+        assert requests_mocker.call_count == 3
+
+
+def test_check_spider_when_scrapyd_is_down(app):
+    with app.app_context(), requests_mock.Mocker() as requests_mocker:
+        requests_mocker.get(
+            'http://localhost:6800/listspiders.json?project=hepcrawl',
+            status_code=500,
+        )
+        check_spider('desy')
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2018 CERN.
+#
+# INSPIRE is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, print_function
+
+import pytest
+
+from inspire_crawler.validation import (
+    compile_validator,
+    validate_crawl_results,
+)
+
+
+VALID = {
+    'record': {'titles': [{'title': 'A title'}]},
+    'errors': [],
+    'source_data': '<record/>',
+    'file_name': 'records.xml',
+}
+
+
+@pytest.mark.parametrize(
+    'crawl_result,expected',
+    [
+        (VALID, None),
+        (dict(VALID, file_name=None), None),
+        (
+            ['not', 'an', 'object'],
+            ('TypeError', 'Wrong crawl result format. Not an object'),
+        ),
+        (
+            {'record': {}, 'source_data': ''},
+            (
+                'KeyError',
+                'Wrong crawl result format. Missing the key `errors`',
+            ),
+        ),
+        (
+            dict(VALID, record='<record/>'),
+            (
+                'TypeError',
+                'Wrong crawl result format. The key `record` must be an '
+                'object',
+            ),
+        ),
+        (
+            dict(VALID, file_name=1),
+            (
+                'TypeError',
+                'Wrong crawl result format. The key `file_name` must be a '
+                'string or null',
+            ),
+        ),
+        (
+            dict(VALID, source_data='x' * 11),
+            (
+                'ValueError',
+                'Wrong crawl result format. The key `source_data` is longer '
+                'than 10',
+            ),
+        ),
+    ],
+)
+def test_compile_validator(crawl_result, expected):
+    validate = compile_validator({'source_data': 10})
+
+    assert validate(crawl_result) == expected
+
+
+def test_validate_crawl_results():
+    invalid = {'record': {}, 'errors': [], 'file_name': 'broken.xml'}
+
+    checked, invalid_count = validate_crawl_results(
+        [VALID, invalid], compile_validator()
+    )
+
+    assert invalid_count == 1
+    assert checked[0] is VALID
+    assert checked[1] == {
+        'record': {},
+        'errors': [
+            {
+                'exception': 'KeyError',
+                'traceback':
+                    'Wrong crawl result format. Missing the key `source_data`',
+            },
+        ],
+        'source_data': invalid,
+        'file_name': 'broken.xml',
+    }